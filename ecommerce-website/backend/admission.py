@@ -0,0 +1,123 @@
+"""Admission control for expensive routes.
+
+Heavy views are assigned to a named pool with ``@admission_limited(pool)``.
+A pool admits at most ``limit`` concurrent requests per worker process;
+further requests wait in a bounded queue for up to ``timeout`` seconds and
+are shed with 503 and ``Retry-After`` once the queue is full or the wait
+expires.
+
+Routes outside any pool - checkout, the cart APIs and everything else - are
+never queued or shed.  A queued request still holds its worker thread, so
+keep the sum of ``limit + queue`` over all pools below the number of threads
+per worker; the remaining threads are then always free for those routes.
+
+Pool activity is published to ``metrics``: gauges
+``admission.<pool>.active`` / ``.queued`` and counters
+``admission.<pool>.admitted`` / ``.queued`` / ``.shed``.
+"""
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, jsonify, request
+
+from metrics import metrics
+
+
+class AdmissionPool:
+    def __init__(self, name, limit, queue_size, timeout):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        # Also run in forked children: the parent's waiters and lock holders do not exist there
+        self._cond = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+
+    def _publish(self):
+        metrics.set_gauge(f'admission.{self.name}.active', self.active)
+        metrics.set_gauge(f'admission.{self.name}.queued', self.waiting)
+
+    def acquire(self):
+        """Block until admitted (True) or decide the request must be shed (False)."""
+        with self._cond:
+            # Requests already queued go first
+            if self.active < self.limit and not self.waiting:
+                return self._admit()
+            if self.waiting >= self.queue_size:
+                return self._shed()
+
+            self.waiting += 1
+            metrics.incr(f'admission.{self.name}.queued')
+            self._publish()
+            deadline = time.monotonic() + self.timeout
+            try:
+                while self.active >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return self._shed()
+                    self._cond.wait(remaining)
+                return self._admit()
+            finally:
+                self.waiting -= 1
+                self._publish()
+
+    def _admit(self):
+        self.active += 1
+        metrics.incr(f'admission.{self.name}.admitted')
+        self._publish()
+        return True
+
+    def _shed(self):
+        metrics.incr(f'admission.{self.name}.shed')
+        return False
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._publish()
+            self._cond.notify()
+
+
+def _busy_response():
+    message = 'Server busy, please retry shortly'
+    if request.path.startswith('/api/'):
+        response = jsonify({'error': message})
+    else:
+        response = current_app.response_class(message + '.', mimetype='text/plain')
+    response.status_code = 503
+    response.headers['Retry-After'] = str(current_app.config['ADMISSION_RETRY_AFTER'])
+    return response
+
+
+def admission_limited(pool_name, when=None):
+    """Run the view inside ``pool_name``; ``when`` can restrict that to the expensive variants of a route."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            pool = current_app.extensions.get('admission', {}).get(pool_name)
+            if pool is None or (when is not None and not when()):
+                return view(*args, **kwargs)
+            if not pool.acquire():
+                return _busy_response()
+            try:
+                return view(*args, **kwargs)
+            finally:
+                pool.release()
+        return wrapper
+    return decorator
+
+
+def init_admission(app):
+    pools = {}
+    if app.config['ADMISSION_ENABLED']:
+        for name, (limit, queue_size, timeout) in app.config['ADMISSION_POOLS'].items():
+            pools[name] = AdmissionPool(name, limit, queue_size, timeout)
+    app.extensions['admission'] = pools
+    return pools
@@ -0,0 +1,178 @@
+"""Structured, non-blocking application and access logging.
+
+Every record is handed to a ``QueueHandler`` and written by a
+``QueueListener`` thread, so request threads never block on stdout.
+Records are emitted as one JSON object per line (``LOG_FORMAT=text`` gives
+a human-readable format for local development) and carry the request's
+correlation id, taken from an incoming ``X-Request-ID`` header or generated,
+which is echoed back on the response.
+
+High-volume events can be sampled by passing ``extra={'sample_rate': r}``;
+only a fraction ``r`` of them is kept and the rate is included in the
+output so counts can be scaled back up.  Access logs use
+``ACCESS_LOG_SAMPLE_RATE`` the same way, except that errors and requests
+slower than ``LOG_SLOW_REQUEST_MS`` are always logged.
+
+The writer thread does not survive ``fork()``; a forked worker starts its
+own listener and queue automatically.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import current_app, g, has_request_context, request
+from flask_login import current_user
+
+logger = logging.getLogger('techgadgets')
+access_logger = logging.getLogger('techgadgets.access')
+
+# LogRecord attributes that are not user-supplied ``extra`` fields
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'sample_rate', 'exc_text'}
+
+_listener = None
+_listener_args = None
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps records logged inside a request with its correlation id."""
+
+    def filter(self, record):
+        if not hasattr(record, 'request_id') and has_request_context():
+            record.request_id = g.get('request_id')
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Drops records carrying ``sample_rate`` with probability ``1 - sample_rate``."""
+
+    def filter(self, record):
+        rate = getattr(record, 'sample_rate', None)
+        return rate is None or rate >= 1 or random.random() < rate
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Renders the message and traceback on the calling thread but keeps ``extra`` fields intact."""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if getattr(record, 'sample_rate', None) is not None:
+            data['sample_rate'] = record.sample_rate
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith('_'):
+                data[key] = value
+        if record.exc_text:
+            data['exc'] = record.exc_text
+        return json.dumps(data, default=str)
+
+
+def configure_logging(level='INFO', fmt='json', stream=None):
+    """Route every logger through a queue to a single background writer thread."""
+    global _listener, _listener_args
+    stop_logging()
+    _listener_args = (level, fmt, stream)
+
+    handler = logging.StreamHandler(stream or sys.stdout)
+    if fmt == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s',
+                                               defaults={'request_id': '-'}))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    # Filters run on the calling thread, where the request context is available
+    queue_handler.addFilter(SamplingFilter())
+    queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    # The dev server's own access lines would duplicate ours
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _restart_after_fork():
+    # The parent's writer thread is gone in the child and its queue may hold a half-written record
+    global _listener
+    if _listener is not None:
+        _listener = None
+        configure_logging(*_listener_args)
+
+
+os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def _start_request_log():
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+    g.request_log_started = time.perf_counter()
+
+
+def _write_access_log(response):
+    started = g.pop('request_log_started', None)
+    response.headers['X-Request-ID'] = g.get('request_id', '')
+    if started is None:
+        return response
+
+    duration_ms = (time.perf_counter() - started) * 1000
+    always = response.status_code >= 500 or duration_ms >= current_app.config['LOG_SLOW_REQUEST_MS']
+    fields = {
+        'method': request.method,
+        'path': request.path,
+        'endpoint': request.endpoint,
+        'status': response.status_code,
+        'duration_ms': round(duration_ms, 2),
+        'bytes': response.calculate_content_length(),
+        'remote_addr': request.remote_addr,
+        'user_id': current_user.get_id() if current_user else None,
+    }
+    sample_rate = current_app.config['ACCESS_LOG_SAMPLE_RATE']
+    if not always and sample_rate < 1:
+        fields['sample_rate'] = sample_rate
+    access_logger.log(logging.WARNING if response.status_code >= 500 else logging.INFO,
+                      'request', extra=fields)
+    return response
+
+
+def init_logging(app):
+    configure_logging(app.config['LOG_LEVEL'], app.config['LOG_FORMAT'])
+    app.before_request(_start_request_log)
+    app.after_request(_write_access_log)
+    atexit.register(stop_logging)
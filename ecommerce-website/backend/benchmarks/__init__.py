@@ -0,0 +1,6 @@
+"""Benchmark harnesses for the TechGadgets backend.
+
+Run the modules from the backend directory, e.g.::
+
+    python -m benchmarks.throughput --help
+"""
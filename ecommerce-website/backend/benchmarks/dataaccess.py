@@ -0,0 +1,203 @@
+"""Micro-benchmarks for the data-access layer.
+
+Times the model static methods (``User.get``, ``Order.create_order``,
+``Order.get_order_details``, ``Wishlist.get_wishlist_items``, ...) directly,
+outside any Flask request context, against synthetic databases of several
+sizes.  Comparing these numbers with ``benchmarks.throughput`` separates
+SQL cost from framework and template overhead.
+
+Examples (from the backend directory):
+
+    python -m benchmarks.dataaccess --sizes 1000,10000,100000
+    python -m benchmarks.dataaccess --only Order.get_order_details --repeat 20
+    python -m benchmarks.dataaccess --baseline benchmarks/baselines/dataaccess.json
+
+Databases are generated once per size with ``seed_data.py`` and cached in
+``--workdir``; every run works on a fresh copy because some benchmarks write.
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+from benchmarks.stats import compare, environment, load_results, summarize, write_results
+
+
+def scaled_volumes(orders):
+    """Derive the other table volumes from the order count so sizes stay proportional."""
+    users = max(orders // 10, 50)
+    return {
+        'orders': orders,
+        'users': users,
+        'products': max(orders // 50, 20),
+        'categories': 20,
+        'reviews': orders // 2,
+        'cart_items': users // 4,
+        'wishlists': users // 2,
+    }
+
+
+def prepare_database(workdir, orders, seed, fresh=False):
+    """Return the path of a working copy of the database for ``orders``, seeding it on first use."""
+    import seed_data
+
+    os.makedirs(workdir, exist_ok=True)
+    pristine = os.path.join(workdir, f'orders-{orders}-seed{seed}.db')
+    if fresh or not os.path.exists(pristine):
+        print(f"🔄 Seeding {pristine}...")
+        volumes = scaled_volumes(orders)
+        argv = ['--database', pristine, '--reset', '--seed', str(seed)]
+        for key, value in volumes.items():
+            argv += [f"--{key.replace('_', '-')}", str(value)]
+        with contextlib.redirect_stdout(io.StringIO()):
+            seed_data.seed(seed_data.parse_args(argv))
+    working = os.path.join(workdir, f'orders-{orders}-seed{seed}.run.db')
+    shutil.copyfile(pristine, working)
+    return working
+
+
+class Fixture:
+    """Id pools sampled from the database so each call hits a random existing row."""
+
+    def __init__(self, path, seed):
+        conn = sqlite3.connect(path)
+        self.user_ids = [r[0] for r in conn.execute('SELECT id FROM users')]
+        self.usernames = [r[0] for r in conn.execute('SELECT username FROM users')]
+        self.order_ids = [r[0] for r in conn.execute('SELECT id FROM orders')]
+        self.wishlist_ids = [r[0] for r in conn.execute('SELECT id FROM wishlists')]
+        self.public_wishlist_ids = [r[0] for r in conn.execute('SELECT id FROM wishlists WHERE is_public = 1')] \
+            or self.wishlist_ids
+        self.products = [(r[0], r[1], r[2]) for r in conn.execute('SELECT id, name, price FROM products')]
+        conn.close()
+        self.rng = random.Random(seed)
+
+    def user_id(self):
+        return self.rng.choice(self.user_ids)
+
+    def cart(self):
+        items = []
+        for product_id, name, price in self.rng.sample(self.products, k=min(3, len(self.products))):
+            items.append({'product_id': product_id, 'name': name, 'price': price, 'quantity': 1})
+        return items
+
+
+def build_cases(models, fx):
+    """Map a benchmark name to a zero-argument callable performing one operation."""
+    User, Order, Address, Wishlist = models.User, models.Order, models.Address, models.Wishlist
+
+    def connect_only():
+        models.get_db_connection().close()
+
+    return {
+        'get_db_connection': connect_only,
+        'User.get': lambda: User.get(fx.user_id()),
+        'User.find_by_username': lambda: User.find_by_username(fx.rng.choice(fx.usernames)),
+        'Order.get_user_orders': lambda: Order.get_user_orders(fx.user_id()),
+        'Order.get_order_details': lambda: Order.get_order_details(fx.rng.choice(fx.order_ids)),
+        'Order.create_order': lambda: Order.create_order(fx.user_id(), fx.cart(), '1 Bench St', '1 Bench St',
+                                                         'credit_card'),
+        'Address.get_user_addresses': lambda: Address.get_user_addresses(fx.user_id()),
+        'Address.create_address': lambda: Address.create_address(fx.user_id(), 'shipping', 'Bench User',
+                                                                 '1 Bench St', 'Load City', 'LC', '00000',
+                                                                 'US', None, fx.rng.random() < 0.5),
+        'Wishlist.get_user_wishlist': lambda: Wishlist.get_user_wishlist(fx.user_id()),
+        'Wishlist.get_wishlist_items': lambda: Wishlist.get_wishlist_items(fx.rng.choice(fx.wishlist_ids)),
+        'Wishlist.is_in_wishlist': lambda: Wishlist.is_in_wishlist(fx.rng.choice(fx.wishlist_ids),
+                                                                   fx.rng.choice(fx.products)[0]),
+        'Wishlist.add_to_wishlist': lambda: Wishlist.add_to_wishlist(fx.rng.choice(fx.wishlist_ids),
+                                                                     fx.rng.choice(fx.products)[0]),
+        'Wishlist.get_public_wishlists': Wishlist.get_public_wishlists,
+        'Wishlist.get_wishlist_by_id': lambda: Wishlist.get_wishlist_by_id(fx.rng.choice(fx.public_wishlist_ids)),
+    }
+
+
+def measure(fn, warmup, repeat, number):
+    """Run ``fn`` ``warmup`` times untimed, then ``repeat`` rounds of ``number`` calls.
+
+    Returns per-call durations, one sample per round.
+    """
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - started) / number)
+    return samples
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Data-access layer micro-benchmarks.')
+    parser.add_argument('--sizes', default='1000,10000,100000', help='comma-separated order counts')
+    parser.add_argument('--only', help='comma-separated benchmark names to run (default: all)')
+    parser.add_argument('--warmup', type=int, default=20, help='untimed calls before measuring')
+    parser.add_argument('--repeat', type=int, default=15, help='timed rounds')
+    parser.add_argument('--number', type=int, default=20, help='calls per timed round')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'techgadgets-bench'))
+    parser.add_argument('--fresh', action='store_true', help='re-seed cached databases')
+    parser.add_argument('--output', help='JSON results path (default: benchmarks/results/dataaccess-<ts>.json)')
+    parser.add_argument('--baseline', help='compare p50 per entry against this results file')
+    parser.add_argument('--max-regression', type=float, default=10.0, help='allowed p50 regression, percent')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    import app_logging
+    import minimal_app
+    app_logging.configure_logging('WARNING', stream=open(os.devnull, 'w'))
+
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    only = set(args.only.split(',')) if args.only else None
+    entries = {}
+
+    for size in sizes:
+        path = prepare_database(args.workdir, size, args.seed, fresh=args.fresh)
+        minimal_app.app.config['DATABASE'] = path
+        fixture = Fixture(path, args.seed)
+        cases = build_cases(minimal_app, fixture)
+        unknown = (only or set()) - set(cases)
+        if unknown:
+            print(f"❌ Unknown benchmark(s): {', '.join(sorted(unknown))}")
+            return 2
+
+        print(f"\n📦 {size:,} orders ({len(fixture.user_ids):,} users, {len(fixture.products):,} products)")
+        print(f"{'benchmark':<34} {'mean':>9} {'stdev':>9} {'p50':>9} {'p95':>9} {'ops/s':>10}")
+        for name, fn in cases.items():
+            if only and name not in only:
+                continue
+            summary = summarize(measure(fn, args.warmup, args.repeat, args.number))
+            summary['ops_per_s'] = 1000.0 / summary['mean_ms'] if summary['mean_ms'] else 0.0
+            entries[f'{name}@{size}'] = summary
+            print(f"{name:<34} {summary['mean_ms']:>8.3f}ms {summary['stdev_ms']:>8.3f}ms "
+                  f"{summary['p50_ms']:>8.3f}ms {summary['p95_ms']:>8.3f}ms {summary['ops_per_s']:>10,.0f}")
+
+    results = {
+        'benchmark': 'dataaccess',
+        'meta': dict(environment(), sizes=sizes, warmup=args.warmup, repeat=args.repeat,
+                     number=args.number, seed=args.seed),
+        'entries': entries,
+    }
+    output = args.output or os.path.join('benchmarks', 'results',
+                                         f"dataaccess-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    write_results(output, results)
+
+    if args.baseline:
+        regressions = compare(entries, load_results(args.baseline)['entries'], metric='p50_ms',
+                              max_regression=args.max_regression)
+        if regressions:
+            print(f"❌ p50 regressed more than {args.max_regression:.0f}% on: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""Worker boot-time benchmark.
+
+Starts a fresh interpreter per run, the way a prefork server respawns a
+worker or an autoscaler adds an instance, and times each startup phase:
+
+* ``import``        - ``import minimal_app`` (route and model definitions only)
+* ``create_app``    - ``create_app()`` (logging thread, request hooks)
+* ``first_request`` - the first ``GET /login``, which compiles its templates
+* ``process``       - interpreter launch to exit, as seen by the parent
+
+Examples (from the backend directory):
+
+    python -m benchmarks.startup --runs 30
+    python -m benchmarks.startup --importtime 15
+    python -m benchmarks.startup --baseline benchmarks/baselines/startup.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.stats import compare, environment, load_results, summarize, write_results
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PHASES = ('import', 'create_app', 'first_request', 'process')
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import minimal_app
+imported = time.perf_counter()
+app = minimal_app.create_app({'DATABASE': sys.argv[1]})
+created = time.perf_counter()
+response = app.test_client().get('/login')
+served = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({'import': imported - started, 'create_app': created - imported,
+                  'first_request': served - created}))
+"""
+
+
+def probe_env():
+    env = dict(os.environ, LOG_LEVEL='WARNING')
+    env.pop('PROFILING_ENABLED', None)
+    return env
+
+
+def run_once(database):
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', PROBE, database], cwd=BACKEND_DIR, env=probe_env(),
+                            capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f'startup probe failed:\n{result.stderr}')
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings['process'] = elapsed
+    return timings
+
+
+def import_profile(limit):
+    """Slowest modules by cumulative import time, from ``python -X importtime``."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import minimal_app'],
+                            cwd=BACKEND_DIR, env=probe_env(), capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative_us), int(self_us), name.strip()))
+    rows.sort(reverse=True)
+    return rows[:limit]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Worker startup-time benchmark.')
+    parser.add_argument('--runs', type=int, default=20, help='timed interpreter launches')
+    parser.add_argument('--warmup', type=int, default=2, help='untimed launches (fills the page and .pyc caches)')
+    parser.add_argument('--database', default=os.path.join(BACKEND_DIR, 'ecommerce.db'),
+                        help='database the probe app is configured with (it is only opened, never written)')
+    parser.add_argument('--importtime', type=int, metavar='N', help='also list the N slowest imports')
+    parser.add_argument('--output', help='JSON results path (default: benchmarks/results/startup-<ts>.json)')
+    parser.add_argument('--baseline', help='compare p50 per phase against this results file')
+    parser.add_argument('--max-regression', type=float, default=10.0, help='allowed p50 regression, percent')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    for _ in range(args.warmup):
+        run_once(args.database)
+    samples = {phase: [] for phase in PHASES}
+    for _ in range(args.runs):
+        for phase, seconds in run_once(args.database).items():
+            samples[phase].append(seconds)
+
+    entries = {phase: summarize(values) for phase, values in samples.items()}
+    print(f"\n🚀 Startup over {args.runs} runs")
+    print(f"{'phase':<16} {'mean':>9} {'stdev':>9} {'p50':>9} {'p95':>9} {'max':>9}")
+    for phase, summary in entries.items():
+        print(f"{phase:<16} {summary['mean_ms']:>7.1f}ms {summary['stdev_ms']:>7.1f}ms "
+              f"{summary['p50_ms']:>7.1f}ms {summary['p95_ms']:>7.1f}ms {summary['max_ms']:>7.1f}ms")
+
+    if args.importtime:
+        print(f"\n{'module':<48} {'cumulative':>11} {'self':>9}")
+        for cumulative_us, self_us, name in import_profile(args.importtime):
+            print(f"{name:<48} {cumulative_us / 1000:>9.1f}ms {self_us / 1000:>7.1f}ms")
+
+    results = {
+        'benchmark': 'startup',
+        'meta': dict(environment(), runs=args.runs, warmup=args.warmup),
+        'entries': entries,
+    }
+    output = args.output or os.path.join('benchmarks', 'results',
+                                         f"startup-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    write_results(output, results)
+
+    if args.baseline:
+        regressions = compare(entries, load_results(args.baseline)['entries'], metric='p50_ms',
+                              max_regression=args.max_regression)
+        if regressions:
+            print(f"❌ p50 regressed more than {args.max_regression:.0f}% on: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""Shared statistics and result-file helpers for the benchmark suites."""
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+from datetime import datetime
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(samples):
+    """Summarize a list of durations (seconds) into milliseconds."""
+    values = sorted(samples)
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'mean_ms': statistics.fmean(values) * 1000,
+        'stdev_ms': (statistics.stdev(values) if len(values) > 1 else 0.0) * 1000,
+        'min_ms': values[0] * 1000,
+        'p50_ms': percentile(values, 50) * 1000,
+        'p95_ms': percentile(values, 95) * 1000,
+        'p99_ms': percentile(values, 99) * 1000,
+        'max_ms': values[-1] * 1000,
+    }
+
+
+def environment():
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def write_results(path, results):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as fh:
+        json.dump(results, fh, indent=2, sort_keys=True)
+    print(f"📄 Results written to {path}")
+
+
+def load_results(path):
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def compare(current, baseline, metric='p95_ms', max_regression=10.0):
+    """Print per-entry deltas of ``metric`` and return the names that regressed.
+
+    ``current`` and ``baseline`` map an entry name (route, method@size, ...)
+    to a summary dict as produced by :func:`summarize`.
+    """
+    regressions = []
+    print(f"\n{'entry':<48} {'baseline':>10} {'current':>10} {'delta':>8}")
+    for name in sorted(set(current) | set(baseline)):
+        new = current.get(name, {}).get(metric)
+        old = baseline.get(name, {}).get(metric)
+        if new is None or old is None:
+            print(f"{name:<48} {'-' if old is None else f'{old:.2f}':>10} "
+                  f"{'-' if new is None else f'{new:.2f}':>10} {'n/a':>8}")
+            continue
+        delta = (new - old) / old * 100 if old else 0.0
+        flag = ' ❌' if delta > max_regression else ''
+        print(f"{name:<48} {old:>10.2f} {new:>10.2f} {delta:>+7.1f}%{flag}")
+        if delta > max_regression:
+            regressions.append(name)
+    return regressions
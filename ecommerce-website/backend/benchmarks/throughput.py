@@ -0,0 +1,363 @@
+"""End-to-end throughput benchmark for the storefront and checkout flows.
+
+Replays a weighted mix of requests from several worker threads, either
+in-process through Flask's WSGI test client or against a running server,
+and reports requests/sec and p50/p95/p99 latency per route.
+
+Examples (from the backend directory):
+
+    python -m benchmarks.throughput --database loadtest.db --mix mixed --workers 8 --duration 30
+    python -m benchmarks.throughput --url http://127.0.0.1:8000 --mix browse
+    python -m benchmarks.throughput --mix mixed --baseline benchmarks/baselines/mixed.json
+
+In-process runs place real orders, so point ``--database`` at a throwaway
+copy (see ``seed_data.py``).
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.cookiejar import CookieJar
+
+from benchmarks.stats import compare, environment, load_results, summarize, write_results
+
+DEFAULT_CREDENTIALS = 'demo:demo123,john_doe:password123,jane_smith:password123,' \
+                      'mike_wilson:password123,sarah_jones:password123'
+
+
+# =============================================
+# CLIENTS
+# =============================================
+
+class WsgiClient:
+    """Talks to the Flask app in-process; one instance (and cookie jar) per worker."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None, json_body=None):
+        response = self.client.open(path, method=method, data=data, json=json_body)
+        try:
+            return response.status_code, response.get_data()
+        finally:
+            response.close()
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class HttpClient:
+    """Talks to a running server over HTTP without following redirects."""
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()), _NoRedirect)
+
+    def request(self, method, path, data=None, json_body=None):
+        headers = {}
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers['Content-Type'] = 'application/json'
+        elif data is not None:
+            body = urllib.parse.urlencode(data).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        req = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        try:
+            with self.opener.open(req, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+
+# =============================================
+# ACTIONS
+# =============================================
+# Each action issues one or more requests through ``worker.call`` and is
+# labelled by route template so results aggregate per route.
+
+def browse_home(w):
+    w.call('GET /', 'GET', '/')
+
+
+def browse_products(w):
+    w.call('GET /products', 'GET', '/products?sort_by=' + w.rng.choice(('name', 'price', 'rating', 'date')))
+
+
+def browse_category(w):
+    w.call('GET /category/<slug>', 'GET', f'/category/{w.rng.choice(w.catalog["slugs"])}')
+
+
+def browse_product(w):
+    w.call('GET /product/<id>', 'GET', f'/product/{w.pick_product()}')
+
+
+def search_products(w):
+    w.call('GET /products?search', 'GET', '/products?' + urllib.parse.urlencode({'search': w.search_term()}))
+
+
+def search_advanced(w):
+    params = {'q': w.search_term(), 'sort_by': w.rng.choice(('name', 'price', 'rating', 'reviews'))}
+    if w.rng.random() < 0.5:
+        params['max_price'] = w.rng.choice((50, 100, 250, 500, 1000))
+    if w.rng.random() < 0.3:
+        params['in_stock'] = 1
+    w.call('GET /advanced-search', 'GET', '/advanced-search?' + urllib.parse.urlencode(params))
+
+
+def search_suggestions(w):
+    w.call('GET /api/search/suggestions', 'GET',
+           '/api/search/suggestions?' + urllib.parse.urlencode({'q': w.search_term()[:4]}))
+
+
+def cart_view(w):
+    w.call('GET /api/cart', 'GET', '/api/cart')
+
+
+def cart_add(w):
+    product_id = w.pick_product()
+    if w.call('POST /api/cart', 'POST', '/api/cart', json_body={'product_id': product_id, 'quantity': 1}):
+        w.cart.add(product_id)
+
+
+def cart_update(w):
+    if not w.cart:
+        return cart_add(w)
+    product_id = w.rng.choice(sorted(w.cart))
+    w.call('PUT /api/cart/<id>', 'PUT', f'/api/cart/{product_id}', json_body={'quantity': w.rng.randint(1, 3)})
+
+
+def cart_remove(w):
+    if not w.cart:
+        return cart_add(w)
+    product_id = w.rng.choice(sorted(w.cart))
+    w.call('DELETE /api/cart/<id>', 'DELETE', f'/api/cart/{product_id}')
+    w.cart.discard(product_id)
+
+
+def checkout(w):
+    cart_add(w)
+    w.call('GET /checkout', 'GET', '/checkout')
+    form = {'shipping_address': '1 Bench St, Load City, LC 00000',
+            'billing_address': '1 Bench St, Load City, LC 00000',
+            'payment_method': 'credit_card'}
+    # A successful checkout redirects to the confirmation page
+    if w.call('POST /checkout', 'POST', '/checkout', data=form, expect=(302,)):
+        w.cart.clear()
+
+
+MIXES = {
+    'browse': [(30, browse_home), (25, browse_products), (20, browse_category), (25, browse_product)],
+    'search': [(40, search_products), (40, search_advanced), (20, search_suggestions)],
+    'cart': [(30, cart_view), (30, cart_add), (20, cart_update), (20, cart_remove)],
+    'checkout': [(100, checkout)],
+    'mixed': [(15, browse_home), (15, browse_products), (12, browse_category), (20, browse_product),
+              (8, search_products), (6, search_advanced), (6, search_suggestions),
+              (5, cart_view), (6, cart_add), (2, cart_update), (2, cart_remove), (3, checkout)],
+}
+AUTH_ACTIONS = {cart_view, cart_add, cart_update, cart_remove, checkout}
+
+
+# =============================================
+# WORKERS
+# =============================================
+
+class Worker(threading.Thread):
+    def __init__(self, index, client, mix, catalog, credentials, warmup_until, deadline, max_requests, seed):
+        super().__init__(name=f'bench-worker-{index}', daemon=True)
+        self.client = client
+        self.catalog = catalog
+        self.credentials = credentials
+        self.warmup_until = warmup_until
+        self.deadline = deadline
+        self.max_requests = max_requests
+        self.rng = random.Random(seed + index)
+        self.weights = [weight for weight, _ in mix]
+        self.actions = [action for _, action in mix]
+        self.cart = set()
+        self.samples = {}
+        self.errors = {}
+        self.recorded = 0
+        self.failure = None
+
+    def pick_product(self):
+        ids = self.catalog['product_ids']
+        # Skew towards the head of the catalog the way real traffic does
+        return ids[int(len(ids) * self.rng.random() ** 2)]
+
+    def search_term(self):
+        return self.rng.choice(self.catalog['terms'])
+
+    def call(self, label, method, path, data=None, json_body=None, expect=None):
+        started = time.perf_counter()
+        status, _ = self.client.request(method, path, data=data, json_body=json_body)
+        elapsed = time.perf_counter() - started
+        ok = status in expect if expect else status < 400
+        if time.monotonic() >= self.warmup_until:
+            self.samples.setdefault(label, []).append(elapsed)
+            if not ok:
+                self.errors[label] = self.errors.get(label, 0) + 1
+            self.recorded += 1
+        return ok
+
+    def login(self):
+        username, password = self.credentials
+        status, _ = self.client.request('POST', '/login', data={'username': username, 'password': password})
+        if status != 302:
+            raise RuntimeError(f'login failed for {username!r} (HTTP {status})')
+        # Start from an empty cart so checkout totals stay small
+        self.client.request('DELETE', '/api/cart/clear')
+
+    def run(self):
+        try:
+            if self.credentials:
+                self.login()
+            while time.monotonic() < self.deadline:
+                if self.max_requests and self.recorded >= self.max_requests:
+                    break
+                self.rng.choices(self.actions, self.weights)[0](self)
+        except Exception as e:
+            self.failure = e
+
+
+def load_catalog(client):
+    status, body = client.request('GET', '/api/products')
+    if status != 200:
+        raise RuntimeError(f'/api/products returned HTTP {status}')
+    products = json.loads(body)
+    status, body = client.request('GET', '/api/categories')
+    categories = json.loads(body) if status == 200 else []
+    if not products or not categories:
+        raise RuntimeError('the target has no products or categories to browse')
+    terms = sorted({word.lower() for p in products for word in p['name'].split() if len(word) > 3})
+    return {
+        'product_ids': [p['id'] for p in products],
+        'slugs': [c['slug'] for c in categories],
+        'terms': terms or ['phone'],
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Storefront/checkout throughput benchmark.')
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--database', help='run in-process against this SQLite file (default: app config)')
+    target.add_argument('--url', help='benchmark a running server instead, e.g. http://127.0.0.1:8000')
+    parser.add_argument('--mix', choices=sorted(MIXES), default='mixed')
+    parser.add_argument('--workers', type=int, default=4, help='concurrent client threads')
+    parser.add_argument('--duration', type=float, default=20.0, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=3.0, help='unrecorded seconds before measuring')
+    parser.add_argument('--requests', type=int, default=0, help='stop each worker after N recorded requests')
+    parser.add_argument('--credentials', default=DEFAULT_CREDENTIALS,
+                        help='comma-separated user:password pairs, assigned to workers round-robin')
+    parser.add_argument('--admission', action='store_true',
+                        help='keep admission control enabled for in-process runs')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='JSON results path (default: benchmarks/results/throughput-<mix>-<ts>.json)')
+    parser.add_argument('--baseline', help='compare p95 per route against this results file')
+    parser.add_argument('--max-regression', type=float, default=10.0, help='allowed p95 regression, percent')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.url:
+        make_client = lambda: HttpClient(args.url)
+        target = args.url
+    else:
+        import app_logging
+        import minimal_app
+        config = {'DATABASE': args.database} if args.database else {}
+        if not args.admission:
+            # All client threads share one in-process "worker", so per-worker limits would shed most of them
+            config['ADMISSION_ENABLED'] = False
+        app = minimal_app.create_app(config)
+        # Keep the logging cost in the measurement but send the output nowhere
+        app_logging.configure_logging(app.config['LOG_LEVEL'], app.config['LOG_FORMAT'],
+                                      stream=open(os.devnull, 'w'))
+        make_client = lambda: WsgiClient(app)
+        target = f"in-process:{app.config['DATABASE']}"
+
+    mix = MIXES[args.mix]
+    credentials = [tuple(pair.split(':', 1)) for pair in args.credentials.split(',') if pair]
+    needs_login = any(action in AUTH_ACTIONS for _, action in mix)
+    catalog = load_catalog(make_client())
+
+    now = time.monotonic()
+    warmup_until = now + args.warmup
+    deadline = warmup_until + args.duration
+    workers = [Worker(i, make_client(), mix, catalog,
+                      credentials[i % len(credentials)] if needs_login else None,
+                      warmup_until, deadline, args.requests, args.seed)
+               for i in range(args.workers)]
+
+    print(f"🚀 {args.mix} mix against {target}: {args.workers} workers, "
+          f"{args.warmup:.0f}s warmup + {args.duration:.0f}s measured")
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    measured = max(min(time.monotonic(), deadline) - warmup_until, 1e-9)
+
+    failures = [w.failure for w in workers if w.failure]
+    for failure in failures:
+        print(f"❌ worker failed: {failure}")
+
+    samples, errors = {}, {}
+    for worker in workers:
+        for label, values in worker.samples.items():
+            samples.setdefault(label, []).extend(values)
+        for label, count in worker.errors.items():
+            errors[label] = errors.get(label, 0) + count
+
+    routes = {}
+    for label, values in samples.items():
+        summary = summarize(values)
+        summary['rps'] = len(values) / measured
+        summary['errors'] = errors.get(label, 0)
+        routes[label] = summary
+    all_samples = [v for values in samples.values() for v in values]
+    overall = summarize(all_samples)
+    overall['rps'] = len(all_samples) / measured
+    overall['errors'] = sum(errors.values())
+
+    print(f"\n{'route':<32} {'count':>7} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7}")
+    for label in sorted(routes):
+        r = routes[label]
+        print(f"{label:<32} {r['count']:>7} {r['rps']:>8.1f} {r['p50_ms']:>8.2f} "
+              f"{r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['errors']:>7}")
+    if all_samples:
+        print(f"{'TOTAL':<32} {overall['count']:>7} {overall['rps']:>8.1f} {overall['p50_ms']:>8.2f} "
+              f"{overall['p95_ms']:>8.2f} {overall['p99_ms']:>8.2f} {overall['errors']:>7}")
+
+    results = {
+        'benchmark': 'throughput',
+        'meta': dict(environment(), target=target, mix=args.mix, workers=args.workers,
+                     duration_s=args.duration, warmup_s=args.warmup, seed=args.seed),
+        'overall': overall,
+        'routes': routes,
+    }
+    output = args.output or os.path.join(
+        'benchmarks', 'results', f"throughput-{args.mix}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    write_results(output, results)
+
+    status = 1 if failures else 0
+    if args.baseline:
+        regressions = compare(routes, load_results(args.baseline)['routes'], max_regression=args.max_regression)
+        if regressions:
+            print(f"❌ p95 regressed more than {args.max_regression:.0f}% on: {', '.join(regressions)}")
+            status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
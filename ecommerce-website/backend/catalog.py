@@ -0,0 +1,259 @@
+"""Immutable in-memory catalog snapshot.
+
+The storefront's read path - home page, product listings, category pages,
+product details and ``/api/products`` - is served from a
+``CatalogSnapshot``: compact ``__slots__`` records for every product and
+category, with the category name/slug and approved-review rating stats
+already joined in.  Snapshots are never modified.  When the catalog
+changes a new snapshot is built from the old one plus the changed products
+and swapped in with a single reference assignment, so a request keeps a
+consistent view for as long as it holds one.
+
+Changes come from the ``catalog_changes`` log (see ``catalog_sync.py``).
+The worker that commits a catalog write refreshes immediately; every
+worker also polls the log in a background thread every
+``CATALOG_REFRESH_INTERVAL`` seconds, so writes made elsewhere show up
+within that interval without any SQL on the request path.
+
+A worker's first snapshot can also come from a memory-mapped catalog file
+(``CATALOG_FILE``, see ``catalog_mmap.py``): the worker maps the file,
+applies the logged changes made since it was exported, and never runs the
+full catalog load at all.
+"""
+import itertools
+import os
+import threading
+import time
+
+from app_logging import logger
+from catalog_sync import changes_since, latest_change
+
+PRODUCT_LISTING_SQL = '''
+    SELECT p.*,
+           c.name                           as category_name,
+           c.slug                           as category_slug,
+           COALESCE(r.average_rating, 0.0)  as average_rating,
+           COALESCE(r.review_count, 0)      as review_count
+    FROM products p
+             LEFT JOIN categories c ON p.category_id = c.id
+             LEFT JOIN (SELECT product_id, AVG(rating) as average_rating, COUNT(*) as review_count
+                        FROM reviews
+                        WHERE status = 'approved'
+                        GROUP BY product_id) r ON r.product_id = p.id
+'''
+
+
+class Product:
+    __slots__ = ('id', 'name', 'price', 'description', 'image_url', 'category_id', 'stock', 'created_at',
+                 'category_name', 'category_slug', 'average_rating', 'review_count')
+
+    def __init__(self, row):
+        for field in self.__slots__:
+            setattr(self, field, row[field])
+        self.average_rating = float(self.average_rating)
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+class Category:
+    __slots__ = ('id', 'name', 'slug', 'description', 'created_at')
+
+    def __init__(self, row):
+        for field in self.__slots__:
+            setattr(self, field, row[field])
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+def load_products(conn, product_ids=None):
+    """Product records keyed by id, all of them or just ``product_ids``."""
+    if product_ids is None:
+        rows = conn.execute(PRODUCT_LISTING_SQL + ' ORDER BY p.id').fetchall()
+    else:
+        ids = list(product_ids)
+        rows = []
+        # Stay well under SQLite's bound-parameter limit
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            rows += conn.execute(f"{PRODUCT_LISTING_SQL} WHERE p.id IN ({','.join('?' * len(chunk))})",
+                                 chunk).fetchall()
+    return {row['id']: Product(row) for row in rows}
+
+
+def load_categories(conn):
+    return tuple(Category(row) for row in conn.execute('SELECT * FROM categories ORDER BY id'))
+
+
+class CatalogSnapshot:
+    """One consistent, read-only view of the catalog.  Products and categories are kept in id order."""
+
+    __slots__ = ('seq', 'products', 'categories', '_category_by_id', '_category_by_slug', '_by_category')
+
+    def __init__(self, seq, products, categories, by_category=None):
+        self.seq = seq
+        self.products = products
+        self.categories = categories
+        self._category_by_id = {category.id: category for category in categories}
+        self._category_by_slug = {category.slug: category for category in categories}
+        if by_category is None:
+            by_category = {}
+            for product in products.values():
+                by_category.setdefault(product.category_id, []).append(product)
+            by_category = {category_id: tuple(items) for category_id, items in by_category.items()}
+        self._by_category = by_category
+
+    def product(self, product_id):
+        return self.products.get(product_id)
+
+    def category(self, category_id):
+        return self._category_by_id.get(category_id)
+
+    def category_by_slug(self, slug):
+        return self._category_by_slug.get(slug)
+
+    def in_category(self, category_id):
+        return self._by_category.get(category_id, ())
+
+    def featured(self, limit=4):
+        return [product for product, _ in zip(self.products.values(), range(limit))]
+
+    def related(self, product, limit=4):
+        others = (other for other in self.in_category(product.category_id) if other.id != product.id)
+        return list(itertools.islice(others, limit))
+
+    def sort_orders(self):
+        """``(records, orders, overrides)`` for ``CatalogFilter.load`` when the products come presorted, else None."""
+        if isinstance(self.products, dict):
+            return None
+        return self.products.sort_orders()
+
+    def with_changes(self, seq, changed, removed, categories):
+        """New snapshot with ``changed`` records replacing or adding to this one's and ``removed`` ids dropped."""
+        if not isinstance(self.products, dict):
+            # Products mapped from a catalog file (catalog_mmap.py) take the changes as overrides
+            return self.products.with_changes(seq, changed, removed, categories)
+        products = dict(self.products)
+        for product_id in removed:
+            products.pop(product_id, None)
+        added = any(product_id not in products for product_id in changed)
+        products.update(changed)
+        if added:
+            products = dict(sorted(products.items()))
+        return CatalogSnapshot(seq, products, categories)
+
+
+class CatalogStore:
+    """Holds the current snapshot of one worker process and replaces it as the catalog changes.
+
+    Listeners registered with ``subscribe`` are called after each swap with
+    the new snapshot and the set of changed product ids (None after a full
+    reload), so derived indexes can update incrementally.
+    """
+
+    def __init__(self, connect, refresh_interval=1.0, catalog_file=None):
+        self._connect = connect
+        self.refresh_interval = refresh_interval
+        self.catalog_file = catalog_file
+        self.snapshot = None
+        self._listeners = []
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        # Also run in forked children: the parent's poller thread does not exist there.
+        # An inherited snapshot stays valid and is shared with the parent until refreshed.
+        self._lock = threading.Lock()
+        self._poller = None
+        self._started = False   # first snapshot loaded and the poller, if any, running
+
+    def get(self):
+        """The current snapshot, loading the first one and starting the poller on first use."""
+        snapshot = self.snapshot
+        if snapshot is None or not self._started:
+            with self._lock:
+                if self.snapshot is None:
+                    self._reload()
+                self._start_poller()
+                self._started = True
+            snapshot = self.snapshot
+        return snapshot
+
+    def subscribe(self, listener):
+        with self._lock:
+            if self.snapshot is None:
+                self._reload()
+            listener(self.snapshot, None)
+            self._listeners.append(listener)
+
+    def refresh(self):
+        """Swap in a snapshot that includes every change committed so far."""
+        with self._lock:
+            if self.snapshot is None:
+                self._reload()
+                return
+            conn = self._connect()
+            try:
+                latest, changed = changes_since(conn, self.snapshot.seq, max(len(self.snapshot.products) // 4, 100))
+                if changed is None:
+                    self._reload(conn)
+                elif latest != self.snapshot.seq:
+                    products = load_products(conn, changed)
+                    removed = changed - products.keys()
+                    self._publish(self.snapshot.with_changes(latest, products, removed, load_categories(conn)),
+                                  changed)
+            finally:
+                conn.close()
+
+    def _reload(self, conn=None):
+        own = conn is None
+        conn = conn or self._connect()
+        try:
+            snapshot = self._load_mapped(conn) if self.catalog_file else None
+            if snapshot is None:
+                seq = latest_change(conn)
+                snapshot = CatalogSnapshot(seq, load_products(conn), load_categories(conn))
+        finally:
+            if own:
+                conn.close()
+        self._publish(snapshot, None)
+
+    def _load_mapped(self, conn):
+        """Snapshot from the catalog file plus the changes logged since it was exported, if usable."""
+        from catalog_mmap import MappedCatalog
+
+        mapped = MappedCatalog.open(self.catalog_file)
+        if mapped is None:
+            return None
+        if mapped.seq > latest_change(conn):
+            logger.warning('Catalog file is newer than the database, ignoring it', extra={'file': self.catalog_file})
+            return None
+        latest, changed = changes_since(conn, mapped.seq, max(mapped.product_count // 4, 100))
+        if changed is None:
+            logger.info('Catalog file is stale, loading from the database', extra={'file': self.catalog_file})
+            return None
+        snapshot = mapped.snapshot()
+        if latest != mapped.seq:
+            products = load_products(conn, changed)
+            snapshot = snapshot.with_changes(latest, products, changed - products.keys(), load_categories(conn))
+        return snapshot
+
+    def _publish(self, snapshot, changed):
+        self.snapshot = snapshot
+        for listener in self._listeners:
+            listener(snapshot, changed)
+
+    def _start_poller(self):
+        if self._poller is not None or self.refresh_interval <= 0:
+            return
+        self._poller = threading.Thread(target=self._poll, name='catalog-refresh', daemon=True)
+        self._poller.start()
+
+    def _poll(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception('Catalog refresh failed')
@@ -0,0 +1,236 @@
+"""Bulk product import from CSV or JSON Lines.
+
+The file is read as a stream and handled ``CHUNK_SIZE`` rows at a time:
+each chunk is validated in Python, then written with ``executemany`` in its
+own transaction, so memory stays flat and the write lock is only ever held
+for one chunk - checkout keeps going during a long import.
+
+Columns (CSV header or JSON keys):
+
+* ``name`` and ``price`` - required on every row;
+* ``sku`` or ``id`` - the product to update; a product with that SKU or id
+  is created if there is none.  Rows with neither always add a product, so
+  give SKUs to make re-running an import safe;
+* ``description``, ``image_url``, ``stock`` and ``category`` (a category
+  slug) or ``category_id`` - optional.  Left out or empty they keep the
+  product's current value; new products get empty text, no category and
+  no stock.
+
+Rows that would change nothing are not written, so re-importing a feed only
+touches the products that actually changed.  Problems are reported per row
+(``ImportResult.errors``) and the other rows are still imported; a chunk the
+database rejects (a duplicate SKU, say) is retried row by row so that only
+the offending rows fail.
+
+Maintenance is kept out of the loop: the change-log triggers only record
+product ids, and the caller refreshes the in-memory catalog - and re-exports
+the catalog file - once, after the last chunk.  There is no SQL full-text
+index to maintain; the search indexes are rebuilt by each worker's catalog
+reload.
+"""
+import csv
+import io
+import itertools
+import json
+import math
+import sqlite3
+
+CHUNK_SIZE = 1000
+FORMATS = ('csv', 'jsonl')
+
+PRODUCT_SKU_SCHEMA = (
+    'CREATE UNIQUE INDEX IF NOT EXISTS idx_products_sku ON products (sku) WHERE sku IS NOT NULL',
+)
+
+_COLUMNS = ('sku', 'name', 'price', 'description', 'image_url', 'category_id', 'stock')
+# New products get what the add-product form would store for the fields left out
+_VALUES = ":sku, :name, :price, COALESCE(:description, ''), COALESCE(:image_url, ''), :category_id, COALESCE(:stock, 0)"
+_SET = '''name        = :name,
+          price       = :price,
+          description = COALESCE(:description, description),
+          image_url   = COALESCE(:image_url, image_url),
+          category_id = COALESCE(:category_id, category_id),
+          stock       = COALESCE(:stock, stock)'''
+_CHANGED = '''name IS NOT :name
+           OR price IS NOT :price
+           OR description IS NOT COALESCE(:description, description)
+           OR image_url IS NOT COALESCE(:image_url, image_url)
+           OR category_id IS NOT COALESCE(:category_id, category_id)
+           OR stock IS NOT COALESCE(:stock, stock)'''
+
+_STATEMENTS = {
+    'insert': f"INSERT INTO products ({', '.join(_COLUMNS)}) VALUES ({_VALUES})",
+    'sku': f'''
+        INSERT INTO products ({', '.join(_COLUMNS)}) VALUES ({_VALUES})
+        ON CONFLICT (sku) WHERE sku IS NOT NULL DO UPDATE SET {_SET}
+        WHERE {_CHANGED}
+    ''',
+    'id': f'''
+        INSERT INTO products (id, {', '.join(_COLUMNS)}) VALUES (:id, {_VALUES})
+        ON CONFLICT (id) DO UPDATE SET sku = COALESCE(:sku, sku), {_SET}
+        WHERE sku IS NOT COALESCE(:sku, sku) OR {_CHANGED}
+    ''',
+}
+
+
+def install_product_skus(conn):
+    """Add the optional ``products.sku`` column the import matches rows on."""
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(products)')}
+    if 'sku' not in columns:
+        conn.execute('ALTER TABLE products ADD COLUMN sku TEXT')
+    for statement in PRODUCT_SKU_SCHEMA:
+        conn.execute(statement)
+
+
+def format_for(filename):
+    """The import format a file name suggests, or None."""
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    return {'csv': 'csv', 'jsonl': 'jsonl', 'ndjson': 'jsonl'}.get(extension)
+
+
+class ImportResult:
+    def __init__(self):
+        self.rows = 0
+        self.written = 0
+        self.errors = []    # (line number, message); line None if the file could not be read to the end
+
+    @property
+    def rejected(self):
+        return sum(1 for line_number, _ in self.errors if line_number is not None)
+
+    @property
+    def unchanged(self):
+        return self.rows - self.written - self.rejected
+
+
+def read_rows(stream, fmt):
+    """``(line number, row dict or error message)`` for each record of a text stream."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, f'invalid JSON: {e}'
+            continue
+        yield line_number, row if isinstance(row, dict) else 'expected a JSON object'
+
+
+def _text(row, field):
+    value = row.get(field)
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _number(row, field, convert, minimum):
+    value = _text(row, field)
+    if value is None:
+        return None
+    try:
+        number = convert(value)
+    except ValueError:
+        raise ValueError(f'{field} must be a number') from None
+    if not math.isfinite(number) or number < minimum:
+        raise ValueError(f'{field} must be at least {minimum}')
+    return number
+
+
+def _validate(row, categories, category_ids):
+    """Statement kind and parameters for one row; raises ValueError with a message for the report."""
+    name = _text(row, 'name')
+    if name is None:
+        raise ValueError('name is required')
+    price = _number(row, 'price', float, 0)
+    if price is None:
+        raise ValueError('price is required')
+
+    category_id = None
+    slug = _text(row, 'category')
+    if slug is not None:
+        category_id = categories.get(slug.lower())
+        if category_id is None:
+            raise ValueError(f'unknown category {slug!r}')
+    else:
+        category_id = _number(row, 'category_id', int, 1)
+        if category_id is not None and category_id not in category_ids:
+            raise ValueError(f'unknown category_id {category_id}')
+
+    params = {
+        'id': _number(row, 'id', int, 1),
+        'sku': _text(row, 'sku'),
+        'name': name,
+        'price': price,
+        'description': _text(row, 'description'),
+        'image_url': _text(row, 'image_url'),
+        'category_id': category_id,
+        'stock': _number(row, 'stock', int, 0),
+    }
+    kind = 'id' if params['id'] is not None else 'sku' if params['sku'] is not None else 'insert'
+    return kind, params
+
+
+def import_products(conn, stream, fmt, chunk_size=CHUNK_SIZE):
+    """Validate and upsert every row of ``stream`` (text, ``fmt`` one of ``FORMATS``); returns an ``ImportResult``."""
+    # Category slugs are resolved from memory, not per row
+    categories = {row[0].lower(): row[1] for row in conn.execute('SELECT slug, id FROM categories')}
+    category_ids = set(categories.values())
+    result = ImportResult()
+    rows = read_rows(stream, fmt)
+    done = False
+    while not done:
+        valid = []
+        read = 0
+        try:
+            for line_number, row in itertools.islice(rows, chunk_size):
+                read += 1
+                if isinstance(row, str):
+                    result.errors.append((line_number, row))
+                    continue
+                try:
+                    valid.append((line_number, *_validate(row, categories, category_ids)))
+                except ValueError as e:
+                    result.errors.append((line_number, str(e)))
+            done = read < chunk_size
+        except (UnicodeDecodeError, csv.Error) as e:
+            # The rest of the file is unreadable; keep the rows read before it
+            result.errors.append((None, f'could not read the rest of the file: {e}'))
+            done = True
+        result.rows += read
+        _write(conn, valid, result)
+    # Rows the database refused were found after the chunk's validation errors
+    result.errors.sort(key=lambda error: (error[0] is None, error[0] or 0))
+    return result
+
+
+def _write(conn, valid, result):
+    try:
+        with conn:
+            written = 0
+            # Consecutive rows of one kind go in one executemany, keeping file order
+            for kind, group in itertools.groupby(valid, key=lambda entry: entry[1]):
+                written += conn.executemany(_STATEMENTS[kind], [params for _, _, params in group]).rowcount
+        result.written += written
+    except sqlite3.IntegrityError:
+        # Find the rows the database refuses, keeping the rest of the chunk
+        with conn:
+            for line_number, kind, params in valid:
+                try:
+                    result.written += conn.execute(_STATEMENTS[kind], params).rowcount
+                except sqlite3.IntegrityError as e:
+                    result.errors.append((line_number, str(e)))
+
+
+def error_report(result):
+    """The errors of an import as CSV text."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(('line', 'error'))
+    writer.writerows(result.errors)
+    return buffer.getvalue()
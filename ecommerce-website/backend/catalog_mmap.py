@@ -0,0 +1,296 @@
+"""Memory-mapped binary catalog file.
+
+``export_catalog`` writes every product and category, their rating stats,
+per-category product lists and the listing sort orders into one versioned
+binary file; ``MappedCatalog`` maps it read-only.  Workers that boot from the
+file skip the catalog queries entirely, and because the mapping is shared
+through the OS page cache every worker on the host reads the same physical
+copy.  Records are decoded on access into short-lived objects.
+
+The file records the ``catalog_changes`` sequence number it was exported
+at, so a worker maps it and then applies only the changes made since (see
+``CatalogStore``).  Re-export it from time to time (``flask export-catalog``,
+or restart the gunicorn master) to keep that delta small.
+
+Layout, all little-endian:
+
+    header      magic, format version, change seq, counts, section offsets
+    products    fixed-size rows in id order (numbers inline, strings as heap refs)
+    categories  fixed-size rows in id order
+    members     per category: (start, count) into the member array, then the
+                member array itself (product positions in id order)
+    orders      per sort key: product positions in ascending key order, which
+                CatalogFilter takes as its sort permutations instead of sorting
+    strings     UTF-8 heap
+"""
+import heapq
+import mmap
+import os
+import struct
+from bisect import bisect_left
+from collections.abc import Mapping, Sequence
+
+from catalog import CatalogSnapshot, Category, Product, load_categories, load_products
+from catalog_sync import latest_change
+from facets import SORT_KEYS
+
+MAGIC = b'TGCATLG\0'
+FORMAT_VERSION = 1
+SORT_ORDERS = tuple(SORT_KEYS)
+
+_HEADER = struct.Struct('<8sHHQIIQQQQQ')
+# id, category_id, price, stock, average_rating, review_count, then (offset, length) for
+# name, description, image_url, created_at
+_PRODUCT = struct.Struct('<qqdqdq8I')
+# id, then (offset, length) for name, slug, description, created_at
+_CATEGORY = struct.Struct('<q8I')
+_SPAN = struct.Struct('<II')
+_ID = struct.Struct('<q')
+_NULL_ID = -(2 ** 63)
+_NULL_STRING = 0xFFFFFFFF
+
+
+class _StringHeap:
+    def __init__(self):
+        self.data = bytearray()
+
+    def add(self, value):
+        if value is None:
+            return 0, _NULL_STRING
+        encoded = str(value).encode('utf-8')
+        offset = len(self.data)
+        self.data += encoded
+        return offset, len(encoded)
+
+
+def export_catalog(conn, path):
+    """Write the catalog to ``path`` atomically and return the change seq it is current as of."""
+    seq = latest_change(conn)
+    products = list(load_products(conn).values())
+    categories = load_categories(conn)
+    heap = _StringHeap()
+
+    product_rows = bytearray()
+    for p in products:
+        product_rows += _PRODUCT.pack(p.id, _NULL_ID if p.category_id is None else p.category_id, p.price,
+                                      p.stock or 0, p.average_rating, p.review_count,
+                                      *heap.add(p.name), *heap.add(p.description),
+                                      *heap.add(p.image_url), *heap.add(p.created_at))
+
+    by_category = {}
+    for index, p in enumerate(products):
+        by_category.setdefault(p.category_id, []).append(index)
+
+    category_rows = bytearray()
+    spans = bytearray()
+    members = []
+    for c in categories:
+        category_rows += _CATEGORY.pack(c.id, *heap.add(c.name), *heap.add(c.slug),
+                                        *heap.add(c.description), *heap.add(c.created_at))
+        in_category = by_category.get(c.id, [])
+        spans += _SPAN.pack(len(members), len(in_category))
+        members += in_category
+
+    orders = bytearray()
+    for name in SORT_ORDERS:
+        key = SORT_KEYS[name]
+        orders += struct.pack(f'<{len(products)}I', *sorted(range(len(products)), key=lambda i: key(products[i])))
+
+    products_off = _HEADER.size
+    categories_off = products_off + len(product_rows)
+    members_off = categories_off + len(category_rows)
+    orders_off = members_off + len(spans) + 4 * len(members)
+    strings_off = orders_off + len(orders)
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, len(SORT_ORDERS), seq, len(products), len(categories),
+                          products_off, categories_off, members_off, orders_off, strings_off)
+
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as fh:
+        for chunk in (header, product_rows, category_rows, spans, struct.pack(f'<{len(members)}I', *members),
+                      orders, heap.data):
+            fh.write(chunk)
+    # Workers that already mapped the old file keep reading it until they re-open
+    os.replace(tmp_path, path)
+    return seq
+
+
+class MappedCatalog:
+    """Read-only view of an exported catalog file."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as fh:
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, sort_count, self.seq, self.product_count, self.category_count, self._products_off,
+         self._categories_off, self._members_off, self._orders_off, self._strings_off) = _HEADER.unpack_from(self._mm)
+        if magic != MAGIC or version != FORMAT_VERSION or sort_count != len(SORT_ORDERS):
+            self._mm.close()
+            raise ValueError(f'{path} is not a format {FORMAT_VERSION} catalog file')
+        self._ids = _IdColumn(self)
+        self._categories = tuple(self._category_at(index) for index in range(self.category_count))
+        self._category_by_id = {category.id: category for category in self._categories}
+        self._category_position = {category.id: position for position, category in enumerate(self._categories)}
+
+    @classmethod
+    def open(cls, path):
+        """The mapped file, or None if it is missing or in another format."""
+        try:
+            return cls(path)
+        except (OSError, ValueError, struct.error):
+            return None
+
+    def _string(self, offset, length):
+        if length == _NULL_STRING:
+            return None
+        start = self._strings_off + offset
+        return self._mm[start:start + length].decode('utf-8')
+
+    def product_at(self, position):
+        values = _PRODUCT.unpack_from(self._mm, self._products_off + position * _PRODUCT.size)
+        product = Product.__new__(Product)
+        product.id, category_id, product.price, product.stock, product.average_rating, product.review_count = values[:6]
+        product.category_id = None if category_id == _NULL_ID else category_id
+        product.name = self._string(*values[6:8])
+        product.description = self._string(*values[8:10])
+        product.image_url = self._string(*values[10:12])
+        product.created_at = self._string(*values[12:14])
+        category = self._category_by_id.get(product.category_id)
+        product.category_name = category.name if category else None
+        product.category_slug = category.slug if category else None
+        return product
+
+    def id_at(self, position):
+        return _ID.unpack_from(self._mm, self._products_off + position * _PRODUCT.size)[0]
+
+    def position_of(self, product_id):
+        position = bisect_left(self._ids, product_id)
+        if position < self.product_count and self._ids[position] == product_id:
+            return position
+        return None
+
+    def _category_at(self, position):
+        # Categories are few, so they are decoded once when the file is mapped
+        values = _CATEGORY.unpack_from(self._mm, self._categories_off + position * _CATEGORY.size)
+        category = Category.__new__(Category)
+        category.id = values[0]
+        category.name = self._string(*values[1:3])
+        category.slug = self._string(*values[3:5])
+        category.description = self._string(*values[5:7])
+        category.created_at = self._string(*values[7:9])
+        return category
+
+    def members(self, category_position):
+        start, count = _SPAN.unpack_from(self._mm, self._members_off + category_position * _SPAN.size)
+        base = self._members_off + self.category_count * _SPAN.size + 4 * start
+        return memoryview(self._mm)[base:base + 4 * count].cast('I')
+
+    def order(self, key):
+        """Product positions in ascending order of sort key ``key``."""
+        index = SORT_ORDERS.index(key)
+        base = self._orders_off + index * 4 * self.product_count
+        return memoryview(self._mm)[base:base + 4 * self.product_count].cast('I')
+
+    def snapshot(self, seq=None, overrides=None, categories=None):
+        """A ``CatalogSnapshot`` reading products straight from the mapping.
+
+        ``overrides`` maps product ids to newer records (None for deleted
+        products); they are layered over the file rather than copied into it.
+        """
+        overrides = overrides or {}
+        categories = self._categories if categories is None else categories
+        moved = {}
+        for product in overrides.values():
+            if product is not None:
+                moved.setdefault(product.category_id, []).append(product)
+        by_category = {}
+        for category in categories:
+            position = self._category_position.get(category.id)
+            members = self.members(position) if position is not None else ()
+            by_category[category.id] = MappedProductList(self, members, overrides, moved.get(category.id, ()))
+        return CatalogSnapshot(self.seq if seq is None else seq, MappedProducts(self, overrides), categories,
+                               by_category)
+
+
+class _IdColumn(Sequence):
+    """The product id of every row, indexable for ``bisect``."""
+
+    def __init__(self, catalog):
+        self._catalog = catalog
+
+    def __len__(self):
+        return self._catalog.product_count
+
+    def __getitem__(self, position):
+        return self._catalog.id_at(position)
+
+
+def _by_id(product):
+    return product.id
+
+
+class MappedProductList:
+    """Products at the given file positions, decoded on access, with overridden ones replaced.
+
+    ``added`` are override records that belong in this list; all lists are in id order.
+    """
+
+    def __init__(self, catalog, positions, overrides, added):
+        self._catalog = catalog
+        self._positions = positions
+        self._overrides = overrides
+        self._added = sorted(added, key=_by_id)
+        self._len = len(self._added) + sum(1 for position in positions if catalog.id_at(position) not in overrides) \
+            if overrides else len(positions)
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        catalog, overrides = self._catalog, self._overrides
+        base = (catalog.product_at(position) for position in self._positions
+                if not overrides or catalog.id_at(position) not in overrides)
+        return heapq.merge(base, self._added, key=_by_id) if self._added else base
+
+
+class MappedProducts(Mapping):
+    """Product id -> record mapping over the file plus overrides, iterated in id order."""
+
+    def __init__(self, catalog, overrides):
+        self._catalog = catalog
+        self._overrides = overrides
+        self._all = MappedProductList(catalog, range(catalog.product_count), overrides,
+                                      [p for p in overrides.values() if p is not None])
+
+    def __len__(self):
+        return len(self._all)
+
+    def __getitem__(self, product_id):
+        if product_id in self._overrides:
+            product = self._overrides[product_id]
+        else:
+            position = self._catalog.position_of(product_id)
+            product = None if position is None else self._catalog.product_at(position)
+        if product is None:
+            raise KeyError(product_id)
+        return product
+
+    def __iter__(self):
+        return (product.id for product in self._all)
+
+    def values(self):
+        return iter(self._all)
+
+    def items(self):
+        return ((product.id, product) for product in self._all)
+
+    def sort_orders(self):
+        """The file's records in position order, the file's sort orders and the overrides to apply on top."""
+        catalog = self._catalog
+        records = (catalog.product_at(position) for position in range(catalog.product_count))
+        return records, {key: catalog.order(key) for key in SORT_ORDERS}, self._overrides
+
+    def with_changes(self, seq, changed, removed, categories):
+        """``CatalogSnapshot.with_changes`` for a mapped catalog: the changes join the overrides."""
+        overrides = dict(self._overrides)
+        overrides.update(changed)
+        overrides.update(dict.fromkeys(removed))
+        return self._catalog.snapshot(seq, overrides, categories)
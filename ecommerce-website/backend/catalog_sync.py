@@ -0,0 +1,133 @@
+"""Product change log for keeping in-memory catalog state current.
+
+Every worker process keeps its own in-memory view of the catalog, and a
+write may commit in any of them.  Triggers append the id of every product
+whose listing data changed - the product row itself, its approved reviews
+or its category's name - to ``catalog_changes``.  Any change to the
+categories themselves also logs ``CATEGORIES_CHANGED``, a product id no
+product has.  Before serving from its in-memory state a worker reads the
+entries after the last sequence number it applied (a primary-key range
+scan), reloads just those products and, with them, the categories.
+
+The log keeps the most recent ``CHANGE_LOG_SIZE`` entries.  A worker that
+has fallen further behind than that, or that sees more changed products
+than a rebuild would cost, starts over from a full load.
+"""
+CHANGE_LOG_SIZE = 10000
+# Logged in place of a product id when a category is added, changed or removed
+CATEGORIES_CHANGED = 0
+
+CHANGE_LOG_SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS catalog_changes
+    (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        product_id INTEGER NOT NULL
+    )
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS catalog_changes_prune AFTER INSERT ON catalog_changes
+    BEGIN
+        DELETE FROM catalog_changes WHERE seq <= NEW.seq - {CHANGE_LOG_SIZE};
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS products_changed_insert AFTER INSERT ON products
+    BEGIN
+        INSERT INTO catalog_changes (product_id) VALUES (NEW.id);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS products_changed_update AFTER UPDATE ON products
+    BEGIN
+        INSERT INTO catalog_changes (product_id) VALUES (NEW.id);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS products_changed_delete AFTER DELETE ON products
+    BEGIN
+        INSERT INTO catalog_changes (product_id) VALUES (OLD.id);
+    END
+    ''',
+    # Only approved reviews count towards the rating stats
+    '''
+    CREATE TRIGGER IF NOT EXISTS reviews_changed_insert AFTER INSERT ON reviews
+    WHEN NEW.status = 'approved'
+    BEGIN
+        INSERT INTO catalog_changes (product_id) VALUES (NEW.product_id);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS reviews_changed_update AFTER UPDATE OF status, rating, product_id ON reviews
+    WHEN NEW.status = 'approved' OR OLD.status = 'approved'
+    BEGIN
+        INSERT INTO catalog_changes (product_id) VALUES (OLD.product_id);
+        INSERT INTO catalog_changes (product_id) SELECT NEW.product_id WHERE NEW.product_id != OLD.product_id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS reviews_changed_delete AFTER DELETE ON reviews
+    WHEN OLD.status = 'approved'
+    BEGIN
+        INSERT INTO catalog_changes (product_id) VALUES (OLD.product_id);
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS categories_changed_insert AFTER INSERT ON categories
+    BEGIN
+        INSERT INTO catalog_changes (product_id) VALUES ({CATEGORIES_CHANGED});
+    END
+    ''',
+    # Products carry their category's name and slug
+    f'''
+    CREATE TRIGGER IF NOT EXISTS categories_changed_update AFTER UPDATE ON categories
+    BEGIN
+        INSERT INTO catalog_changes (product_id) VALUES ({CATEGORIES_CHANGED});
+        INSERT INTO catalog_changes (product_id)
+        SELECT id FROM products
+        WHERE category_id = NEW.id AND (NEW.name IS NOT OLD.name OR NEW.slug IS NOT OLD.slug);
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS categories_changed_delete AFTER DELETE ON categories
+    BEGIN
+        INSERT INTO catalog_changes (product_id) VALUES ({CATEGORIES_CHANGED});
+        INSERT INTO catalog_changes (product_id) SELECT id FROM products WHERE category_id = OLD.id;
+    END
+    ''',
+)
+
+
+def install_change_log(conn):
+    # Replaced by a version that logs every category change
+    conn.execute('DROP TRIGGER IF EXISTS categories_changed_update')
+    for statement in CHANGE_LOG_SCHEMA:
+        conn.execute(statement)
+
+
+def latest_change(conn):
+    """Sequence number of the newest change; a full load taken now is current as of it."""
+    row = conn.execute('SELECT MAX(seq) FROM catalog_changes').fetchone()
+    return row[0] or 0
+
+
+def changes_since(conn, seq, max_products):
+    """Return ``(latest_seq, product_ids)`` for the changes after ``seq``.
+
+    ``product_ids`` is None when the caller must reload everything: the log
+    no longer reaches back to ``seq`` or more than ``max_products`` products changed.
+    ``CATEGORIES_CHANGED`` entries are left out of it; ``latest_seq`` past
+    ``seq`` with no product ids means only the categories changed.
+    """
+    rows = conn.execute('SELECT seq, product_id FROM catalog_changes WHERE seq > ? ORDER BY seq',
+                        (seq,)).fetchall()
+    if not rows:
+        return seq, set()
+    latest = rows[-1][0]
+    if rows[0][0] != seq + 1:
+        return latest, None
+    product_ids = {row[1] for row in rows}
+    product_ids.discard(CATEGORIES_CHANGED)
+    if len(product_ids) > max_products:
+        return latest, None
+    return latest, product_ids
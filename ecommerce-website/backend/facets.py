@@ -0,0 +1,322 @@
+"""In-memory faceted filtering for the product listing and advanced search pages.
+
+``CatalogFilter`` indexes the product records of the catalog snapshot
+(see ``catalog.py``) for the filters those pages offer:
+
+* each product gets a slot number, and each category, price bucket and the
+  in-stock set is a bitset over slots (a Python int),
+* every sort key has a sorted ``(value, slot)`` permutation over the whole
+  catalog and one per category; the price permutation also answers an
+  arbitrary min/max range with two bisections.
+
+A query ANDs the bitsets of the active filters (a text query is a scan over
+the lower-cased names and descriptions, plus the bitsets of categories whose
+name matches).  Results are read off the permutation for the sort key -
+the category's own one when filtering by category - so an unfiltered or
+category-only listing is a plain slice and a filtered one a walk that skips
+non-matches and stops once the requested page is full.  Only small result
+sets are sorted directly.  Facet counts are popcounts of the same bitsets:
+each facet is counted with every *other* active filter applied, so the
+numbers say how many results picking that option would give.
+
+When a text query matches fewer than ``fuzzy_below`` products, the most
+similar products from a trigram index (see ``trigram.py``) are added to the
+text matches, so a misspelt query still finds something and every other
+filter and facet still applies.
+
+The ``popular`` sort orders by a view-count mapping passed in with the query
+(see ``view_counts.py``); those counts change all the time, so that sort is
+done per query rather than kept as a permutation.
+
+The filter subscribes to the worker's ``CatalogStore`` and updates in place
+for just the products that changed whenever a new snapshot is swapped in.
+A snapshot mapped from a catalog file (see ``catalog_mmap.py``) brings the
+global sort permutations with it, so a full load takes them from the file
+and derives the per-category ones in one pass instead of sorting.
+"""
+import bisect
+import itertools
+import threading
+
+# (low, high) price bounds; high is exclusive and None means unbounded
+PRICE_BUCKETS = ((0, 50), (50, 100), (100, 250), (250, 500), (500, 1000), (1000, None))
+
+SORT_KEYS = {
+    'name': lambda p: p.name,
+    'price': lambda p: p.price,
+    'rating': lambda p: p.average_rating,
+    'date': lambda p: p.created_at or '',
+    'reviews': lambda p: p.review_count,
+}
+
+# Result sets smaller than 1/SORT_DIRECT_RATIO of the permutation are sorted rather than walked
+SORT_DIRECT_RATIO = 16
+
+
+def price_bucket(price):
+    for index, (low, high) in enumerate(PRICE_BUCKETS):
+        if price >= low and (high is None or price < high):
+            return index
+    return 0
+
+
+def _popcount(mask):
+    return bin(mask).count('1')
+
+
+def _iter_slots(mask):
+    data = mask.to_bytes((mask.bit_length() + 7) // 8, 'little')
+    for index, byte in enumerate(data):
+        while byte:
+            low = byte & -byte
+            yield index * 8 + low.bit_length() - 1
+            byte ^= low
+
+
+def _slot_flags(mask, size):
+    """One byte per slot, 1 where ``mask`` has the bit set."""
+    return bin(mask)[:1:-1].encode().translate(_BIT_BYTES).ljust(size, b'\0')
+
+
+_BIT_BYTES = bytes.maketrans(b'01', b'\0\1')
+
+
+def _descending(order):
+    """Runs of an ascending ``(value, slot)`` permutation from the largest value down; equal values stay in slot order."""
+    end = len(order)
+    while end:
+        start = bisect.bisect_left(order, (order[end - 1][0],))
+        yield order[start:end]
+        end = start
+
+
+class CatalogFilter:
+    def __init__(self, fuzzy=None, fuzzy_below=0):
+        self.fuzzy = fuzzy
+        self.fuzzy_below = fuzzy_below
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self._records = []          # slot -> Product, None for a free slot
+        self._text = []             # slot -> lower-cased name and description
+        self._category_names = {}   # category id -> lower-cased name
+        self._slot_of = {}          # product id -> slot
+        self._free = []
+        self._all = 0
+        self._in_stock = 0
+        self._by_category = {}
+        self._by_bucket = [0] * len(PRICE_BUCKETS)
+        self._orders = {key: [] for key in SORT_KEYS}   # sort key -> sorted (value, slot)
+        self._category_orders = {}  # category id -> sort key -> sorted (value, slot)
+        self._prices = self._orders['price']
+
+    def __len__(self):
+        return len(self._slot_of)
+
+    # -- maintenance -------------------------------------------------------
+
+    def load(self, products, orders=None, overrides=None):
+        """Index ``products`` from scratch.
+
+        ``orders`` maps each sort key to the positions of ``products`` in
+        ascending key order; given, it is used instead of sorting.
+        ``overrides`` (product id to a newer record, None when removed) are
+        applied on top.
+        """
+        with self._lock:
+            self._clear()
+            for product in products:
+                self._add(product, presorted=False, ordered=orders is None)
+            if orders is None:
+                for key_orders in itertools.chain((self._orders,), self._category_orders.values()):
+                    for order in key_orders.values():
+                        order.sort()
+            else:
+                self._seed_orders(orders)
+            for product_id, product in (overrides or {}).items():
+                self._remove(product_id)
+                if product is not None:
+                    self._add(product)
+
+    def _seed_orders(self, orders):
+        # Slots were handed out in product order, so a position is a slot; ties keep slot order as a sort would
+        records = self._records
+        for key, positions in orders.items():
+            value = SORT_KEYS[key]
+            order = self._orders[key]
+            order[:] = [(value(records[slot]), slot) for slot in positions]
+            for entry in order:
+                self._category_orders[records[entry[1]].category_id][key].append(entry)
+
+    def upsert(self, product):
+        with self._lock:
+            self._remove(product.id)
+            self._add(product)
+
+    def remove(self, product_id):
+        with self._lock:
+            self._remove(product_id)
+
+    def _add(self, product, presorted=True, ordered=True):
+        slot = self._free.pop() if self._free else len(self._records)
+        if slot == len(self._records):
+            self._records.append(None)
+            self._text.append('')
+        bit = 1 << slot
+        self._records[slot] = product
+        self._text[slot] = f"{product.name} {product.description or ''}".lower()
+        self._slot_of[product.id] = slot
+        self._all |= bit
+        if product.stock > 0:
+            self._in_stock |= bit
+        self._by_category[product.category_id] = self._by_category.get(product.category_id, 0) | bit
+        self._category_names[product.category_id] = (product.category_name or '').lower()
+        self._by_bucket[price_bucket(product.price)] |= bit
+        category_orders = self._category_orders.get(product.category_id)
+        if category_orders is None:
+            category_orders = self._category_orders[product.category_id] = {key: [] for key in SORT_KEYS}
+        if not ordered:
+            return
+        for key, value in SORT_KEYS.items():
+            entry = (value(product), slot)
+            for order in (self._orders[key], category_orders[key]):
+                if presorted:
+                    bisect.insort(order, entry)
+                else:
+                    order.append(entry)
+
+    def _remove(self, product_id):
+        slot = self._slot_of.pop(product_id, None)
+        if slot is None:
+            return
+        product = self._records[slot]
+        keep = ~(1 << slot)
+        self._all &= keep
+        self._in_stock &= keep
+        self._by_category[product.category_id] &= keep
+        self._by_bucket[price_bucket(product.price)] &= keep
+        category_orders = self._category_orders[product.category_id]
+        for key, value in SORT_KEYS.items():
+            entry = (value(product), slot)
+            for order in (self._orders[key], category_orders[key]):
+                del order[bisect.bisect_left(order, entry)]
+        self._records[slot] = None
+        self._text[slot] = ''
+        self._free.append(slot)
+
+    def apply(self, snapshot, changed):
+        """``CatalogStore`` listener: re-index the changed products, or everything when ``changed`` is None."""
+        if changed is None:
+            presorted = snapshot.sort_orders()
+            if presorted is None:
+                self.load(snapshot.products.values())
+            else:
+                self.load(*presorted)
+            return
+        for product_id in changed:
+            product = snapshot.product(product_id)
+            if product is None:
+                self.remove(product_id)
+            else:
+                self.upsert(product)
+
+    # -- queries -----------------------------------------------------------
+
+    def price_range(self):
+        with self._lock:
+            if not self._prices:
+                return {'min_price': None, 'max_price': None}
+            return {'min_price': self._prices[0][0], 'max_price': self._prices[-1][0]}
+
+    def _mask_from_slots(self, slots):
+        buf = bytearray((len(self._records) + 7) // 8)
+        for slot in slots:
+            buf[slot >> 3] |= 1 << (slot & 7)
+        return int.from_bytes(buf, 'little')
+
+    def _price_mask(self, min_price, max_price):
+        if min_price is None and max_price is None:
+            return self._all
+        lo = 0 if min_price is None else bisect.bisect_left(self._prices, (min_price, -1))
+        hi = len(self._prices) if max_price is None else bisect.bisect_right(self._prices,
+                                                                             (max_price, float('inf')))
+        return self._mask_from_slots(slot for _, slot in self._prices[lo:hi])
+
+    def _text_mask(self, query, category_names):
+        needle = query.lower()
+        mask = self._mask_from_slots(slot for slot, text in enumerate(self._text) if text and needle in text)
+        if category_names:
+            for category_id, name in self._category_names.items():
+                if needle in name:
+                    mask |= self._by_category[category_id]
+        return mask
+
+    def _sorted(self, matches, count, category_id, sort_by, descending, offset, limit):
+        """Matching records in sort order, ``offset`` and ``limit`` applied."""
+        orders = self._category_orders.get(category_id, {}) if category_id else self._orders
+        order = orders.get(sort_by, ())
+        stop = None if limit is None else offset + limit
+        if count * SORT_DIRECT_RATIO < len(order):
+            products = [self._records[slot] for slot in _iter_slots(matches)]
+            products.sort(key=SORT_KEYS[sort_by], reverse=descending)
+            return products[offset:stop]
+
+        records = self._records
+        walk = itertools.chain.from_iterable(_descending(order)) if descending else order
+        if count == len(order):
+            return [records[slot] for _, slot in itertools.islice(walk, offset, stop)]
+        selected = _slot_flags(matches, len(records))
+        if offset or stop is not None:
+            walk = itertools.islice((entry for entry in walk if selected[entry[1]]), offset, stop)
+            return [records[slot] for _, slot in walk]
+        return [records[slot] for _, slot in walk if selected[slot]]
+
+    def _popular(self, matches, popularity, offset, limit):
+        """Matching records, most viewed first, ``offset`` and ``limit`` applied."""
+        products = [self._records[slot] for slot in _iter_slots(matches)]
+        products.sort(key=lambda p: (-popularity.get(p.id, 0), p.name))
+        return products[offset:None if limit is None else offset + limit]
+
+    def search(self, query='', category_id=None, min_price=None, max_price=None, in_stock=False,
+               sort_by='name', sort_order='asc', category_names=True, offset=0, limit=None, popularity=None):
+        """Return ``(products, facets)`` for one combination of filters.
+
+        ``query`` matches product names and descriptions, and category names
+        unless ``category_names`` is false.  ``offset`` and ``limit`` select
+        one page of the sorted results; ``facets['total']`` counts them all.
+        ``facets['fuzzy']`` is true when similar products were added to the
+        text matches.  ``sort_by='popular'`` needs ``popularity``, a mapping
+        of product id to views.
+        """
+        with self._lock:
+            base = self._text_mask(query, category_names) if query else self._all
+            fuzzy = False
+            if query and self.fuzzy is not None and _popcount(base) < self.fuzzy_below:
+                similar = self._mask_from_slots(self._slot_of[product_id]
+                                                for product_id, _ in self.fuzzy.search(query, category_names=category_names)
+                                                if product_id in self._slot_of)
+                fuzzy = similar & ~base != 0
+                base |= similar
+            category = self._by_category.get(category_id, 0) if category_id else self._all
+            price = self._price_mask(min_price, max_price)
+            stock = self._in_stock if in_stock else self._all
+
+            matches = base & category & price & stock
+            total = _popcount(matches)
+            if sort_by == 'popular' and popularity is not None:
+                products = self._popular(matches, popularity, offset, limit)
+            elif sort_by in SORT_KEYS:
+                products = self._sorted(matches, total, category_id, sort_by, sort_order == 'desc', offset, limit)
+            else:
+                products = self._sorted(matches, total, category_id, 'date', True, offset, limit)
+            facets = {
+                'total': total,
+                'categories': {cid: _popcount(base & price & stock & bits)
+                               for cid, bits in self._by_category.items()},
+                'price_buckets': [{'min': low, 'max': high, 'count': _popcount(base & category & stock & bits)}
+                                  for (low, high), bits in zip(PRICE_BUCKETS, self._by_bucket)],
+                'in_stock': _popcount(base & category & price & self._in_stock),
+                'fuzzy': fuzzy,
+            }
+        return products, facets
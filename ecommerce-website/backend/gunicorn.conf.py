@@ -0,0 +1,86 @@
+"""gunicorn settings for TechGadgets.
+
+SQLite allows one writer at a time across all processes, so extra workers
+only add read capacity; every write still queues on the database lock.
+Defaults are sized for that:
+
+* ``WEB_CONCURRENCY`` workers - one per CPU core, capped at 8.  Under WAL
+  readers in different workers never block each other.
+* ``WEB_THREADS`` threads per worker - a few, because sqlite3 releases the
+  GIL while a query runs but more threads mostly add lock waiting.
+* Writers wait up to ``DATABASE_TIMEOUT`` seconds for the lock before
+  failing with "database is locked"; keep it above the slowest write
+  transaction and below ``timeout``.
+
+Workers are recycled after ``max_requests`` (with jitter so they do not all
+restart together), finishing in-flight requests within ``graceful_timeout``.
+
+The master exports the catalog to ``CATALOG_FILE`` (next to the database
+unless set) at start-up and on HUP; workers map it instead of loading the
+catalog themselves, so a fresh or recycled worker is ready at once.  The
+master runs the database setup and the export as ``flask`` CLI subprocesses
+and never imports the app, so workers forked after a HUP load the new code.
+"""
+import multiprocessing
+import os
+import subprocess
+import sys
+
+os.environ.setdefault('CATALOG_FILE', os.path.abspath(os.environ.get('DATABASE', 'ecommerce.db')) + '.catalog')
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count(), 8)))
+threads = int(os.environ.get('WEB_THREADS', 4))
+worker_class = 'gthread'
+
+# Graceful recycling bounds the damage of slow leaks and fragmentation
+max_requests = int(os.environ.get('MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.environ.get('MAX_REQUESTS_JITTER', 200))
+graceful_timeout = 30
+timeout = 60
+keepalive = 5
+
+# Load the app in each worker, never in the master, so nothing is shared by accident
+preload_app = False
+
+# Our own JSON access log (app_logging.py) already covers every request
+accesslog = None
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info').lower()
+
+
+def _flask(*args):
+    """Run a ``flask`` CLI command of the app in a child process; raises CalledProcessError if it fails."""
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'minimal_app:create_app()', *args],
+                   cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+
+
+def on_starting(server):
+    """Create or migrate the database once, before any worker is forked."""
+    _flask('init-db')
+    _export_catalog(server)
+
+
+def on_reload(server):
+    try:
+        _export_catalog(server)
+    except subprocess.CalledProcessError:
+        # New workers start from the previous file plus the changes logged since, or from the database
+        server.log.exception('Catalog export failed')
+
+
+def _export_catalog(server):
+    if os.environ['CATALOG_FILE']:
+        _flask('export-catalog')
+        server.log.info('Exported catalog to %s', os.environ['CATALOG_FILE'])
+
+
+def worker_exit(server, worker):
+    # Write pending view counts and flush queued log records before the process goes away
+    from app_logging import stop_logging
+    from minimal_app import flush_view_counts
+
+    try:
+        flush_view_counts()
+    finally:
+        stop_logging()
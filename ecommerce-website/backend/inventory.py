@@ -0,0 +1,95 @@
+"""Batched stock and price updates for inventory sync.
+
+``apply_updates`` takes a list of updates, each a dict with a
+``product_id`` and any of ``stock`` (the new level), ``stock_delta`` (an
+amount to add or, negative, take off) and ``price``, and applies them all
+in one ``BEGIN IMMEDIATE`` transaction: the touched products are read
+once, the updates are folded over them in order - several updates to one
+product accumulate - and each product that ends up different is written
+with a single ``executemany``.  Holding the write lock from the read
+onwards means a checkout committing at the same time cannot be lost
+between a delta being read and written.
+
+Every update gets a result, in request order: ``updated`` or ``unchanged``
+with the product's resulting stock and price, or ``error`` with a message
+(unknown product, invalid values, stock that would drop below zero).  A
+failed update does not stop the others.  Only products whose values
+changed are written, so the change log - and with it every worker's
+catalog reload - sees just those products; a sync that repeats the current
+levels invalidates nothing.
+"""
+import json
+import math
+
+UPDATE_FIELDS = ('product_id', 'stock', 'stock_delta', 'price')
+
+
+def _integer(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def validate(update):
+    """Error message for one update, or None if it is well formed."""
+    if not isinstance(update, dict):
+        return 'expected an object'
+    unknown = [field for field in update if field not in UPDATE_FIELDS]
+    if unknown:
+        return f"unknown fields: {', '.join(unknown)}"
+    if not _integer(update.get('product_id')):
+        return 'product_id must be an integer'
+    if 'stock' in update and 'stock_delta' in update:
+        return 'give stock or stock_delta, not both'
+    if not any(field in update for field in ('stock', 'stock_delta', 'price')):
+        return 'nothing to update: give stock, stock_delta or price'
+    if 'stock' in update and not (_integer(update['stock']) and update['stock'] >= 0):
+        return 'stock must be a non-negative integer'
+    if 'stock_delta' in update and not _integer(update['stock_delta']):
+        return 'stock_delta must be an integer'
+    if 'price' in update:
+        price = update['price']
+        if not (isinstance(price, (int, float)) and not isinstance(price, bool)
+                and math.isfinite(price) and price >= 0):
+            return 'price must be a non-negative number'
+    return None
+
+
+def apply_updates(conn, updates):
+    """Apply ``updates`` in one transaction; returns ``(results, ids of the products written)``."""
+    errors = [validate(update) for update in updates]
+    product_ids = {update['product_id'] for update, error in zip(updates, errors) if error is None}
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        current = {row[0]: (row[1] or 0, row[2]) for row in conn.execute(
+            'SELECT id, stock, price FROM products WHERE id IN (SELECT value FROM json_each(?))',
+            (json.dumps(sorted(product_ids)),))}
+        state = dict(current)
+        results = []
+        for update, error in zip(updates, errors):
+            product_id = update.get('product_id') if isinstance(update, dict) else None
+            if error is None and product_id not in state:
+                error = 'product not found'
+            if error is None:
+                stock, price = state[product_id]
+                if 'stock' in update:
+                    new_stock = update['stock']
+                else:
+                    new_stock = stock + update.get('stock_delta', 0)
+                if new_stock < 0:
+                    error = f'stock would drop below 0 (it is {stock})'
+            if error is not None:
+                results.append({'product_id': product_id, 'status': 'error', 'error': error})
+                continue
+            new = (new_stock, update.get('price', price))
+            state[product_id] = new
+            results.append({'product_id': product_id, 'status': 'updated' if new != (stock, price) else 'unchanged',
+                            'stock': new[0], 'price': new[1]})
+
+        changed = {product_id: values for product_id, values in state.items() if values != current[product_id]}
+        conn.executemany('UPDATE products SET stock = ?, price = ? WHERE id = ?',
+                         [(stock, price, product_id) for product_id, (stock, price) in changed.items()])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return results, sorted(changed)
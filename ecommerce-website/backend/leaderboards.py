@@ -0,0 +1,215 @@
+"""Bestseller leaderboards maintained as orders complete.
+
+``bestsellers`` holds units sold and revenue per product for each period
+(``all``, ``7d``, ``30d``), once store-wide (``category_id`` 0) and once for
+the product's category.  An index on ``(period, category_id, units)`` makes
+reading a top-N list an ordered index scan of N rows, however many orders
+there are.
+
+Triggers on ``orders`` keep the boards current: an order moving to
+``completed`` adds its lines, and one moving away from it (a refund, a
+correction) takes them off again.  Sales are also bucketed per order day in
+``product_sales_daily``; rolling boards only ever grow between refreshes, so
+``refresh_rolling`` - run it from cron, at least daily - rebuilds the ``7d``
+and ``30d`` boards from the buckets still inside each window and drops
+buckets older than that.
+
+    flask --app "minimal_app:create_app()" refresh-leaderboards [--rebuild]
+
+``--rebuild`` recomputes every board from the orders themselves, e.g. after
+products moved between categories.  Orders moved out to the archive
+(``order_archive.py``) leave their sales behind in ``archived_sales``
+(``record_archived_sales``), which the rebuild adds back in.
+"""
+PERIODS = {'all': None, '7d': 7, '30d': 30}
+
+# Sales of one order, per product, as seen by the orders triggers (an idx_order_items_order lookup)
+_ORDER_SALES = '''
+    SELECT oi.product_id, COALESCE(p.category_id, 0) AS category_id,
+           SUM(oi.quantity) AS units, SUM(oi.total_price) AS revenue
+    FROM order_items oi
+             LEFT JOIN products p ON p.id = oi.product_id
+    WHERE oi.order_id = NEW.id
+    GROUP BY oi.product_id
+'''
+
+def _order_boards():
+    """The boards an order dated NEW.created_at counts towards, as ``(period, scope)`` rows.
+
+    Scope 0 is the store-wide board, 1 the board of the product's category.
+    """
+    selects = []
+    for period, days in PERIODS.items():
+        condition = '1' if days is None else f"date(NEW.created_at) > date('now', '-{days} days')"
+        selects += [f"SELECT '{period}' AS period, {scope} AS scope WHERE {condition}" for scope in (0, 1)]
+    return ' UNION ALL '.join(selects)
+
+
+def _order_trigger(name, when, sign):
+    # Lines taken off entirely leave no empty rows behind, on the boards or in the day buckets
+    cleanup = '''
+        DELETE FROM bestsellers
+        WHERE units <= 0 AND product_id IN (SELECT product_id FROM order_items WHERE order_id = NEW.id);
+        DELETE FROM product_sales_daily
+        WHERE units <= 0 AND day = date(NEW.created_at)
+          AND product_id IN (SELECT product_id FROM order_items WHERE order_id = NEW.id);''' \
+        if sign else ''
+    return f'''
+    CREATE TRIGGER IF NOT EXISTS {name} AFTER UPDATE OF status ON orders
+    WHEN {when}
+    BEGIN
+        INSERT INTO product_sales_daily (day, product_id, units, revenue)
+        SELECT date(NEW.created_at), product_id, {sign} units, {sign} revenue FROM ({_ORDER_SALES}) WHERE 1
+        ON CONFLICT (day, product_id) DO UPDATE SET units   = units + excluded.units,
+                                                    revenue = revenue + excluded.revenue;
+        INSERT INTO bestsellers (period, category_id, product_id, units, revenue)
+        SELECT b.period, CASE WHEN b.scope = 1 THEN s.category_id ELSE 0 END, s.product_id,
+               {sign} s.units, {sign} s.revenue
+        FROM ({_order_boards()}) b, ({_ORDER_SALES}) s
+        WHERE b.scope = 0 OR s.category_id != 0
+        ON CONFLICT (period, category_id, product_id) DO UPDATE SET units   = units + excluded.units,
+                                                                    revenue = revenue + excluded.revenue;{cleanup}
+    END
+    '''
+
+
+LEADERBOARD_TRIGGERS = ('orders_completed', 'orders_uncompleted')
+
+LEADERBOARD_SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS bestsellers
+    (
+        period TEXT NOT NULL,
+        category_id INTEGER NOT NULL,
+        product_id INTEGER NOT NULL,
+        units INTEGER NOT NULL,
+        revenue REAL NOT NULL,
+        PRIMARY KEY (period, category_id, product_id)
+    ) WITHOUT ROWID
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_bestsellers_rank ON bestsellers (period, category_id, units DESC, product_id)',
+    '''
+    CREATE TABLE IF NOT EXISTS product_sales_daily
+    (
+        day TEXT NOT NULL,
+        product_id INTEGER NOT NULL,
+        units INTEGER NOT NULL,
+        revenue REAL NOT NULL,
+        PRIMARY KEY (day, product_id)
+    ) WITHOUT ROWID
+    ''',
+    # Completed sales of archived orders, per day, so rebuilds still count them
+    '''
+    CREATE TABLE IF NOT EXISTS archived_sales
+    (
+        day TEXT NOT NULL,
+        product_id INTEGER NOT NULL,
+        units INTEGER NOT NULL,
+        revenue REAL NOT NULL,
+        PRIMARY KEY (day, product_id)
+    ) WITHOUT ROWID
+    ''',
+    _order_trigger('orders_completed', "NEW.status = 'completed' AND OLD.status IS NOT 'completed'", ''),
+    _order_trigger('orders_uncompleted', "OLD.status = 'completed' AND NEW.status IS NOT 'completed'", '-'),
+)
+
+
+def install_leaderboards(conn):
+    """Create the tables and triggers; the first time, fill them from the orders completed so far."""
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'bestsellers'").fetchone()
+    # Triggers are recreated so a database picks up changes to their bodies
+    for name in LEADERBOARD_TRIGGERS:
+        conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+    for statement in LEADERBOARD_SCHEMA:
+        conn.execute(statement)
+    if not exists:
+        rebuild(conn)
+    else:
+        # Left behind by refunds before the uncompleted trigger cleaned up its day buckets
+        conn.execute('DELETE FROM product_sales_daily WHERE units <= 0')
+
+
+def _insert_boards(conn, period, since=''):
+    """Fill one period's store-wide and per-category boards from the daily buckets from ``since`` on."""
+    conn.execute('''
+                 INSERT INTO bestsellers (period, category_id, product_id, units, revenue)
+                 SELECT ?, 0, product_id, SUM(units), SUM(revenue)
+                 FROM product_sales_daily
+                 WHERE day >= ?
+                 GROUP BY product_id
+                 HAVING SUM(units) > 0
+                 ''', (period, since))
+    conn.execute('''
+                 INSERT INTO bestsellers (period, category_id, product_id, units, revenue)
+                 SELECT ?, p.category_id, d.product_id, SUM(d.units), SUM(d.revenue)
+                 FROM product_sales_daily d
+                          JOIN products p ON p.id = d.product_id
+                 WHERE d.day >= ?
+                   AND p.category_id IS NOT NULL
+                 GROUP BY d.product_id
+                 HAVING SUM(d.units) > 0
+                 ''', (period, since))
+
+
+def rebuild(conn):
+    """Recompute the daily buckets and every board from the completed orders."""
+    conn.execute('DELETE FROM product_sales_daily')
+    conn.execute('''
+                 INSERT INTO product_sales_daily (day, product_id, units, revenue)
+                 SELECT date(o.created_at), oi.product_id, SUM(oi.quantity), SUM(oi.total_price)
+                 FROM orders o
+                          JOIN order_items oi ON oi.order_id = o.id
+                 WHERE o.status = 'completed'
+                 GROUP BY date(o.created_at), oi.product_id
+                 ''')
+    conn.execute('''
+                 INSERT INTO product_sales_daily (day, product_id, units, revenue)
+                 SELECT day, product_id, units, revenue
+                 FROM archived_sales
+                 WHERE 1
+                 ON CONFLICT (day, product_id) DO UPDATE SET units   = units + excluded.units,
+                                                             revenue = revenue + excluded.revenue
+                 ''')
+    conn.execute('DELETE FROM bestsellers')
+    _insert_boards(conn, 'all')
+    refresh_rolling(conn, prune=False)
+
+
+def record_archived_sales(conn, order_ids):
+    """Keep the completed sales of ``order_ids`` (a JSON array) before the orders leave this database."""
+    conn.execute('''
+                 INSERT INTO archived_sales (day, product_id, units, revenue)
+                 SELECT date(o.created_at), oi.product_id, SUM(oi.quantity), SUM(oi.total_price)
+                 FROM orders o
+                          JOIN order_items oi ON oi.order_id = o.id
+                 WHERE o.id IN (SELECT value FROM json_each(?))
+                   AND o.status = 'completed'
+                 GROUP BY date(o.created_at), oi.product_id
+                 ON CONFLICT (day, product_id) DO UPDATE SET units   = units + excluded.units,
+                                                             revenue = revenue + excluded.revenue
+                 ''', (order_ids,))
+
+
+def refresh_rolling(conn, prune=True):
+    """Rebuild the rolling boards from the days still inside their windows."""
+    for period, days in PERIODS.items():
+        if days is None:
+            continue
+        since = conn.execute("SELECT date('now', ?)", (f'-{days - 1} days',)).fetchone()[0]
+        conn.execute('DELETE FROM bestsellers WHERE period = ?', (period,))
+        _insert_boards(conn, period, since)
+    if prune:
+        longest = max(days for days in PERIODS.values() if days)
+        conn.execute("DELETE FROM product_sales_daily WHERE day < date('now', ?)", (f'-{longest - 1} days',))
+
+
+def top_products(conn, period='all', category_id=0, limit=10):
+    """``(product_id, units, revenue)`` rows of one board, best selling first."""
+    return conn.execute('''
+                        SELECT product_id, units, revenue
+                        FROM bestsellers
+                        WHERE period = ?
+                          AND category_id = ?
+                          AND units > 0
+                        ORDER BY units DESC, product_id LIMIT ?
+                        ''', (period, category_id, limit)).fetchall()
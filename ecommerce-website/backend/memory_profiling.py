@@ -0,0 +1,95 @@
+"""tracemalloc controls for finding allocation-heavy code.
+
+Admins start tracing from ``/admin/memory``, take named snapshots around
+the traffic they care about and diff any two snapshots grouped by
+allocation site.  Tracing slows every allocation down, so it is off by
+default and should only be left on while investigating.
+"""
+import linecache
+import threading
+import time
+import tracemalloc
+
+# Allocations made by the tracing machinery itself are noise in every diff
+NOISE_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, linecache.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+GROUPINGS = ('lineno', 'filename', 'traceback')
+
+
+class MemoryProfiler:
+    """Keeps up to ``max_snapshots`` named snapshots; the oldest is dropped first."""
+
+    def __init__(self, max_snapshots=10):
+        self.max_snapshots = max_snapshots
+        self._snapshots = {}
+        self._lock = threading.Lock()
+
+    @property
+    def tracing(self):
+        return tracemalloc.is_tracing()
+
+    def start(self, frames=10):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    def stop(self):
+        """Stop tracing.  Snapshots already taken remain available for diffing."""
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def take_snapshot(self, name):
+        if not tracemalloc.is_tracing():
+            raise RuntimeError('tracemalloc is not tracing')
+        snapshot = tracemalloc.take_snapshot().filter_traces(NOISE_FILTERS)
+        with self._lock:
+            self._snapshots.pop(name, None)
+            self._snapshots[name] = (snapshot, time.time())
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.pop(next(iter(self._snapshots)))
+        return snapshot
+
+    def delete_snapshot(self, name):
+        with self._lock:
+            self._snapshots.pop(name, None)
+
+    def snapshots(self):
+        with self._lock:
+            items = list(self._snapshots.items())
+        return [{
+            'name': name,
+            'taken_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(taken_at)),
+            'size_kb': sum(stat.size for stat in snapshot.statistics('filename')) / 1024,
+            'blocks': len(snapshot.traces),
+        } for name, (snapshot, taken_at) in items]
+
+    def _get(self, name):
+        with self._lock:
+            entry = self._snapshots.get(name)
+        if entry is None:
+            raise KeyError(name)
+        return entry[0]
+
+    def top(self, name, group_by='lineno', limit=25):
+        """Largest allocation sites in one snapshot."""
+        stats = self._get(name).statistics(group_by)[:limit]
+        return [{'site': _site(stat.traceback, group_by), 'size_kb': stat.size / 1024, 'count': stat.count}
+                for stat in stats]
+
+    def diff(self, old_name, new_name, group_by='lineno', limit=25):
+        """Allocation sites whose retained size changed most between two snapshots."""
+        stats = self._get(new_name).compare_to(self._get(old_name), group_by)[:limit]
+        return [{'site': _site(stat.traceback, group_by), 'size_diff_kb': stat.size_diff / 1024,
+                 'size_kb': stat.size / 1024, 'count_diff': stat.count_diff, 'count': stat.count}
+                for stat in stats]
+
+
+def _site(traceback, group_by):
+    if group_by == 'traceback':
+        return '\n'.join(f'{frame.filename}:{frame.lineno}' for frame in traceback)
+    frame = traceback[0]
+    return frame.filename if group_by == 'filename' else f'{frame.filename}:{frame.lineno}'
@@ -0,0 +1,134 @@
+"""In-process request metrics.
+
+A small, thread-safe registry of counters, gauges and per-endpoint request
+statistics, served as JSON on ``/admin/metrics``.  Numbers are per worker
+process; nothing is shared between workers, and a forked worker starts
+from zero.
+
+While tracemalloc is tracing (see ``memory_profiling.py``) every request
+also records its peak traced allocation, so the endpoints that allocate the
+most stand out.  The peak counter is process-wide, so with concurrent
+requests the figure is an upper bound for each of them.
+"""
+import os
+import threading
+import time
+import tracemalloc
+
+from flask import g, request
+
+
+class RouteStats:
+    __slots__ = ('count', 'errors', 'total_s', 'max_s', 'statuses',
+                 'memory_samples', 'memory_total', 'memory_max')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+        self.statuses = {}
+        self.memory_samples = 0
+        self.memory_total = 0
+        self.memory_max = 0
+
+    def as_dict(self):
+        data = {
+            'count': self.count,
+            'errors': self.errors,
+            'mean_ms': self.total_s / self.count * 1000 if self.count else 0.0,
+            'max_ms': self.max_s * 1000,
+            'statuses': dict(self.statuses),
+        }
+        if self.memory_samples:
+            data['peak_memory_kb'] = {
+                'samples': self.memory_samples,
+                'mean': self.memory_total / self.memory_samples / 1024,
+                'max': self.memory_max / 1024,
+            }
+        return data
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.counters = {}
+        self.gauges = {}
+        self.routes = {}
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe_request(self, endpoint, duration, status, peak_memory=None):
+        with self._lock:
+            stats = self.routes.get(endpoint)
+            if stats is None:
+                stats = self.routes[endpoint] = RouteStats()
+            stats.count += 1
+            stats.total_s += duration
+            stats.max_s = max(stats.max_s, duration)
+            status_class = f'{status // 100}xx'
+            stats.statuses[status_class] = stats.statuses.get(status_class, 0) + 1
+            if status >= 500:
+                stats.errors += 1
+            if peak_memory is not None:
+                stats.memory_samples += 1
+                stats.memory_total += peak_memory
+                stats.memory_max = max(stats.memory_max, peak_memory)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'uptime_s': time.time() - self.started_at,
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+                'routes': {endpoint: stats.as_dict() for endpoint, stats in sorted(self.routes.items())},
+            }
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.time()
+            self.counters.clear()
+            self.gauges.clear()
+            self.routes.clear()
+
+    def _after_fork(self):
+        # The lock may have been held by another thread of the parent at fork time
+        self._lock = threading.Lock()
+        self.reset()
+
+
+metrics = Metrics()
+os.register_at_fork(after_in_child=metrics._after_fork)
+
+
+def _start_request_metrics():
+    g.metrics_started = time.perf_counter()
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+        g.metrics_memory_start = tracemalloc.get_traced_memory()[0]
+
+
+def _record_request_metrics(response):
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        peak = None
+        memory_start = g.pop('metrics_memory_start', None)
+        if memory_start is not None and tracemalloc.is_tracing():
+            peak = max(tracemalloc.get_traced_memory()[1] - memory_start, 0)
+        metrics.observe_request(request.endpoint or 'unmatched', time.perf_counter() - started,
+                                response.status_code, peak)
+    return response
+
+
+def init_metrics(app):
+    app.before_request(_start_request_metrics)
+    app.after_request(_record_request_metrics)
+    app.extensions['metrics'] = metrics
+    return metrics
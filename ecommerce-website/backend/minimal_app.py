@@ -1,10 +1,50 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
+"""TechGadgets storefront.
+
+Importing this module only defines the app, its routes and models; it does
+no I/O.  Call ``create_app()`` to get a configured application (logging,
+request hooks, optional profiling) and run the one-time database setup
+from the CLI:
+
+    flask --app "minimal_app:create_app()" init-db
+    flask --app "minimal_app:create_app()" export-catalog
+    flask --app "minimal_app:create_app()" build-recommendations
+    flask --app "minimal_app:create_app()" refresh-leaderboards
+    flask --app "minimal_app:create_app()" import-products products.csv
+    flask --app "minimal_app:create_app()" archive-orders
+    flask --app "minimal_app:create_app()" run
+"""
+import click
+import hmac
+import io
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, jsonify, session, send_file
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 import sqlite3
 import os
-from datetime import datetime
+import uuid
+from datetime import datetime, timedelta
 from werkzeug.security import generate_password_hash, check_password_hash
 import json
+import threading
+import tracemalloc
+from pathlib import Path
+
+from admission import admission_limited, init_admission
+from app_logging import init_logging, logger
+from catalog import CatalogStore
+from catalog_import import FORMATS as IMPORT_FORMATS, error_report, format_for, import_products, install_product_skus
+from catalog_sync import install_change_log
+from facets import CatalogFilter
+from inventory import apply_updates as apply_inventory_updates
+from leaderboards import PERIODS, install_leaderboards, rebuild as rebuild_leaderboards, refresh_rolling, top_products
+from metrics import init_metrics, metrics
+from order_archive import archive_files, archive_orders, find_order as find_archived_order, \
+    user_orders as archived_user_orders
+from order_export import FORMATS as EXPORT_FORMATS, export_order_items, export_orders
+from recently_viewed import RecentViews, install_recently_viewed, push as push_recently_viewed
+from recommendations import CO_PURCHASE, KINDS, WISHLIST, install_recommendations, neighbors, recommend_for
+from search_cache import SearchCache, normalize_query, search_key
+from trigram import TrigramIndex
+from view_counts import ViewCounter, install_view_counts
 
 # Get the absolute path to the templates directory
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -15,17 +55,250 @@ app = Flask(__name__,
             template_folder=TEMPLATE_DIR,
             static_folder=STATIC_DIR)
 app.secret_key = 'your-super-secret-key-123-change-in-production'
-app.config['DATABASE'] = 'ecommerce.db'
+app.config['DATABASE'] = os.environ.get('DATABASE', 'ecommerce.db')
+# Seconds a connection waits for SQLite's write lock before raising "database is locked"
+app.config['DATABASE_TIMEOUT'] = float(os.environ.get('DATABASE_TIMEOUT', 5.0))
+
+# Structured logging (see app_logging.py)
+app.config['LOG_LEVEL'] = os.environ.get('LOG_LEVEL', 'INFO')
+app.config['LOG_FORMAT'] = os.environ.get('LOG_FORMAT', 'json')
+app.config['ACCESS_LOG_SAMPLE_RATE'] = float(os.environ.get('ACCESS_LOG_SAMPLE_RATE', 1.0))
+app.config['LOG_SLOW_REQUEST_MS'] = 500
+
+# On-demand request profiling (see profiling.py) - nothing is installed unless enabled
+app.config['PROFILING_ENABLED'] = os.environ.get('PROFILING_ENABLED') == '1'
+app.config['PROFILING_SAMPLE_RATE'] = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+app.config['PROFILING_TOKEN_MAX_AGE'] = 3600
+app.config['PROFILING_DIR'] = os.path.join(BASE_DIR, 'profiles')
+app.config['PROFILING_MAX_FILES'] = 50
+
+# Admission control (see admission.py), per worker process:
+# pool -> (concurrent requests, queued requests, max queue wait in seconds).
+# Sized for gunicorn's 4 threads per worker, leaving one thread for checkout and the cart.
+app.config['ADMISSION_ENABLED'] = os.environ.get('ADMISSION_ENABLED', '1') == '1'
+app.config['ADMISSION_POOLS'] = {
+    'catalog': (1, 1, 2.0),
+    'analytics': (1, 0, 0.0),
+}
+app.config['ADMISSION_RETRY_AFTER'] = 5
+
+# Seconds between checks for catalog writes made by other workers (see catalog.py); 0 disables polling
+app.config['CATALOG_REFRESH_INTERVAL'] = float(os.environ.get('CATALOG_REFRESH_INTERVAL', 1.0))
+# Typo-tolerant search (see trigram.py): searches with fewer exact matches than this also get similar products
+app.config['SEARCH_FUZZY_BELOW'] = 3
+app.config['SEARCH_FUZZY_BUDGET_MS'] = 25
+# Search result cache (see search_cache.py): most filter combinations kept, seconds each is kept for
+app.config['SEARCH_CACHE_ENTRIES'] = 512
+app.config['SEARCH_CACHE_TTL'] = 60.0
+# /products and /advanced-search show this many products per page; ?per_page= may ask for up to the max
+app.config['PRODUCTS_PER_PAGE'] = 24
+app.config['PRODUCTS_PER_PAGE_MAX'] = 96
+
+# Memory-mapped catalog file workers start from (see catalog_mmap.py); empty disables it
+app.config['CATALOG_FILE'] = os.environ.get('CATALOG_FILE', '')
+
+# Product views and recently viewed lists are kept in memory and written every this many seconds
+# (see view_counts.py and recently_viewed.py)
+app.config['VIEW_FLUSH_INTERVAL'] = float(os.environ.get('VIEW_FLUSH_INTERVAL', 5.0))
+# The "popular" listing sort ranks by views over this many days
+app.config['POPULAR_DAYS'] = 30
+# Most products one /api/products?ids= request may ask for
+app.config['API_MAX_IDS'] = 100
+# Rejected rows listed on the product import page; the CLI's --errors report has all of them
+app.config['IMPORT_ERRORS_SHOWN'] = 100
+# Bearer token for /api/inventory clients such as the warehouse sync; empty allows admin sessions only
+app.config['INVENTORY_API_TOKEN'] = os.environ.get('INVENTORY_API_TOKEN', '')
+app.config['INVENTORY_MAX_UPDATES'] = 5000
+
+# Per-year order archive files (see order_archive.py); empty means <DATABASE>.archive
+app.config['ARCHIVE_DIR'] = os.environ.get('ARCHIVE_DIR', '')
+# archive-orders moves completed and cancelled orders older than this many days by default
+app.config['ARCHIVE_AFTER_DAYS'] = 365
+
+# Bump when init_database() learns about new tables so existing databases get migrated
+SCHEMA_VERSION = 12
 
 # Flask-Login setup
 login_manager = LoginManager()
-login_manager.init_app(app)
 login_manager.login_view = 'login'
 login_manager.login_message = 'Please log in to access this page.'
 
 
+def create_app(config=None):
+    """Configure the application and return it.
+
+    Routes are registered on the module-level ``app`` at import time, which
+    is cheap.  Everything with side effects - the logging thread, request
+    hooks, the profiling middleware - is set up here, once per process.
+    """
+    if config:
+        app.config.update(config)
+    if app.extensions.get('techgadgets.configured'):
+        return app
+
+    init_logging(app)
+    login_manager.init_app(app)
+    init_metrics(app)
+    init_admission(app)
+    app.extensions['catalog'] = CatalogStore(get_db_connection, app.config['CATALOG_REFRESH_INTERVAL'],
+                                             app.config['CATALOG_FILE'] or None)
+    if app.config['PROFILING_ENABLED']:
+        from profiling import init_profiling
+        init_profiling(app)
+
+    app.extensions['techgadgets.configured'] = True
+    return app
+
+
+def get_profile_store():
+    """Profile captures live on disk; the store is only built when something needs it."""
+    if 'profiling' not in app.extensions:
+        from profiling import ProfileStore
+        app.extensions['profiling'] = ProfileStore(app.config['PROFILING_DIR'], app.config['PROFILING_MAX_FILES'])
+    return app.extensions['profiling']
+
+
+def get_catalog():
+    """This worker's current catalog snapshot; hold on to it for the whole request."""
+    return app.extensions['catalog'].get()
+
+
+def refresh_catalog():
+    """Make a catalog write committed by this request visible to its redirect target straight away.
+
+    A no-op before ``create_app()`` has set up the catalog store, e.g. for scripts using the bare ``app``.
+    """
+    store = app.extensions.get('catalog')
+    if store is not None:
+        store.refresh()
+
+
+# Held while a catalog index is built; re-entrant because the search filter builds the trigram index
+_catalog_index_lock = threading.RLock()
+
+
+def catalog_index(name, build):
+    """``app.extensions[name]``, built with ``build()`` and subscribed to the catalog store once per process."""
+    index = app.extensions.get(name)
+    if index is None:
+        with _catalog_index_lock:
+            index = app.extensions.get(name)
+            if index is None:
+                index = build()
+                app.extensions['catalog'].subscribe(index.apply)
+                app.extensions[name] = index
+    return index
+
+
+def get_catalog_filter():
+    """Faceted search index over the catalog snapshot, built on first use and updated with it."""
+    return catalog_index('catalog_filter',
+                         lambda: CatalogFilter(get_trigram_index(), app.config['SEARCH_FUZZY_BELOW']))
+
+
+def get_trigram_index():
+    """Trigram index over product and category names for fuzzy search, built on first use."""
+    return catalog_index('trigram_index', lambda: TrigramIndex(app.config['SEARCH_FUZZY_BUDGET_MS']))
+
+
+def get_search_cache():
+    """This worker's search result cache, created on first use."""
+    search_cache = app.extensions.get('search_cache')
+    if search_cache is None:
+        search_cache = SearchCache(app.config['SEARCH_CACHE_ENTRIES'], app.config['SEARCH_CACHE_TTL'])
+        search_cache = app.extensions.setdefault('search_cache', search_cache)
+    return search_cache
+
+
+def search_catalog(query='', category_id=None, min_price=None, max_price=None, in_stock=False,
+                   sort_by='name', sort_order='asc', category_names=True, offset=0, limit=None):
+    """``CatalogFilter.search`` through the result cache.  ``popular`` sorts change with every view and skip it.
+
+    ``offset`` and ``limit`` select one page; the cache keeps the whole sorted id list, so a hit only turns
+    that page's ids into products.
+    """
+    catalog = get_catalog()
+    catalog_filter = get_catalog_filter()
+    if sort_by == 'popular':
+        return catalog_filter.search(query, category_id, min_price, max_price, in_stock, sort_by, sort_order,
+                                     category_names, offset, limit, popularity=get_view_counter().popularity())
+
+    stop = None if limit is None else offset + limit
+    search_cache = get_search_cache()
+    key = search_key(query, category_id, min_price, max_price, in_stock, sort_by, sort_order, category_names,
+                     catalog_filter.price_range())
+    cached = search_cache.get(key, catalog.seq)
+    if cached is not None:
+        product_ids, facets = cached
+        page_ids = product_ids[offset:stop]
+        return catalog_products(catalog, page_ids, len(page_ids)), facets
+
+    products, facets = catalog_filter.search(normalize_query(query), category_id, min_price, max_price, in_stock,
+                                             sort_by, sort_order, category_names)
+    search_cache.put(key, catalog.seq, products, facets)
+    return products[offset:stop], facets
+
+
+def listing_page():
+    """``(page, per_page)`` of a product listing request, clamped to valid values."""
+    per_page = request.args.get('per_page', app.config['PRODUCTS_PER_PAGE'], type=int)
+    per_page = max(1, min(per_page, app.config['PRODUCTS_PER_PAGE_MAX']))
+    return max(1, request.args.get('page', 1, type=int)), per_page
+
+
+def get_view_counter():
+    """This worker's product view counter, created on first use."""
+    view_counter = app.extensions.get('view_counter')
+    if view_counter is None:
+        view_counter = ViewCounter(get_db_connection, app.config['VIEW_FLUSH_INTERVAL'], app.config['POPULAR_DAYS'])
+        view_counter = app.extensions.setdefault('view_counter', view_counter)
+    return view_counter
+
+
+def get_recent_views():
+    """This worker's buffer of logged-in users' recently viewed products, created on first use."""
+    recent_views = app.extensions.get('recent_views')
+    if recent_views is None:
+        recent_views = RecentViews(get_db_connection, app.config['VIEW_FLUSH_INTERVAL'])
+        recent_views = app.extensions.setdefault('recent_views', recent_views)
+    return recent_views
+
+
+def flush_view_counts():
+    """Write this worker's pending view counts and recently viewed products now, e.g. before it exits."""
+    for name in ('view_counter', 'recent_views'):
+        buffered = app.extensions.get(name)
+        if buffered is not None:
+            buffered.flush()
+
+
+def recently_viewed_ids(conn):
+    """Product ids the current visitor viewed last, most recent first."""
+    if current_user.is_authenticated:
+        return get_recent_views().recent(conn, current_user.id)
+    return session.get('recently_viewed', [])
+
+
+def record_recently_viewed(product_id):
+    if current_user.is_authenticated:
+        get_recent_views().record(current_user.id, product_id)
+    else:
+        session['recently_viewed'] = push_recently_viewed(session.get('recently_viewed', []), product_id)
+
+
+def get_memory_profiler():
+    if 'memory_profiler' not in app.extensions:
+        from memory_profiling import MemoryProfiler
+        app.extensions['memory_profiler'] = MemoryProfiler()
+    return app.extensions['memory_profiler']
+
+
+def get_archive_dir():
+    return app.config['ARCHIVE_DIR'] or app.config['DATABASE'] + '.archive'
+
+
 def get_db_connection():
-    conn = sqlite3.connect(app.config['DATABASE'])
+    conn = sqlite3.connect(app.config['DATABASE'], timeout=app.config['DATABASE_TIMEOUT'])
     conn.row_factory = sqlite3.Row
     return conn
 
@@ -87,8 +360,8 @@ class Order:
             # Calculate total amount
             total_amount = sum(item['price'] * item['quantity'] for item in cart_items)
 
-            # Generate unique order number
-            order_number = f"ORD-{datetime.now().strftime('%Y%m%d')}-{user_id}-{int(datetime.now().timestamp()) % 10000}"
+            # Generate unique order number (the random suffix keeps repeat checkouts within a second distinct)
+            order_number = f"ORD-{datetime.now().strftime('%Y%m%d')}-{user_id}-{uuid.uuid4().hex[:8].upper()}"
 
             # Create order
             cursor = conn.cursor()
@@ -123,7 +396,7 @@ class Order:
             conn.close()
 
     @staticmethod
-    def get_user_orders(user_id):
+    def get_user_orders(user_id, include_archived=False):
         conn = get_db_connection()
         orders = conn.execute('''
                               SELECT *
@@ -131,11 +404,14 @@ class Order:
                               WHERE user_id = ?
                               ORDER BY created_at DESC
                               ''', (user_id,)).fetchall()
+        if include_archived:
+            orders += archived_user_orders(conn, get_archive_dir(), user_id)
+            orders.sort(key=lambda order: order['created_at'], reverse=True)
         conn.close()
         return orders
 
     @staticmethod
-    def get_order_details(order_id):
+    def get_order_details(order_id, include_archived=False):
         conn = get_db_connection()
         order = conn.execute('SELECT * FROM orders WHERE id = ?', (order_id,)).fetchone()
         order_items = conn.execute('''
@@ -144,6 +420,8 @@ class Order:
                                             LEFT JOIN products p ON oi.product_id = p.id
                                    WHERE oi.order_id = ?
                                    ''', (order_id,)).fetchall()
+        if order is None and include_archived:
+            order, order_items = find_archived_order(conn, get_archive_dir(), order_id)
         conn.close()
         return order, order_items
 
@@ -326,6 +604,9 @@ def init_database():
     conn = get_db_connection()
 
     try:
+        # WAL lets readers in every worker proceed while one writer commits; the mode is stored in the file
+        conn.execute('PRAGMA journal_mode = WAL')
+
         # Create categories table
         conn.execute('''
                      CREATE TABLE IF NOT EXISTS categories
@@ -370,7 +651,7 @@ def init_database():
         try:
             conn.execute('SELECT is_admin FROM users LIMIT 1')
         except sqlite3.OperationalError:
-            print("🔄 Adding is_admin column to users table...")
+            logger.info('Adding is_admin column to users table')
             conn.execute('ALTER TABLE users ADD COLUMN is_admin BOOLEAN DEFAULT 0')
 
         # Create cart_items table
@@ -489,7 +770,25 @@ def init_database():
             )
         ''')
 
-        print("✅ All tables created successfully")
+        # Product change log and its triggers, read by the in-memory catalog indexes
+        install_change_log(conn)
+
+        # Precomputed recommendation lists and the order_items indexes their job needs
+        install_recommendations(conn)
+
+        # Bestseller boards kept current by triggers on orders
+        install_leaderboards(conn)
+
+        # Per-day product view counts, written in batches by ViewCounter
+        install_view_counts(conn)
+
+        # Logged-in users' recently viewed products, written in batches by RecentViews
+        install_recently_viewed(conn)
+
+        # products.sku, the key bulk imports match rows on
+        install_product_skus(conn)
+
+        logger.info('All tables created successfully')
 
         # Check if categories exist
         category_count = conn.execute('SELECT COUNT(*) FROM categories').fetchone()[0]
@@ -508,7 +807,7 @@ def init_database():
                              INSERT INTO categories (name, slug, description)
                              VALUES (?, ?, ?)
                              ''', sample_categories)
-            print("✅ Sample categories inserted")
+            logger.info('Sample categories inserted')
 
         # Check if products exist
         product_count = conn.execute('SELECT COUNT(*) FROM products').fetchone()[0]
@@ -538,21 +837,21 @@ def init_database():
                              INSERT INTO products (name, price, description, image_url, stock, category_id)
                              VALUES (?, ?, ?, ?, ?, ?)
                              ''', sample_products)
-            print("✅ Sample products inserted")
+            logger.info('Sample products inserted')
 
         # Update existing products that have NULL category_id to a default category
         try:
             conn.execute('UPDATE products SET category_id = 1 WHERE category_id IS NULL')
         except sqlite3.OperationalError:
-            print("⚠️  Could not update products category_id - column might not exist yet")
+            logger.warning('Could not update products category_id - column might not exist yet')
 
         # Check if we have any products with NULL category_id after update
         try:
             null_category_count = conn.execute('SELECT COUNT(*) FROM products WHERE category_id IS NULL').fetchone()[0]
             if null_category_count > 0:
-                print(f"⚠️  {null_category_count} products still have NULL category_id")
+                logger.warning('Products still have NULL category_id', extra={'count': null_category_count})
         except sqlite3.OperationalError:
-            print("⚠️  category_id column doesn't exist in products table")
+            logger.warning("category_id column doesn't exist in products table")
 
         # Create admin user and demo user
         user_count = conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
@@ -564,7 +863,7 @@ def init_database():
                              INSERT INTO users (username, email, password_hash, is_admin)
                              VALUES (?, ?, ?, ?)
                              ''', ('admin', 'admin@example.com', admin_password_hash, 1))
-                print("✅ Admin user created - username: 'admin', password: 'admin123'")
+                logger.info('Admin user created', extra={'username': 'admin'})
 
                 # Create demo user
                 demo_password_hash = generate_password_hash('demo123')
@@ -572,7 +871,7 @@ def init_database():
                              INSERT INTO users (username, email, password_hash, is_admin)
                              VALUES (?, ?, ?, ?)
                              ''', ('demo', 'demo@example.com', demo_password_hash, 0))
-                print("✅ Demo user created - username: 'demo', password: 'demo123'")
+                logger.info('Demo user created', extra={'username': 'demo'})
 
                 # Create additional users for sample reviews
                 additional_users = [
@@ -586,10 +885,10 @@ def init_database():
                                  INSERT INTO users (username, email, password_hash, is_admin)
                                  VALUES (?, ?, ?, ?)
                                  ''', additional_users)
-                print("✅ Additional users created for sample reviews")
+                logger.info('Additional users created for sample reviews')
             except sqlite3.OperationalError as e:
                 # If is_admin column doesn't exist yet, create users without it
-                print("⚠️  Creating users without is_admin column...")
+                logger.warning('Creating users without is_admin column')
                 conn.execute('''
                              INSERT INTO users (username, email, password_hash)
                              VALUES (?, ?, ?)
@@ -608,13 +907,13 @@ def init_database():
                                  INSERT INTO users (username, email, password_hash, is_admin)
                                  VALUES (?, ?, ?, ?)
                                  ''', ('admin', 'admin@example.com', admin_password_hash, 1))
-                    print("✅ Admin user created - username: 'admin', password: 'admin123'")
+                    logger.info('Admin user created', extra={'username': 'admin'})
                 except sqlite3.OperationalError:
                     conn.execute('''
                                  INSERT INTO users (username, email, password_hash)
                                  VALUES (?, ?, ?)
                                  ''', ('admin', 'admin@example.com', admin_password_hash))
-                    print("✅ Admin user created (without admin privileges)")
+                    logger.warning('Admin user created without admin privileges')
 
         # Add sample reviews (each user reviews different products)
         try:
@@ -665,9 +964,9 @@ def init_database():
                                      INSERT INTO reviews (product_id, user_id, rating, title, comment, status)
                                      VALUES (?, ?, ?, ?, ?, ?)
                                      ''', sample_reviews)
-                    print("✅ Sample reviews inserted")
+                    logger.info('Sample reviews inserted')
                 except sqlite3.IntegrityError as e:
-                    print(f"⚠️  Some reviews couldn't be inserted due to unique constraint: {e}")
+                    logger.warning("Some reviews couldn't be inserted due to unique constraint", extra={'error': str(e)})
                     # Insert reviews one by one to avoid the constraint error
                     for review in sample_reviews:
                         try:
@@ -676,22 +975,165 @@ def init_database():
                                          VALUES (?, ?, ?, ?, ?, ?)
                                          ''', review)
                         except sqlite3.IntegrityError:
-                            print(f"⚠️  Skipping duplicate review for user {review[1]} on product {review[0]}")
+                            logger.warning('Skipping duplicate review', extra={'user_id': review[1], 'product_id': review[0]})
                     conn.commit()
         except sqlite3.OperationalError:
-            print("⚠️  Reviews table not available yet")
+            logger.warning('Reviews table not available yet')
 
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
         conn.commit()
-        print("✅ Database initialization completed successfully!")
+        logger.info('Database initialization completed successfully')
 
     except Exception as e:
-        print(f"❌ Database initialization failed: {e}")
+        logger.exception('Database initialization failed')
         conn.rollback()
         raise e
     finally:
         conn.close()
 
 
+def database_needs_init():
+    """True when the database is missing or was initialized by an older schema version."""
+    if not os.path.exists(app.config['DATABASE']):
+        return True
+    conn = get_db_connection()
+    try:
+        return conn.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION
+    finally:
+        conn.close()
+
+
+@app.cli.command('init-db')
+@click.option('--force', is_flag=True, help='Run even if the schema is already current.')
+def init_db_command(force):
+    """Create tables and sample data (one-time setup)."""
+    if force or database_needs_init():
+        init_database()
+        click.echo(f"Database {app.config['DATABASE']} initialized (schema v{SCHEMA_VERSION})")
+    else:
+        click.echo(f"Database {app.config['DATABASE']} is already at schema v{SCHEMA_VERSION}")
+
+
+def export_catalog_file(path=None):
+    from catalog_mmap import export_catalog
+
+    conn = get_db_connection()
+    try:
+        return export_catalog(conn, path or app.config['CATALOG_FILE'])
+    finally:
+        conn.close()
+
+
+@app.cli.command('export-catalog')
+@click.option('--output', help='File to write (default: CATALOG_FILE).')
+def export_catalog_command(output):
+    """Write the memory-mapped catalog file workers start from."""
+    path = output or app.config['CATALOG_FILE']
+    if not path:
+        raise click.UsageError('Set CATALOG_FILE or pass --output')
+    seq = export_catalog_file(path)
+    click.echo(f'Catalog exported to {path} (change {seq})')
+
+
+@app.cli.command('build-recommendations')
+@click.option('--full', is_flag=True, help='Recompute every product instead of only those with new activity.')
+def build_recommendations_command(full):
+    """Refresh the precomputed "also bought" and "also saved" lists."""
+    conn = get_db_connection()
+    try:
+        for kind in KINDS:
+            updated, seconds = kind.build(conn, full)
+            click.echo(f'{kind.kind} neighbours updated for {updated} products in {seconds:.2f}s')
+    finally:
+        conn.close()
+
+
+@app.cli.command('refresh-leaderboards')
+@click.option('--rebuild', is_flag=True, help='Recompute every board from the completed orders.')
+def refresh_leaderboards_command(rebuild):
+    """Roll the 7 and 30 day bestseller boards forward; run at least daily."""
+    conn = get_db_connection()
+    try:
+        if rebuild:
+            rebuild_leaderboards(conn)
+        else:
+            refresh_rolling(conn)
+        conn.commit()
+        click.echo('Bestseller leaderboards rebuilt' if rebuild else 'Rolling bestseller leaderboards refreshed')
+    finally:
+        conn.close()
+
+
+@app.cli.command('archive-orders')
+@click.option('--before', help='Archive orders placed before this date (YYYY-MM-DD; default: ARCHIVE_AFTER_DAYS ago).')
+@click.option('--batch-size', default=1000, show_default=True, help='Orders moved per transaction.')
+def archive_orders_command(before, batch_size):
+    """Move old completed and cancelled orders into per-year archive databases."""
+    if before:
+        try:
+            datetime.strptime(before, '%Y-%m-%d')
+        except ValueError:
+            raise click.BadParameter('expected YYYY-MM-DD', param_hint='--before')
+    else:
+        before = (datetime.now() - timedelta(days=app.config['ARCHIVE_AFTER_DAYS'])).strftime('%Y-%m-%d')
+    archive_dir = get_archive_dir()
+    conn = get_db_connection()
+    try:
+        moved = archive_orders(conn, archive_dir, before, batch_size)
+    finally:
+        conn.close()
+    for year, count in sorted(moved.items()):
+        click.echo(f'{count} orders from {year} moved to {archive_dir}')
+    click.echo(f'{sum(moved.values())} orders placed before {before} archived')
+
+
+def import_product_file(stream, fmt):
+    """Run a bulk product import from a text stream, then refresh the catalog once for the whole file."""
+    conn = get_db_connection()
+    try:
+        result = import_products(conn, stream, fmt)
+    finally:
+        conn.close()
+    if result.written:
+        refresh_catalog()
+        if app.config['CATALOG_FILE']:
+            # Workers started from here on would otherwise replay every imported product
+            export_catalog_file()
+    return result
+
+
+@app.cli.command('import-products')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(IMPORT_FORMATS), help='Default: from the file extension.')
+@click.option('--errors', 'errors_path', type=click.Path(dir_okay=False), help='Write the rejected rows here as CSV.')
+def import_products_command(path, fmt, errors_path):
+    """Add or update products from a CSV or JSON Lines file."""
+    fmt = fmt or format_for(path)
+    if fmt is None:
+        raise click.UsageError('Cannot tell the format from the file name; pass --format')
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        result = import_product_file(stream, fmt)
+    click.echo(f'{result.rows} rows: {result.written} written, {result.unchanged} unchanged, '
+               f'{result.rejected} rejected')
+    if errors_path and result.errors:
+        with open(errors_path, 'w', encoding='utf-8', newline='') as report:
+            report.write(error_report(result))
+        click.echo(f'Rejected rows written to {errors_path}')
+
+
+def catalog_products(catalog, product_ids, limit):
+    """Snapshot records for ``product_ids`` in order, skipping products that no longer exist."""
+    products = (catalog.product(product_id) for product_id in product_ids)
+    return [product for product in products if product is not None][:limit]
+
+
+def bestsellers(conn, catalog, period='all', category_id=0, limit=10):
+    """``(product, units, revenue)`` from one leaderboard, skipping products that no longer exist."""
+    rows = top_products(conn, period, category_id, limit + 10)
+    ranked = ((catalog.product(product_id), units, revenue) for product_id, units, revenue in rows)
+    return [entry for entry in ranked if entry[0] is not None][:limit]
+
+
 def row_to_dict(row):
     """Convert sqlite3.Row to dictionary"""
     if row is None:
@@ -825,6 +1267,7 @@ def admin_add_product():
                          VALUES (?, ?, ?, ?, ?, ?)
                          ''', (name, price, description, image_url, category_id, stock))
             conn.commit()
+            refresh_catalog()
             flash('✅ Product added successfully!', 'success')
             return redirect('/admin/products')
         except Exception as e:
@@ -872,6 +1315,7 @@ def admin_edit_product(product_id):
                          WHERE id = ?
                          ''', (name, price, description, image_url, category_id, stock, product_id))
             conn.commit()
+            refresh_catalog()
             flash('✅ Product updated successfully!', 'success')
             return redirect('/admin/products')
         except Exception as e:
@@ -900,6 +1344,7 @@ def admin_delete_product(product_id):
         else:
             conn.execute('DELETE FROM products WHERE id = ?', (product_id,))
             conn.commit()
+            refresh_catalog()
             flash('✅ Product deleted successfully!', 'success')
     except Exception as e:
         conn.rollback()
@@ -910,6 +1355,36 @@ def admin_delete_product(product_id):
     return redirect('/admin/products')
 
 
+@app.route('/admin/products/import', methods=['GET', 'POST'])
+@login_required
+def admin_import_products():
+    """Upload a CSV or JSON Lines file of products; the file is streamed, not loaded whole."""
+    if not current_user.is_admin:
+        flash('❌ Access denied. Admin privileges required.', 'error')
+        return redirect('/')
+
+    result = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('❌ Choose a file to import', 'error')
+            return redirect('/admin/products/import')
+        fmt = format_for(upload.filename)
+        if fmt is None:
+            flash('❌ Upload a .csv or .jsonl file', 'error')
+            return redirect('/admin/products/import')
+        result = import_product_file(io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline=''), fmt)
+        summary = (f'{upload.filename}: {result.written} products written, {result.unchanged} unchanged, '
+                   f'{result.rejected} rows rejected')
+        if result.errors:
+            flash(f'⚠️ Imported {summary}', 'info')
+        else:
+            flash(f'✅ Imported {summary}', 'success')
+
+    return render_template('admin/product_import.html', result=result,
+                           max_errors=app.config['IMPORT_ERRORS_SHOWN'])
+
+
 @app.route('/admin/orders')
 @login_required
 def admin_orders():
@@ -942,6 +1417,37 @@ def admin_orders():
     return render_template('admin/orders.html', orders=orders, status_filter=status_filter)
 
 
+@app.route('/admin/export/<any(orders, "order-items"):kind>')
+@login_required
+def admin_export(kind):
+    """Stream orders or order items as CSV or NDJSON, optionally for a date range (``start``/``end``) and status."""
+    if not current_user.is_admin:
+        flash('❌ Access denied. Admin privileges required.', 'error')
+        return redirect('/')
+
+    fmt = request.args.get('format', 'csv')
+    start = request.args.get('start') or None
+    end = request.args.get('end') or None
+    status = request.args.get('status', 'all')
+    try:
+        for day in (start, end):
+            if day:
+                datetime.strptime(day, '%Y-%m-%d')
+    except ValueError:
+        # The export links live on the dashboard
+        flash('❌ Dates must be given as YYYY-MM-DD', 'error')
+        return redirect('/admin')
+    if fmt not in EXPORT_FORMATS:
+        flash('❌ Export format must be csv or ndjson', 'error')
+        return redirect('/admin')
+
+    exporter = export_orders if kind == 'orders' else export_order_items
+    rows = exporter(get_db_connection, fmt, start, end, None if status == 'all' else status)
+    filename = f"{kind}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+    return Response(rows, mimetype=EXPORT_FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
 @app.route('/admin/orders/<int:order_id>')
 @login_required
 def admin_order_detail(order_id):
@@ -1057,6 +1563,7 @@ def admin_toggle_admin(user_id):
 
 @app.route('/admin/analytics')
 @login_required
+@admission_limited('analytics')
 def admin_analytics():
     if not current_user.is_admin:
         flash('❌ Access denied. Admin privileges required.', 'error')
@@ -1068,6 +1575,7 @@ def admin_analytics():
     total_sales = \
         conn.execute('SELECT COALESCE(SUM(total_amount), 0) FROM orders WHERE status = "completed"').fetchone()[0]
     total_orders = conn.execute('SELECT COUNT(*) FROM orders').fetchone()[0]
+    total_users = conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
     avg_order_value = \
         conn.execute('SELECT COALESCE(AVG(total_amount), 0) FROM orders WHERE status = "completed"').fetchone()[0]
 
@@ -1083,19 +1591,12 @@ def admin_analytics():
                                      LIMIT 12
                                  ''').fetchall()
 
-    # Top products
-    top_products = conn.execute('''
-                                SELECT p.name,
-                                       p.id,
-                                       SUM(oi.quantity)    as total_sold,
-                                       SUM(oi.total_price) as revenue
-                                FROM order_items oi
-                                         JOIN products p ON oi.product_id = p.id
-                                         JOIN orders o ON oi.order_id = o.id
-                                WHERE o.status = 'completed'
-                                GROUP BY p.id
-                                ORDER BY total_sold DESC LIMIT 10
-                                ''').fetchall()
+    # Top products, read from the bestseller leaderboards
+    period = request.args.get('period', 'all')
+    if period not in PERIODS:
+        period = 'all'
+    top_products = [{'id': product.id, 'name': product.name, 'total_sold': units, 'revenue': revenue}
+                    for product, units, revenue in bestsellers(conn, get_catalog(), period)]
 
     # Order status distribution
     status_distribution = conn.execute('''
@@ -1109,133 +1610,201 @@ def admin_analytics():
     return render_template('admin/analytics.html',
                            total_sales=total_sales,
                            total_orders=total_orders,
+                           total_users=total_users,
                            avg_order_value=avg_order_value,
                            monthly_sales=monthly_sales,
                            top_products=top_products,
+                           period=period,
                            status_distribution=status_distribution)
 
 
+@app.route('/admin/profiles')
+@login_required
+def admin_profiles():
+    if not current_user.is_admin:
+        flash('❌ Access denied. Admin privileges required.', 'error')
+        return redirect('/')
+
+    from profiling import PROFILE_HEADER, make_profile_token
+
+    return render_template('admin/profiles.html',
+                           profiles=get_profile_store().list(),
+                           profiling_enabled=app.config['PROFILING_ENABLED'],
+                           sample_rate=app.config['PROFILING_SAMPLE_RATE'],
+                           max_files=app.config['PROFILING_MAX_FILES'],
+                           profile_header=PROFILE_HEADER,
+                           profile_token=make_profile_token(app.secret_key),
+                           token_max_age=app.config['PROFILING_TOKEN_MAX_AGE'])
+
+
+@app.route('/admin/profiles/<name>')
+@login_required
+def admin_profile_detail(name):
+    if not current_user.is_admin:
+        flash('❌ Access denied. Admin privileges required.', 'error')
+        return redirect('/')
+
+    sort = request.args.get('sort', 'cumulative')
+    if sort not in ('cumulative', 'tottime', 'calls'):
+        sort = 'cumulative'
+
+    summary = get_profile_store().summary(name, sort=sort)
+    if summary is None:
+        flash('❌ Profile not found', 'error')
+        return redirect('/admin/profiles')
+
+    return render_template('admin/profile_detail.html', name=name, sort=sort, summary=summary)
+
+
+@app.route('/admin/profiles/<name>/download')
+@login_required
+def admin_profile_download(name):
+    if not current_user.is_admin:
+        flash('❌ Access denied. Admin privileges required.', 'error')
+        return redirect('/')
+
+    path = get_profile_store().path_for(name)
+    if not path:
+        flash('❌ Profile not found', 'error')
+        return redirect('/admin/profiles')
+
+    return send_file(path, as_attachment=True, download_name=name, mimetype='application/octet-stream')
+
+
+@app.route('/admin/metrics')
+@login_required
+def admin_metrics():
+    if not current_user.is_admin:
+        flash('❌ Access denied. Admin privileges required.', 'error')
+        return redirect('/')
+
+    data = metrics.snapshot()
+    data['pid'] = os.getpid()
+    data['tracemalloc'] = tracemalloc.is_tracing()
+    return jsonify(data)
+
+
+@app.route('/admin/memory')
+@login_required
+def admin_memory():
+    if not current_user.is_admin:
+        flash('❌ Access denied. Admin privileges required.', 'error')
+        return redirect('/')
+
+    from memory_profiling import GROUPINGS
+
+    memory_profiler = get_memory_profiler()
+    group_by = request.args.get('group_by', 'lineno')
+    if group_by not in GROUPINGS:
+        group_by = 'lineno'
+    old_name = request.args.get('old')
+    new_name = request.args.get('new')
+
+    # Either a diff of two snapshots or the top allocation sites of one
+    rows, mode = [], None
+    try:
+        if old_name and new_name:
+            rows, mode = memory_profiler.diff(old_name, new_name, group_by=group_by), 'diff'
+        elif new_name:
+            rows, mode = memory_profiler.top(new_name, group_by=group_by), 'top'
+    except KeyError as e:
+        flash(f'❌ Snapshot {e} not found', 'error')
+
+    current, peak = (0, 0)
+    if memory_profiler.tracing:
+        current, peak = tracemalloc.get_traced_memory()
+
+    return render_template('admin/memory.html',
+                           tracing=memory_profiler.tracing,
+                           traced_current_kb=current / 1024,
+                           traced_peak_kb=peak / 1024,
+                           snapshots=memory_profiler.snapshots(),
+                           groupings=GROUPINGS,
+                           group_by=group_by,
+                           old_name=old_name,
+                           new_name=new_name,
+                           mode=mode,
+                           rows=rows)
+
+
+@app.route('/admin/memory/<action>', methods=['POST'])
+@login_required
+def admin_memory_action(action):
+    if not current_user.is_admin:
+        flash('❌ Access denied. Admin privileges required.', 'error')
+        return redirect('/')
+
+    memory_profiler = get_memory_profiler()
+    if action == 'start':
+        memory_profiler.start(frames=request.form.get('frames', 10, type=int))
+        flash('✅ Memory tracing started', 'success')
+    elif action == 'stop':
+        memory_profiler.stop()
+        flash('✅ Memory tracing stopped', 'success')
+    elif action == 'snapshot':
+        name = request.form.get('name', '').strip() or datetime.now().strftime('%H:%M:%S')
+        try:
+            memory_profiler.take_snapshot(name)
+            flash(f'✅ Snapshot "{name}" taken', 'success')
+        except RuntimeError:
+            flash('❌ Start tracing before taking snapshots', 'error')
+    elif action == 'delete':
+        memory_profiler.delete_snapshot(request.form.get('name', ''))
+        flash('✅ Snapshot deleted', 'success')
+    else:
+        flash('❌ Invalid action', 'error')
+
+    return redirect('/admin/memory')
+
+
 # =============================================
 # REGULAR ROUTES
 # =============================================
 
 @app.route('/')
 def index():
+    catalog = get_catalog()
     conn = get_db_connection()
+    try:
+        top = bestsellers(conn, catalog, '30d', limit=4) or bestsellers(conn, catalog, 'all', limit=4)
+        recently_viewed = catalog_products(catalog, recently_viewed_ids(conn), 6)
+    finally:
+        conn.close()
+    return render_template('index.html', products=catalog.featured(4), categories=catalog.categories,
+                           bestsellers=[product for product, _, _ in top], recently_viewed=recently_viewed)
 
-    # Get featured products with optional rating info
-    featured_products = conn.execute('''
-                                     SELECT p.*, c.name as category_name
-                                     FROM products p
-                                              LEFT JOIN categories c ON p.category_id = c.id LIMIT 4
-                                     ''').fetchall()
-
-    # Convert to list of dictionaries and add ratings
-    featured_products_list = []
-    for product in featured_products:
-        product_dict = row_to_dict(product)
-
-        rating_result = conn.execute('''
-                                     SELECT COALESCE(AVG(rating), 0) as average_rating, COUNT(*) as review_count
-                                     FROM reviews
-                                     WHERE product_id = ?
-                                       AND status = 'approved'
-                                     ''', (product_dict['id'],)).fetchone()
-
-        product_dict['average_rating'] = rating_result['average_rating'] if rating_result else 0
-        product_dict['review_count'] = rating_result['review_count'] if rating_result else 0
-        featured_products_list.append(product_dict)
-
-    categories = conn.execute('SELECT * FROM categories').fetchall()
-    conn.close()
 
-    return render_template('index.html', products=featured_products_list, categories=categories)
+def unfiltered_catalog():
+    """Full-catalog listings are the expensive ones; category and search pages stay unthrottled."""
+    return not request.args.get('category', type=int) and not request.args.get('search')
 
 
 @app.route('/products')
+@admission_limited('catalog', when=unfiltered_catalog)
 def products_page():
     category_id = request.args.get('category', type=int)
     search_query = request.args.get('search', '')
     sort_by = request.args.get('sort_by', 'name')
     sort_order = request.args.get('sort_order', 'asc')
 
-    conn = get_db_connection()
-
-    # Build base query with sorting
-    query = '''
-            SELECT p.*, \
-                   c.name                     as category_name, \
-                   c.slug                     as category_slug,
-                   COALESCE(AVG(r.rating), 0) as average_rating,
-                   COUNT(r.id)                as review_count
-            FROM products p
-                     LEFT JOIN categories c ON p.category_id = c.id
-                     LEFT JOIN reviews r ON p.id = r.product_id AND r.status = 'approved'
-            WHERE 1 = 1 \
-            '''
-    params = []
-
-    if category_id:
-        query += ' AND p.category_id = ?'
-        params.append(category_id)
-
-    if search_query:
-        query += ' AND (p.name LIKE ? OR p.description LIKE ?)'
-        params.extend([f'%{search_query}%', f'%{search_query}%'])
-
-    query += ' GROUP BY p.id, c.name, c.slug'
-
-    # Apply sorting
-    sort_options = {
-        'name': 'p.name',
-        'price': 'p.price',
-        'rating': 'average_rating',
-        'date': 'p.created_at'
-    }
-
-    if sort_by in sort_options:
-        # For date, default to newest first (descending)
-        if sort_by == 'date' and sort_order == 'asc':
-            query += f' ORDER BY {sort_options[sort_by]} ASC'
-        elif sort_by == 'date' and sort_order == 'desc':
-            query += f' ORDER BY {sort_options[sort_by]} DESC'
-        else:
-            query += f' ORDER BY {sort_options[sort_by]} {sort_order.upper()}'
-    else:
-        query += ' ORDER BY p.created_at DESC'
-
-    products = conn.execute(query, params).fetchall()
-
-    # Convert to list of dictionaries
-    products_list = []
-    for product in products:
-        product_dict = row_to_dict(product)
-        product_dict['average_rating'] = float(product['average_rating']) if product['average_rating'] else 0.0
-        product_dict['review_count'] = product['review_count']
-        products_list.append(product_dict)
-
-    categories = conn.execute('SELECT * FROM categories').fetchall()
-    current_category = None
+    page, per_page = listing_page()
 
-    if category_id:
-        current_category = conn.execute('SELECT * FROM categories WHERE id = ?', (category_id,)).fetchone()
-
-    # Get price range
-    price_range = conn.execute('''
-                               SELECT MIN(price) as min_price, MAX(price) as max_price
-                               FROM products
-                               ''').fetchone()
-
-    conn.close()
+    catalog = get_catalog()
+    products_list, facets = search_catalog(search_query, category_id, sort_by=sort_by, sort_order=sort_order,
+                                           category_names=False, offset=(page - 1) * per_page, limit=per_page)
 
     return render_template('products.html',
                            products=products_list,
-                           categories=categories,
-                           current_category=current_category,
+                           total=facets['total'],
+                           page=page,
+                           pages=max(1, -(-facets['total'] // per_page)),
+                           categories=catalog.categories,
+                           current_category=catalog.category(category_id) if category_id else None,
                            search_query=search_query,
+                           fuzzy=facets['fuzzy'],
                            sort_by=sort_by,
                            sort_order=sort_order,
-                           price_range=price_range)
+                           price_range=get_catalog_filter().price_range())
 
 
 @app.route('/advanced-search')
@@ -1248,89 +1817,19 @@ def advanced_search():
     sort_by = request.args.get('sort_by', 'name')
     sort_order = request.args.get('sort_order', 'asc')
     in_stock = request.args.get('in_stock', type=bool)
+    page, per_page = listing_page()
 
-    conn = get_db_connection()
-
-    # Build base query
-    query = '''
-            SELECT p.*, \
-                   c.name                     as category_name, \
-                   c.slug                     as category_slug,
-                   COALESCE(AVG(r.rating), 0) as average_rating,
-                   COUNT(r.id)                as review_count
-            FROM products p
-                     LEFT JOIN categories c ON p.category_id = c.id
-                     LEFT JOIN reviews r ON p.id = r.product_id AND r.status = 'approved'
-            WHERE 1 = 1 \
-            '''
-    params = []
-
-    # Apply filters
-    if search_query:
-        query += ' AND (p.name LIKE ? OR p.description LIKE ? OR c.name LIKE ?)'
-        params.extend([f'%{search_query}%', f'%{search_query}%', f'%{search_query}%'])
-
-    if category_id:
-        query += ' AND p.category_id = ?'
-        params.append(category_id)
-
-    if min_price is not None:
-        query += ' AND p.price >= ?'
-        params.append(min_price)
-
-    if max_price is not None:
-        query += ' AND p.price <= ?'
-        params.append(max_price)
-
-    if in_stock:
-        query += ' AND p.stock > 0'
-
-    # Group by for ratings
-    query += ' GROUP BY p.id, c.name, c.slug'
-
-    # Apply sorting
-    sort_options = {
-        'name': 'p.name',
-        'price': 'p.price',
-        'rating': 'average_rating',
-        'date': 'p.created_at',
-        'reviews': 'review_count'
-    }
-
-    if sort_by in sort_options:
-        sort_direction = 'DESC' if sort_order == 'desc' else 'ASC'
-        # Special handling for date (newest first by default)
-        if sort_by == 'date' and sort_order == 'asc':
-            sort_direction = 'ASC'
-        elif sort_by == 'date' and sort_order == 'desc':
-            sort_direction = 'DESC'
-        query += f' ORDER BY {sort_options[sort_by]} {sort_direction}'
-    else:
-        query += ' ORDER BY p.created_at DESC'
-
-    # Execute query
-    products = conn.execute(query, params).fetchall()
-
-    # Convert to list of dictionaries
-    products_list = []
-    for product in products:
-        product_dict = row_to_dict(product)
-        product_dict['average_rating'] = float(product['average_rating']) if product['average_rating'] else 0.0
-        product_dict['review_count'] = product['review_count']
-        products_list.append(product_dict)
-
-    categories = conn.execute('SELECT * FROM categories').fetchall()
-
-    # Get price range for filter
-    price_range = conn.execute('''
-                               SELECT MIN(price) as min_price, MAX(price) as max_price
-                               FROM products
-                               ''').fetchone()
-
-    conn.close()
+    catalog = get_catalog()
+    products_list, facets = search_catalog(search_query, category_id, min_price, max_price, in_stock,
+                                           sort_by, sort_order, offset=(page - 1) * per_page, limit=per_page)
+    categories = catalog.categories
 
     return render_template('advanced_search.html',
                            products=products_list,
+                           facets=facets,
+                           total=facets['total'],
+                           page=page,
+                           pages=max(1, -(-facets['total'] // per_page)),
                            categories=categories,
                            search_query=search_query,
                            selected_category=category_id,
@@ -1339,80 +1838,44 @@ def advanced_search():
                            sort_by=sort_by,
                            sort_order=sort_order,
                            in_stock=in_stock,
-                           price_range=price_range)
+                           price_range=get_catalog_filter().price_range())
 
 
 @app.route('/category/<slug>')
 def category_page(slug):
-    conn = get_db_connection()
+    catalog = get_catalog()
 
-    category = conn.execute('SELECT * FROM categories WHERE slug = ?', (slug,)).fetchone()
+    category = catalog.category_by_slug(slug)
     if not category:
         flash('Category not found', 'error')
         return redirect(url_for('products_page'))
 
-    # Get products without complex joins
-    products = conn.execute('''
-                            SELECT p.*, c.name as category_name, c.slug as category_slug
-                            FROM products p
-                                     LEFT JOIN categories c ON p.category_id = c.id
-                            WHERE p.category_id = ?
-                            ORDER BY p.created_at DESC
-                            ''', (category['id'],)).fetchall()
-
-    # Convert to list of dictionaries and add ratings
-    products_list = []
-    for product in products:
-        product_dict = row_to_dict(product)
-
-        rating_result = conn.execute('''
-                                     SELECT COALESCE(AVG(rating), 0) as average_rating, COUNT(*) as review_count
-                                     FROM reviews
-                                     WHERE product_id = ?
-                                       AND status = 'approved'
-                                     ''', (product_dict['id'],)).fetchone()
-
-        product_dict['average_rating'] = rating_result['average_rating'] if rating_result else 0
-        product_dict['review_count'] = rating_result['review_count'] if rating_result else 0
-        products_list.append(product_dict)
-
-    categories = conn.execute('SELECT * FROM categories').fetchall()
-    conn.close()
+    # Newest first
+    products_list = sorted(catalog.in_category(category.id), key=lambda p: p.created_at or '', reverse=True)
 
     return render_template('category.html',
                            products=products_list,
-                           categories=categories,
+                           categories=catalog.categories,
                            current_category=category)
 
 
 @app.route('/product/<int:product_id>')
 def product_detail(product_id):
-    conn = get_db_connection()
-
-    # Get product details
-    product = conn.execute('''
-                           SELECT p.*, c.name as category_name
-                           FROM products p
-                                    LEFT JOIN categories c ON p.category_id = c.id
-                           WHERE p.id = ?
-                           ''', (product_id,)).fetchone()
+    catalog = get_catalog()
 
+    product = catalog.product(product_id)
     if not product:
         flash('Product not found', 'error')
         return redirect(url_for('products_page'))
 
-    # Convert product to dictionary and add ratings
-    product_dict = row_to_dict(product)
+    get_view_counter().record(product_id)
 
-    rating_result = conn.execute('''
-                                 SELECT COALESCE(AVG(rating), 0) as average_rating, COUNT(*) as review_count
-                                 FROM reviews
-                                 WHERE product_id = ?
-                                   AND status = 'approved'
-                                 ''', (product_id,)).fetchone()
+    conn = get_db_connection()
 
-    product_dict['average_rating'] = rating_result['average_rating'] if rating_result else 0
-    product_dict['review_count'] = rating_result['review_count'] if rating_result else 0
+    # Recently viewed before this page, hydrated from the snapshot
+    earlier = [viewed for viewed in recently_viewed_ids(conn) if viewed != product_id]
+    recently_viewed = catalog_products(catalog, earlier, 6)
+    record_recently_viewed(product_id)
 
     # Get approved reviews for this product
     reviews = conn.execute('''
@@ -1424,32 +1887,6 @@ def product_detail(product_id):
                            ORDER BY r.created_at DESC LIMIT 10
                            ''', (product_id,)).fetchall()
 
-    # Get related products
-    related_products = conn.execute('''
-                                    SELECT p.*, c.name as category_name
-                                    FROM products p
-                                             LEFT JOIN categories c ON p.category_id = c.id
-                                    WHERE p.category_id = ?
-                                      AND p.id != ?
-        LIMIT 4
-                                    ''', (product_dict['category_id'], product_id)).fetchall()
-
-    # Convert related products to list of dictionaries and add ratings
-    related_products_list = []
-    for related_product in related_products:
-        related_product_dict = row_to_dict(related_product)
-
-        related_rating_result = conn.execute('''
-                                             SELECT COALESCE(AVG(rating), 0) as average_rating, COUNT(*) as review_count
-                                             FROM reviews
-                                             WHERE product_id = ?
-                                               AND status = 'approved'
-                                             ''', (related_product_dict['id'],)).fetchone()
-
-        related_product_dict['average_rating'] = related_rating_result['average_rating'] if related_rating_result else 0
-        related_product_dict['review_count'] = related_rating_result['review_count'] if related_rating_result else 0
-        related_products_list.append(related_product_dict)
-
     # Check if user has already reviewed this product
     user_review = None
     if current_user.is_authenticated:
@@ -1460,14 +1897,24 @@ def product_detail(product_id):
                                      AND user_id = ?
                                    ''', (product_id, current_user.id)).fetchone()
 
-    categories = conn.execute('SELECT * FROM categories').fetchall()
+    # Bought together with this product, topped up from its category
+    related_products = catalog_products(catalog, neighbors(conn, CO_PURCHASE.kind, product_id), 4)
+    if len(related_products) < 4:
+        shown = {related.id for related in related_products}
+        related_products += [related for related in catalog.related(product, 4 + len(shown))
+                             if related.id not in shown][:4 - len(related_products)]
+
+    also_saved = catalog_products(catalog, neighbors(conn, WISHLIST.kind, product_id), 4)
+
     conn.close()
 
     return render_template('product_detail.html',
-                           product=product_dict,
+                           product=product,
                            reviews=reviews,
-                           related_products=related_products_list,
-                           categories=categories,
+                           related_products=related_products,
+                           also_saved=also_saved,
+                           recently_viewed=recently_viewed,
+                           categories=catalog.categories,
                            user_review=user_review)
 
 
@@ -1546,8 +1993,9 @@ def cart():
             'quantity': item['quantity']
         })
 
-    # For debugging - show what's in localStorage vs database
-    print(f"🛒 Database cart has {len(cart_items)} items for user {current_user.id}")
+    # For debugging - show what's in localStorage vs database (sampled, this is a hot path)
+    logger.info('Database cart loaded', extra={'item_count': len(cart_items), 'user_id': current_user.id,
+                                               'sample_rate': 0.01})
 
     return render_template('cart.html', cart_items=cart_items)
 
@@ -1600,7 +2048,7 @@ def checkout():
 
         except Exception as e:
             flash('❌ Error processing your order. Please try again.', 'error')
-            print(f"Order error: {e}")
+            logger.exception('Order error', extra={'user_id': current_user.id, 'cart_items': len(cart_items)})
 
     return render_template('checkout.html', cart_items=cart_items)
 
@@ -1621,14 +2069,17 @@ def order_confirmation(order_id):
 @app.route('/orders')
 @login_required
 def order_history():
-    orders = Order.get_user_orders(current_user.id)
-    return render_template('order_history.html', orders=orders)
+    include_archived = request.args.get('archived') == '1'
+    orders = Order.get_user_orders(current_user.id, include_archived)
+    return render_template('order_history.html', orders=orders, include_archived=include_archived,
+                           has_archive=bool(archive_files(get_archive_dir())))
 
 
 @app.route('/order/<int:order_id>')
 @login_required
 def order_details(order_id):
-    order, order_items = Order.get_order_details(order_id)
+    # Links from the older orders list lead here too
+    order, order_items = Order.get_order_details(order_id, include_archived=True)
 
     # Verify order belongs to current user
     if not order or order['user_id'] != current_user.id:
@@ -1816,39 +2267,116 @@ def clear_cart():
     return jsonify({'success': True, 'message': 'Cart cleared'})
 
 
+# API field name -> product record attribute
+API_PRODUCT_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'price': 'price',
+    'description': 'description',
+    'image_url': 'image_url',
+    'category': 'category_name',
+    'category_id': 'category_id',
+    'stock': 'stock',
+    'average_rating': 'average_rating',
+    'review_count': 'review_count',
+}
+# What a client refreshing cached product cards needs
+API_COMPACT_FIELDS = ('id', 'name', 'price', 'stock', 'image_url')
+
+
+def full_product_listing():
+    """Only the whole-catalog listing is throttled; a multi-get by id is a handful of dict lookups."""
+    return 'ids' not in request.args
+
+
 @app.route('/api/products')
+@admission_limited('catalog', when=full_product_listing)
 def api_products():
-    conn = get_db_connection()
-    products = conn.execute('''
-                            SELECT p.*,
-                                   c.name                     as category_name,
-                                   COALESCE(AVG(r.rating), 0) as average_rating,
-                                   COUNT(r.id)                as review_count
-                            FROM products p
-                                     LEFT JOIN categories c ON p.category_id = c.id
-                                     LEFT JOIN reviews r ON p.id = r.product_id AND r.status = 'approved'
-                            GROUP BY p.id
-                            ''').fetchall()
-    conn.close()
+    if 'ids' in request.args:
+        return api_products_by_id()
 
     products_list = []
-    for product in products:
-        products_list.append({
-            'id': product['id'],
-            'name': product['name'],
-            'price': product['price'],
-            'description': product['description'],
-            'image_url': product['image_url'],
-            'category': product['category_name'],
-            'category_id': product['category_id'],
-            'stock': product['stock'],
-            'average_rating': product['average_rating'],
-            'review_count': product['review_count']
-        })
+    for product in get_catalog().products.values():
+        products_list.append({field: getattr(product, attribute) for field, attribute in API_PRODUCT_FIELDS.items()})
 
     return jsonify(products_list)
 
 
+def api_products_by_id():
+    """``/api/products?ids=1,2,3[&fields=id,price]``: the existing products among ``ids``, in that order.
+
+    Responses carry an ETag of their content, so a client revalidating its
+    cached copies gets a bodyless 304 when nothing it asked about changed.
+    """
+    try:
+        product_ids = list(dict.fromkeys(int(value) for value in request.args['ids'].split(',') if value.strip()))
+    except ValueError:
+        return jsonify({'error': 'ids must be a comma-separated list of product ids'}), 400
+    if len(product_ids) > app.config['API_MAX_IDS']:
+        return jsonify({'error': f"At most {app.config['API_MAX_IDS']} ids per request"}), 400
+
+    fields = request.args.get('fields')
+    fields = [field.strip() for field in fields.split(',')] if fields else API_COMPACT_FIELDS
+    unknown = [field for field in fields if field not in API_PRODUCT_FIELDS]
+    if unknown:
+        return jsonify({'error': f"Unknown fields: {', '.join(unknown)}"}), 400
+
+    attributes = [(field, API_PRODUCT_FIELDS[field]) for field in fields]
+    products = catalog_products(get_catalog(), product_ids, len(product_ids))
+    response = jsonify([{field: getattr(product, attribute) for field, attribute in attributes}
+                        for product in products])
+    response.add_etag()
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+
+def inventory_client_authorized():
+    token = app.config['INVENTORY_API_TOKEN']
+    header = request.headers.get('Authorization', '')
+    if token and header.startswith('Bearer '):
+        return hmac.compare_digest(header[len('Bearer '):].encode(), token.encode())
+    return current_user.is_authenticated and current_user.is_admin
+
+
+@app.route('/api/inventory', methods=['POST'])
+def api_inventory():
+    """Apply a batch of stock and price updates in one transaction (see inventory.py).
+
+    The body is ``{"updates": [{"product_id": 1, "stock_delta": -2}, {"product_id": 2, "stock": 40,
+    "price": 19.99}, ...]}``; the response has one result per update, in order.
+    """
+    if not inventory_client_authorized():
+        return jsonify({'error': 'Admin session or inventory API token required'}), 401
+
+    data = request.get_json(silent=True)
+    updates = data.get('updates') if isinstance(data, dict) else None
+    if not isinstance(updates, list) or not updates:
+        return jsonify({'error': 'Body must be a JSON object with a non-empty "updates" list'}), 400
+    if len(updates) > app.config['INVENTORY_MAX_UPDATES']:
+        return jsonify({'error': f"At most {app.config['INVENTORY_MAX_UPDATES']} updates per request"}), 400
+
+    conn = get_db_connection()
+    try:
+        results, changed = apply_inventory_updates(conn, updates)
+    except sqlite3.OperationalError as e:
+        # Only lock contention is worth a retry; any other failure is a server error
+        if 'locked' not in str(e):
+            raise
+        # The write lock stayed busy past DATABASE_TIMEOUT; nothing was applied
+        logger.warning('Inventory batch not applied', extra={'error': str(e)})
+        return jsonify({'error': 'Database busy, retry the batch'}), 503, {'Retry-After': '1'}
+    finally:
+        conn.close()
+    if changed:
+        # Reloads just the changed products here; other workers pick them up from the change log
+        refresh_catalog()
+
+    counts = {status: 0 for status in ('updated', 'unchanged', 'error')}
+    for result in results:
+        counts[result['status']] += 1
+    return jsonify({**counts, 'results': results})
+
+
 @app.route('/api/categories')
 def api_categories():
     conn = get_db_connection()
@@ -1896,6 +2424,29 @@ def api_reviews(product_id):
     return jsonify(reviews_list)
 
 
+@app.route('/api/products/<int:product_id>/also-saved')
+def api_also_saved(product_id):
+    """Products most often saved to the same wishlists as this one."""
+    catalog = get_catalog()
+    if catalog.product(product_id) is None:
+        return jsonify({'error': 'Product not found'}), 404
+
+    limit = max(1, min(request.args.get('limit', 4, type=int), 12))
+    conn = get_db_connection()
+    product_ids = neighbors(conn, WISHLIST.kind, product_id)
+    conn.close()
+
+    return jsonify([{
+        'id': product.id,
+        'name': product.name,
+        'price': product.price,
+        'image_url': product.image_url,
+        'category': product.category_name,
+        'average_rating': product.average_rating,
+        'review_count': product.review_count
+    } for product in catalog_products(catalog, product_ids, limit)])
+
+
 # Search Suggestions API
 @app.route('/api/search/suggestions')
 def search_suggestions():
@@ -1931,9 +2482,58 @@ def search_suggestions():
             'display_text': f"{suggestion['product_name']} ({suggestion['category_name']})"
         })
 
+    # Few exact matches: probably a typo, so fill up with the most similar names
+    if len(results) < app.config['SEARCH_FUZZY_BELOW']:
+        catalog = get_catalog()
+        seen = {result['product_id'] for result in results}
+        for product_id, _ in get_trigram_index().search(query, limit=10):
+            product = catalog.product(product_id)
+            if product is None or product_id in seen:
+                continue
+            results.append({
+                'type': 'similar',
+                'product_name': product.name,
+                'category_name': product.category_name,
+                'product_id': product.id,
+                'category_id': product.category_id,
+                'display_text': f"{product.name} ({product.category_name})"
+            })
+            if len(results) == 10:
+                break
+
     return jsonify(results)
 
 
+# Health checks for load balancers and orchestrators
+@app.route('/healthz')
+def healthz():
+    """Liveness: the worker is up and answering requests."""
+    return jsonify({'status': 'ok', 'pid': os.getpid()})
+
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: the database can be opened and carries the current schema.
+
+    Reads only the file header, so it is cheap enough to poll every few seconds.
+    """
+    try:
+        uri = Path(app.config['DATABASE']).resolve().as_uri() + '?mode=ro'
+        conn = sqlite3.connect(uri, uri=True, timeout=1.0)
+        try:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logger.warning('Readiness check failed', extra={'error': str(e)})
+        return jsonify({'status': 'unavailable', 'error': 'database unreachable'}), 503
+
+    if version < SCHEMA_VERSION:
+        return jsonify({'status': 'unavailable', 'error': 'database not initialized',
+                        'schema_version': version}), 503
+    return jsonify({'status': 'ok', 'schema_version': version})
+
+
 # Admin routes for review moderation
 @app.route('/admin/reviews')
 @login_required
@@ -1991,6 +2591,7 @@ def moderate_review(review_id, action):
 
     conn.commit()
     conn.close()
+    refresh_catalog()
 
     return redirect('/admin/reviews')
 
@@ -2194,9 +2795,14 @@ def wishlist():
     wishlist = Wishlist.get_user_wishlist(current_user.id)
     items = Wishlist.get_wishlist_items(wishlist['id'])
 
+    conn = get_db_connection()
+    suggested = recommend_for(conn, WISHLIST.kind, [item['product_id'] for item in items], 8)
+    conn.close()
+
     return render_template('wishlist.html',
                            wishlist=wishlist,
-                           wishlist_items=items)
+                           wishlist_items=items,
+                           also_saved=catalog_products(get_catalog(), suggested, 4))
 
 
 @app.route('/wishlist/add/<int:product_id>', methods=['POST'])
@@ -2368,47 +2974,15 @@ def update_localstorage_cart(user_id):
 
 
 
-# Debug: Check for duplicate route names
-print("🔍 Checking for duplicate route endpoints...")
-endpoints = {}
-for rule in app.url_map.iter_rules():
-    if rule.endpoint in endpoints:
-        print(f"❌ DUPLICATE: {rule.endpoint}")
-        print(f"   Route 1: {endpoints[rule.endpoint]}")
-        print(f"   Route 2: {rule}")
-    else:
-        endpoints[rule.endpoint] = str(rule)
+if __name__ == '__main__':
+    create_app()
+    logger.info('E-commerce Website Starting', extra={'cwd': os.getcwd(), 'database': app.config['DATABASE']})
 
-print(f"✅ Total unique endpoints: {len(endpoints)}")
+    # One-time setup; a current database is detected with a single PRAGMA read
+    if database_needs_init():
+        init_database()
 
-if __name__ == '__main__':
-    # Print debug information
-    print("=" * 60)
-    print("🚀 E-commerce Website Starting...")
-    print("📁 Current working directory:", os.getcwd())
-    print("📁 Template folder:", TEMPLATE_DIR)
-    print("📁 Static folder:", STATIC_DIR)
-    print("✅ Template folder exists:", os.path.exists(TEMPLATE_DIR))
-    print("✅ Static folder exists:", os.path.exists(STATIC_DIR))
-
-    if os.path.exists(TEMPLATE_DIR):
-        print("📄 Files in template folder:")
-        for file in os.listdir(TEMPLATE_DIR):
-            print("   └──", file)
-
-    # Initialize database - THIS IS THE FIX!
-    init_database()
-
-    print("\n🔑 Demo credentials:")
-    print("   Username: demo")
-    print("   Password: demo123")
-    print("   Admin access:")
-    print("   Username: admin")
-    print("   Password: admin123")
-    print("\n🌐 Access the site at: http://localhost:5000")
-    print("   Admin dashboard: http://localhost:5000/admin")
-    print("   Admin reviews: http://localhost:5000/admin/reviews")
-    print("   Advanced Search: http://localhost:5000/advanced-search")
-    print("=" * 60)
+    logger.info('Demo credentials: demo / demo123, admin / admin123')
+    logger.info('Access the site at http://localhost:5000 (admin dashboard at /admin)')
 
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
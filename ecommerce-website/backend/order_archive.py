@@ -0,0 +1,206 @@
+"""Moving old orders out to per-year archive databases.
+
+``archive_orders`` moves orders placed before a cutoff and in a terminal
+status (``ARCHIVE_STATUSES``), with their items, into one SQLite file per
+order year in the archive directory (``orders-2024.db``, ...).  The main
+database - and every scan, listing and index over ``orders`` - then only
+holds recent orders, and the archive files can be backed up once and left
+alone.
+
+It works in batches of ``batch_size`` orders, walking ``orders`` by id, and
+each batch takes two short transactions with the year's file ``ATTACH``ed:
+
+1. copy the orders and their items into the archive file;
+2. in the main database, delete the orders whose row still matches the
+   copy (and their items), after recording their sales for the
+   leaderboards (``leaderboards.record_archived_sales``).
+
+SQLite does not commit a WAL database and an attached one atomically, so
+the copy is committed first: a crash in between leaves an order in both
+places, never in neither, and the next run copies it again; readers skip
+archived copies of orders still in the main database.  An order whose
+status changed between the two steps stays in the main database and its
+copy is dropped again.
+
+Reads go to the main database first; ``find_order`` and ``user_orders``
+attach the archive files one at a time for pages that ask for older orders.
+Recommendations are computed from the orders still in the main database.
+"""
+import glob
+import json
+import os
+import re
+
+ARCHIVE_STATUSES = ('completed', 'cancelled')
+
+ORDER_COLUMNS = ('id', 'user_id', 'order_number', 'total_amount', 'status', 'shipping_address', 'billing_address',
+                 'payment_method', 'payment_status', 'created_at', 'updated_at')
+ORDER_ITEM_COLUMNS = ('id', 'order_id', 'product_id', 'product_name', 'product_price', 'quantity', 'total_price')
+
+ARCHIVE_SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS archive.orders
+    (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        order_number TEXT NOT NULL,
+        total_amount REAL NOT NULL,
+        status TEXT,
+        shipping_address TEXT,
+        billing_address TEXT,
+        payment_method TEXT,
+        payment_status TEXT,
+        created_at TIMESTAMP,
+        updated_at TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS archive.order_items
+    (
+        id INTEGER PRIMARY KEY,
+        order_id INTEGER NOT NULL,
+        product_id INTEGER NOT NULL,
+        product_name TEXT NOT NULL,
+        product_price REAL NOT NULL,
+        quantity INTEGER NOT NULL,
+        total_price REAL NOT NULL
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS archive.idx_archived_orders_user ON orders (user_id, created_at)',
+    'CREATE INDEX IF NOT EXISTS archive.idx_archived_order_items_order ON order_items (order_id)',
+)
+
+_ARCHIVE_FILE = re.compile(r'orders-(\d{4})\.db$')
+
+
+def archive_path(archive_dir, year):
+    return os.path.join(archive_dir, f'orders-{year}.db')
+
+
+def archive_files(archive_dir):
+    """Archive files in ``archive_dir``, newest year first."""
+    paths = [path for path in glob.glob(os.path.join(archive_dir, 'orders-*.db')) if _ARCHIVE_FILE.search(path)]
+    return sorted(paths, reverse=True)
+
+
+class _Attached:
+    """``with _Attached(conn, path):`` - ``path`` is the ``archive`` schema inside the block."""
+
+    def __init__(self, conn, path):
+        self.conn = conn
+        self.path = path
+
+    def __enter__(self):
+        self.conn.execute('ATTACH DATABASE ? AS archive', (self.path,))
+        return self.conn
+
+    def __exit__(self, *exc_info):
+        if self.conn.in_transaction:
+            self.conn.rollback()
+        self.conn.execute('DETACH DATABASE archive')
+
+
+def archive_orders(conn, archive_dir, before, batch_size=1000):
+    """Move terminal orders placed before ``before`` (``YYYY-MM-DD``) out; returns ``{year: orders moved}``."""
+    os.makedirs(archive_dir, exist_ok=True)
+    statuses = ', '.join(f"'{status}'" for status in ARCHIVE_STATUSES)
+    moved = {}
+    last_id = 0
+    while True:
+        batch = conn.execute(f'''
+                             SELECT id, strftime('%Y', created_at)
+                             FROM orders
+                             WHERE id > ?
+                               AND created_at < ?
+                               AND status IN ({statuses})
+                             ORDER BY id LIMIT ?
+                             ''', (last_id, before, batch_size)).fetchall()
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        by_year = {}
+        for order_id, year in batch:
+            by_year.setdefault(year, []).append(order_id)
+        for year, order_ids in by_year.items():
+            moved[year] = moved.get(year, 0) + _move(conn, archive_path(archive_dir, year), json.dumps(order_ids))
+    return moved
+
+
+def _move(conn, path, order_ids):
+    from leaderboards import record_archived_sales
+
+    with _Attached(conn, path):
+        for statement in ARCHIVE_SCHEMA:
+            conn.execute(statement)
+        with conn:
+            conn.execute(f'''
+                         INSERT OR REPLACE INTO archive.orders ({', '.join(ORDER_COLUMNS)})
+                         SELECT {', '.join(ORDER_COLUMNS)}
+                         FROM main.orders
+                         WHERE id IN (SELECT value FROM json_each(?))
+                         ''', (order_ids,))
+            conn.execute(f'''
+                         INSERT OR REPLACE INTO archive.order_items ({', '.join(ORDER_ITEM_COLUMNS)})
+                         SELECT {', '.join(ORDER_ITEM_COLUMNS)}
+                         FROM main.order_items
+                         WHERE order_id IN (SELECT value FROM json_each(?))
+                         ''', (order_ids,))
+
+        conn.execute('BEGIN IMMEDIATE')
+        # Only orders nobody touched since the copy; the rest are copied again next run
+        copied = json.dumps([row[0] for row in conn.execute('''
+                                                            SELECT o.id
+                                                            FROM main.orders o
+                                                                     JOIN archive.orders a ON a.id = o.id
+                                                            WHERE o.id IN (SELECT value FROM json_each(?))
+                                                              AND a.status IS o.status
+                                                              AND a.payment_status IS o.payment_status
+                                                              AND a.updated_at IS o.updated_at
+                                                            ''', (order_ids,))])
+        record_archived_sales(conn, copied)
+        conn.execute('DELETE FROM main.order_items WHERE order_id IN (SELECT value FROM json_each(?))', (copied,))
+        deleted = conn.execute('DELETE FROM main.orders WHERE id IN (SELECT value FROM json_each(?))',
+                               (copied,)).rowcount
+        conn.commit()
+
+        # Copies of orders that stayed behind are stale; the main database row is the order
+        with conn:
+            for table, column in (('order_items', 'order_id'), ('orders', 'id')):
+                conn.execute(f'''
+                             DELETE FROM archive.{table}
+                             WHERE {column} IN (SELECT value FROM json_each(?))
+                               AND {column} IN (SELECT id FROM main.orders)
+                             ''', (order_ids,))
+    return deleted
+
+
+def find_order(conn, archive_dir, order_id):
+    """``(order, items)`` of an archived order, or ``(None, [])``; items carry the product's current image."""
+    for path in archive_files(archive_dir):
+        with _Attached(conn, path):
+            order = conn.execute('SELECT * FROM archive.orders WHERE id = ?', (order_id,)).fetchone()
+            if order is not None:
+                items = conn.execute('''
+                                     SELECT oi.*, p.image_url
+                                     FROM archive.order_items oi
+                                              LEFT JOIN main.products p ON oi.product_id = p.id
+                                     WHERE oi.order_id = ?
+                                     ''', (order_id,)).fetchall()
+                return order, items
+    return None, []
+
+
+def user_orders(conn, archive_dir, user_id):
+    """A user's archived orders, newest first."""
+    orders = []
+    for path in archive_files(archive_dir):
+        with _Attached(conn, path):
+            # An order in both places (a move cut short) is listed once, from the main database
+            orders += conn.execute('''
+                                   SELECT *
+                                   FROM archive.orders a
+                                   WHERE user_id = ?
+                                     AND NOT EXISTS (SELECT 1 FROM main.orders o WHERE o.id = a.id)
+                                   ORDER BY created_at DESC
+                                   ''', (user_id,)).fetchall()
+    return orders
@@ -0,0 +1,177 @@
+"""On-demand request profiling.
+
+When ``PROFILING_ENABLED`` is set, a small WSGI middleware runs selected
+requests under cProfile: requests carrying a valid ``X-Profile-Token``
+header (minted by admins on ``/admin/profiles``) and, optionally, a random
+``PROFILING_SAMPLE_RATE`` fraction of all traffic.  Each capture is saved
+as a pstats file in a bounded on-disk ring and can be inspected or
+downloaded from the admin page.
+
+With profiling disabled the middleware is never installed, so ordinary
+requests pay nothing for it.
+"""
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import threading
+import time
+
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+PROFILE_HEADER = 'X-Profile-Token'
+TOKEN_SALT = 'request-profiling'
+PROFILE_NAME_RE = re.compile(r'^(\d+)_([A-Z]+)_([\w.-]*)_(\d+)ms\.prof$')
+
+
+def _serializer(secret_key):
+    return URLSafeTimedSerializer(secret_key, salt=TOKEN_SALT)
+
+
+def make_profile_token(secret_key):
+    """Signed, time-limited token that makes a request carrying it get profiled."""
+    return _serializer(secret_key).dumps('profile')
+
+
+def verify_profile_token(secret_key, token, max_age):
+    try:
+        return _serializer(secret_key).loads(token, max_age=max_age) == 'profile'
+    except BadSignature:
+        return False
+
+
+class ProfileStore:
+    """Directory of ``.prof`` captures; the oldest file is evicted once ``max_files`` is exceeded."""
+
+    def __init__(self, directory, max_files=50):
+        self.directory = directory
+        self.max_files = max_files
+        self._lock = threading.Lock()
+
+    def new_name(self, method, path, elapsed):
+        slug = re.sub(r'[^\w.-]+', '-', path.strip('/'))[:60] or 'index'
+        return f'{time.time_ns()}_{method}_{slug}_{int(elapsed * 1000)}ms.prof'
+
+    def save(self, profiler, name):
+        os.makedirs(self.directory, exist_ok=True)
+        profiler.dump_stats(os.path.join(self.directory, name))
+        with self._lock:
+            names = sorted(n for n in os.listdir(self.directory) if PROFILE_NAME_RE.match(n))
+            for old in names[:max(len(names) - self.max_files, 0)]:
+                try:
+                    os.remove(os.path.join(self.directory, old))
+                except FileNotFoundError:
+                    pass
+
+    def list(self):
+        """Captures, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        captures = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            match = PROFILE_NAME_RE.match(name)
+            if not match:
+                continue
+            captures.append({
+                'name': name,
+                'created_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(int(match.group(1)) / 1e9)),
+                'method': match.group(2),
+                'route': match.group(3),
+                'duration_ms': int(match.group(4)),
+                'size': os.path.getsize(os.path.join(self.directory, name)),
+            })
+        return captures
+
+    def path_for(self, name):
+        """Absolute path of a capture, or None for unknown or malformed names."""
+        if not PROFILE_NAME_RE.match(name):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
+
+    def summary(self, name, sort='cumulative', limit=40):
+        path = self.path_for(name)
+        if not path:
+            return None
+        out = io.StringIO()
+        pstats.Stats(path, stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+class ProfilingMiddleware:
+    """Runs token-bearing or sampled requests under cProfile.
+
+    Only one request is profiled at a time; concurrent candidates simply
+    run unprofiled rather than waiting.
+    """
+
+    def __init__(self, wsgi_app, store, secret_key, sample_rate=0.0, token_max_age=3600):
+        self.wsgi_app = wsgi_app
+        self.store = store
+        self.secret_key = secret_key
+        self.sample_rate = sample_rate
+        self.token_max_age = token_max_age
+        self._busy = threading.Lock()
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # A request being profiled in the parent at fork time would otherwise leave this held forever
+        self._busy = threading.Lock()
+
+    def _wanted(self, environ):
+        token = environ.get('HTTP_X_PROFILE_TOKEN')
+        if token:
+            return verify_profile_token(self.secret_key, token, self.token_max_age)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, environ, start_response):
+        if not self._wanted(environ) or not self._busy.acquire(blocking=False):
+            return self.wsgi_app(environ, start_response)
+        try:
+            return self._profile(environ, start_response)
+        finally:
+            self._busy.release()
+
+    def _profile(self, environ, start_response):
+        method = environ.get('REQUEST_METHOD', 'GET')
+        path = environ.get('PATH_INFO', '/')
+        captured = {}
+        written = []
+
+        def capture_start_response(status, headers, exc_info=None):
+            captured['status'], captured['headers'], captured['exc_info'] = status, headers, exc_info
+            # Output passed to the legacy write() callable goes out before the returned body, as it would have
+            return written.append
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            # Consume the body inside the profiler so lazy rendering is included
+            body = self.wsgi_app(environ, capture_start_response)
+            try:
+                chunks = written + list(body)
+            finally:
+                if hasattr(body, 'close'):
+                    body.close()
+        finally:
+            profiler.disable()
+
+        name = self.store.new_name(method, path, time.perf_counter() - started)
+        self.store.save(profiler, name)
+        start_response(captured['status'], list(captured['headers']) + [('X-Profile-Id', name)],
+                       captured['exc_info'])
+        return chunks
+
+
+def init_profiling(app):
+    """Attach the profile store to ``app`` and install the middleware if profiling is enabled."""
+    store = ProfileStore(app.config['PROFILING_DIR'], app.config['PROFILING_MAX_FILES'])
+    app.extensions['profiling'] = store
+    if app.config['PROFILING_ENABLED']:
+        app.wsgi_app = ProfilingMiddleware(app.wsgi_app, store, app.secret_key,
+                                           sample_rate=app.config['PROFILING_SAMPLE_RATE'],
+                                           token_max_age=app.config['PROFILING_TOKEN_MAX_AGE'])
+    return store
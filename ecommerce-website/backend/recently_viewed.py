@@ -0,0 +1,132 @@
+"""Recently viewed products per visitor.
+
+Each visitor has a bounded ring of the last ``RECENT_LIMIT`` products they
+looked at, most recent first.  Anonymous visitors keep theirs in the
+session cookie (``push``).  Logged-in users' rings live in
+``recently_viewed``, one row per (user, product) trimmed to the limit, so
+they follow the user across devices; ``RecentViews`` coalesces the writes
+the same way ``ViewCounter`` does (see ``view_counts.py``): views are held
+in memory and written in one transaction every ``flush_interval`` seconds
+and at exit, and reads merge the unwritten ones in.
+
+Only ids are stored; the page turns them into product cards from the
+catalog snapshot, without SQL.
+"""
+import atexit
+import os
+import threading
+import time
+
+from app_logging import logger
+
+RECENT_LIMIT = 12
+
+RECENTLY_VIEWED_SCHEMA = (
+    # viewed_at is a Unix time: several views a second must still order correctly
+    '''
+    CREATE TABLE IF NOT EXISTS recently_viewed
+    (
+        user_id INTEGER NOT NULL,
+        product_id INTEGER NOT NULL,
+        viewed_at REAL NOT NULL,
+        PRIMARY KEY (user_id, product_id)
+    ) WITHOUT ROWID
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_recently_viewed_user ON recently_viewed (user_id, viewed_at DESC)',
+)
+
+
+def install_recently_viewed(conn):
+    for statement in RECENTLY_VIEWED_SCHEMA:
+        conn.execute(statement)
+
+
+def push(ring, product_id, limit=RECENT_LIMIT):
+    """``ring`` with ``product_id`` moved to the front, cut to ``limit`` entries."""
+    return [product_id] + [other for other in ring if other != product_id][:limit - 1]
+
+
+class RecentViews:
+    def __init__(self, connect, flush_interval=5.0, limit=RECENT_LIMIT):
+        self._connect = connect
+        self.flush_interval = flush_interval
+        self.limit = limit
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+        atexit.register(self._final_flush)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._pending = {}      # user id -> {product id: viewed at}
+        self._in_flight = {}    # the same, for views being written right now
+        self._flusher = None
+
+    def record(self, user_id, product_id):
+        with self._lock:
+            self._pending.setdefault(user_id, {})[product_id] = time.time()
+            if self._flusher is None and self.flush_interval > 0:
+                self._flusher = threading.Thread(target=self._run, name='recent-views-flush', daemon=True)
+                self._flusher.start()
+
+    def recent(self, conn, user_id):
+        """Product ids ``user_id`` viewed last, most recent first, read with the caller's connection."""
+        viewed = dict(conn.execute('''
+                                   SELECT product_id, viewed_at
+                                   FROM recently_viewed
+                                   WHERE user_id = ?
+                                   ORDER BY viewed_at DESC LIMIT ?
+                                   ''', (user_id, self.limit)).fetchall())
+        with self._lock:
+            viewed.update(self._in_flight.get(user_id, ()))
+            viewed.update(self._pending.get(user_id, ()))
+        return sorted(viewed, key=viewed.get, reverse=True)[:self.limit]
+
+    def flush(self):
+        """Write the views recorded so far and trim the rings they touched; returns the number of users."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._in_flight = pending
+        if not pending:
+            return 0
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany('''
+                                 INSERT INTO recently_viewed (user_id, product_id, viewed_at)
+                                 VALUES (?, ?, ?)
+                                 ON CONFLICT (user_id, product_id) DO UPDATE SET viewed_at = MAX(viewed_at, excluded.viewed_at)
+                                 ''', [(user_id, product_id, viewed_at) for user_id, views in pending.items()
+                                       for product_id, viewed_at in views.items()])
+                conn.executemany('''
+                                 DELETE FROM recently_viewed
+                                 WHERE user_id = ?
+                                   AND product_id NOT IN (SELECT product_id
+                                                          FROM recently_viewed
+                                                          WHERE user_id = ?
+                                                          ORDER BY viewed_at DESC LIMIT ?)
+                                 ''', [(user_id, user_id, self.limit) for user_id in pending])
+        except Exception:
+            # Keep the views for the next attempt, under any made since
+            with self._lock:
+                for user_id, views in pending.items():
+                    self._pending[user_id] = {**views, **self._pending.get(user_id, {})}
+            raise
+        finally:
+            with self._lock:
+                self._in_flight = {}
+            conn.close()
+        return len(pending)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Recently viewed flush failed')
+
+    def _final_flush(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Recently viewed flush at exit failed')
@@ -0,0 +1,254 @@
+"""Precomputed item-to-item recommendations.
+
+Two products are neighbours when they share a basket: an order for
+"customers also bought" (``CO_PURCHASE``), a wishlist for "people who saved
+this also saved" (``WISHLIST``).  A batch job counts, for every pair of
+products, the baskets they share and keeps the ``TOP_K`` best neighbours of
+each product in ``product_neighbors`` - a ``WITHOUT ROWID`` table keyed by
+``(kind, product_id, rank)``, so a page reads a list with one primary-key
+range lookup.
+
+Neighbours are ranked by cosine similarity,
+``together / sqrt(baskets(a) * baskets(b))``, so a best seller that is in
+every basket does not top every list.  The work per product is bounded:
+baskets with more than ``MAX_BASKET`` distinct products (bulk and test
+orders) are left out, since a basket of n products yields n*(n-1) pairs, and
+a popular product is only paired through its ``MAX_BASKETS_PER_PRODUCT``
+most recent baskets.
+
+The counting runs inside SQLite: it joins the basket rows on their
+``(basket, product)`` index, groups the pairs (spilling to its temp store
+rather than holding them in memory) and ranks them with a window function,
+with no Python work per row.  The result goes to a temp table first, so
+the write lock on the database is only held for the final swap of the
+changed lists.
+
+Runs are incremental: only products in baskets that gained rows since the
+last run are recomputed, plus those logged to ``recommendation_changes`` by
+the triggers on removals.  The popularity normalisation of the untouched
+lists does drift a little, so run a ``--full`` build now and then (nightly,
+say).
+
+Run it from cron:
+
+    flask --app "minimal_app:create_app()" build-recommendations [--full]
+"""
+import math
+import time
+
+TOP_K = 12
+MAX_BASKET = 50
+MAX_BASKETS_PER_PRODUCT = 5000
+
+RECOMMENDATION_SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS product_neighbors
+    (
+        kind TEXT NOT NULL,
+        product_id INTEGER NOT NULL,
+        rank INTEGER NOT NULL,
+        neighbor_id INTEGER NOT NULL,
+        score REAL NOT NULL,
+        PRIMARY KEY (kind, product_id, rank)
+    ) WITHOUT ROWID
+    ''',
+    # Last source row and last logged change folded into each kind's neighbour lists
+    '''
+    CREATE TABLE IF NOT EXISTS recommendation_state
+    (
+        kind TEXT PRIMARY KEY,
+        last_id INTEGER NOT NULL DEFAULT 0,
+        last_change INTEGER NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    # Products whose baskets lost a row; new rows are found by id instead
+    '''
+    CREATE TABLE IF NOT EXISTS recommendation_changes
+    (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        product_id INTEGER NOT NULL
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS wishlist_items_removed AFTER DELETE ON wishlist_items
+    BEGIN
+        INSERT INTO recommendation_changes (kind, product_id) VALUES ('wishlist', OLD.product_id);
+        INSERT INTO recommendation_changes (kind, product_id)
+        SELECT 'wishlist', product_id FROM wishlist_items WHERE wishlist_id = OLD.wishlist_id;
+    END
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items (order_id, product_id)',
+    'CREATE INDEX IF NOT EXISTS idx_order_items_product ON order_items (product_id, order_id)',
+    # wishlist_items' UNIQUE (wishlist_id, product_id) already covers the other direction
+    'CREATE INDEX IF NOT EXISTS idx_wishlist_items_product ON wishlist_items (product_id, wishlist_id)',
+)
+
+
+def install_recommendations(conn):
+    for statement in RECOMMENDATION_SCHEMA:
+        conn.execute(statement)
+    # Databases from before last_change existed
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(recommendation_state)')}
+    if 'last_change' not in columns:
+        conn.execute('ALTER TABLE recommendation_state ADD COLUMN last_change INTEGER NOT NULL DEFAULT 0')
+
+
+class CoOccurrence:
+    """Top-K neighbours of each product by how often they share a basket.
+
+    ``table`` holds one row per (basket, product) with an increasing ``id``;
+    ``basket_column`` names the basket.  Pairs seen together in fewer than
+    ``min_together`` baskets are ignored.
+    """
+
+    def __init__(self, kind, table, basket_column, top_k=TOP_K, max_basket=MAX_BASKET,
+                 max_baskets_per_product=MAX_BASKETS_PER_PRODUCT, min_together=1):
+        self.kind = kind
+        self.table = table
+        self.basket = basket_column
+        self.top_k = top_k
+        self.max_basket = max_basket
+        self.max_baskets_per_product = max_baskets_per_product
+        self.min_together = min_together
+
+    def build(self, conn, full=False):
+        """Recompute the neighbour lists that changed, or all of them; returns ``(products, seconds)``."""
+        started = time.perf_counter()
+        conn.create_function('sqrt', 1, math.sqrt, deterministic=True)
+        for table in ('rec_affected', 'rec_big_baskets', 'rec_neighbors'):
+            conn.execute(f'DROP TABLE IF EXISTS temp.{table}')
+
+        # Compute from one read snapshot, writing only to temp tables
+        conn.execute('BEGIN')
+        try:
+            row = conn.execute('SELECT last_id, last_change FROM recommendation_state WHERE kind = ?',
+                               (self.kind,)).fetchone()
+            last_id, last_change = (0, 0) if full or row is None else row
+            latest = conn.execute(f'SELECT COALESCE(MAX(id), 0) FROM {self.table}').fetchone()[0]
+            latest_change = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM recommendation_changes').fetchone()[0]
+            self._collect_affected(conn, full, last_id, last_change)
+            self._rank(conn)
+            updated = conn.execute('SELECT COUNT(*) FROM rec_affected').fetchone()[0]
+        except Exception:
+            # Also drops the temp tables created so far
+            conn.rollback()
+            raise
+        conn.commit()
+
+        try:
+            if full:
+                conn.execute('DELETE FROM product_neighbors WHERE kind = ?', (self.kind,))
+            else:
+                conn.execute('DELETE FROM product_neighbors WHERE kind = ? AND product_id IN rec_affected',
+                             (self.kind,))
+            conn.execute('INSERT INTO product_neighbors SELECT ?, * FROM rec_neighbors', (self.kind,))
+            conn.execute('''
+                         INSERT INTO recommendation_state (kind, last_id, last_change, updated_at)
+                         VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                         ON CONFLICT (kind) DO UPDATE SET last_id     = excluded.last_id,
+                                                          last_change = excluded.last_change,
+                                                          updated_at  = excluded.updated_at
+                         ''', (self.kind, latest, latest_change))
+            conn.execute('DELETE FROM recommendation_changes WHERE kind = ? AND seq <= ?',
+                         (self.kind, latest_change))
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+        for table in ('rec_affected', 'rec_big_baskets', 'rec_neighbors'):
+            conn.execute(f'DROP TABLE temp.{table}')
+        return updated, time.perf_counter() - started
+
+    def _collect_affected(self, conn, full, last_id, last_change):
+        # A new row changes the pair counts of every product in its basket
+        conn.execute('CREATE TEMP TABLE rec_affected (product_id INTEGER PRIMARY KEY)')
+        if full:
+            conn.execute(f'INSERT INTO rec_affected SELECT DISTINCT product_id FROM {self.table}')
+        else:
+            conn.execute(f'''
+                         INSERT INTO rec_affected
+                         SELECT DISTINCT product_id FROM {self.table}
+                         WHERE {self.basket} IN (SELECT {self.basket} FROM {self.table} WHERE id > ?)
+                         ''', (last_id,))
+            conn.execute('''
+                         INSERT OR IGNORE INTO rec_affected
+                         SELECT product_id FROM recommendation_changes WHERE kind = ? AND seq > ?
+                         ''', (self.kind, last_change))
+
+        conn.execute('CREATE TEMP TABLE rec_big_baskets (basket_id INTEGER PRIMARY KEY)')
+        conn.execute(f'''
+                     INSERT INTO rec_big_baskets
+                     SELECT {self.basket} FROM {self.table}
+                     GROUP BY {self.basket}
+                     HAVING COUNT(DISTINCT product_id) > ?
+                     ''', (self.max_basket,))
+
+    def _rank(self, conn):
+        conn.execute(f'''
+                     CREATE TEMP TABLE rec_neighbors AS
+                     WITH popularity AS (SELECT product_id, COUNT(DISTINCT {self.basket}) AS baskets
+                                         FROM {self.table}
+                                         GROUP BY product_id),
+                          sampled AS (SELECT product_id, basket_id
+                                      FROM (SELECT t.product_id, t.{self.basket} AS basket_id,
+                                                   ROW_NUMBER() OVER (PARTITION BY t.product_id ORDER BY t.id DESC) AS n
+                                            FROM rec_affected r
+                                                     JOIN {self.table} t ON t.product_id = r.product_id
+                                            WHERE t.{self.basket} NOT IN rec_big_baskets)
+                                      WHERE n <= ?),
+                          pairs AS (SELECT a.product_id, b.product_id AS neighbor_id,
+                                           COUNT(DISTINCT a.basket_id) AS together
+                                    FROM sampled a
+                                             JOIN {self.table} b ON b.{self.basket} = a.basket_id
+                                        AND b.product_id != a.product_id
+                                    GROUP BY a.product_id, b.product_id
+                                    HAVING together >= ?),
+                          ranked AS (SELECT p.product_id, p.neighbor_id, p.together,
+                                            pa.baskets AS baskets_a, pb.baskets AS baskets_b,
+                                            ROW_NUMBER() OVER (PARTITION BY p.product_id
+                                                ORDER BY p.together * p.together * 1.0 / pb.baskets DESC,
+                                                    p.neighbor_id) AS rank
+                                     FROM pairs p
+                                              JOIN popularity pa ON pa.product_id = p.product_id
+                                              JOIN popularity pb ON pb.product_id = p.neighbor_id)
+                     SELECT product_id, rank, neighbor_id, together / sqrt(baskets_a * baskets_b) AS score
+                     FROM ranked
+                     WHERE rank <= ?
+                     ''', (self.max_baskets_per_product, self.min_together, self.top_k))
+
+
+CO_PURCHASE = CoOccurrence('co_purchase', 'order_items', 'order_id')
+# Private wishlists count too, so a pair needs two wishlists before it can show anyone what one user saved
+WISHLIST = CoOccurrence('wishlist', 'wishlist_items', 'wishlist_id', min_together=2)
+KINDS = (CO_PURCHASE, WISHLIST)
+
+
+def neighbors(conn, kind, product_id, limit=TOP_K):
+    """Neighbour product ids of ``product_id``, best first."""
+    rows = conn.execute('''
+                        SELECT neighbor_id
+                        FROM product_neighbors
+                        WHERE kind = ?
+                          AND product_id = ?
+                        ORDER BY rank LIMIT ?
+                        ''', (kind, product_id, limit)).fetchall()
+    return [row[0] for row in rows]
+
+
+def recommend_for(conn, kind, product_ids, limit=TOP_K):
+    """Product ids most related to the set ``product_ids`` as a whole, excluding them, best first."""
+    product_ids = list(product_ids)[:500]
+    if not product_ids:
+        return []
+    rows = conn.execute(f'''
+                        SELECT neighbor_id, SUM(score) AS score
+                        FROM product_neighbors
+                        WHERE kind = ?
+                          AND product_id IN ({','.join('?' * len(product_ids))})
+                        GROUP BY neighbor_id
+                        ORDER BY score DESC, neighbor_id LIMIT ?
+                        ''', (kind, *product_ids, limit + len(product_ids))).fetchall()
+    exclude = set(product_ids)
+    return [row[0] for row in rows if row[0] not in exclude][:limit]
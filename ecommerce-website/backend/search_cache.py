@@ -0,0 +1,76 @@
+"""Result cache for product searches.
+
+Listing and search traffic repeats a small set of filter combinations, so
+``SearchCache`` keeps the outcome of recent ones: the matching product ids
+in order, as a compact ``array``, plus the facet counts.  A hit only has to
+look the ids up in the catalog snapshot.
+
+Keys are canonical (``search_key``): the query is lower-cased with its
+whitespace collapsed, price bounds at or beyond the catalog's own price
+range are dropped and unknown sort options are mapped to the default, so
+requests that would give the same results share one entry.  Entries are
+evicted least recently used first beyond ``max_entries``, expire after
+``ttl`` seconds, and are only served for the catalog snapshot (``seq``)
+they were computed from, so a catalog change invalidates them all at once.
+"""
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from facets import SORT_KEYS
+from metrics import metrics
+
+
+def normalize_query(query):
+    return ' '.join((query or '').lower().split())
+
+
+def search_key(query, category_id, min_price, max_price, in_stock, sort_by, sort_order, category_names,
+               price_range):
+    """Canonical cache key of one search; ``price_range`` is the catalog's ``{'min_price', 'max_price'}``."""
+    if min_price is not None and price_range['min_price'] is not None and min_price <= price_range['min_price']:
+        min_price = None
+    if max_price is not None and price_range['max_price'] is not None and max_price >= price_range['max_price']:
+        max_price = None
+    if sort_by not in SORT_KEYS:
+        # CatalogFilter.search falls back to newest first
+        sort_by, sort_order = 'date', 'desc'
+    return (normalize_query(query), category_id or None, min_price, max_price, bool(in_stock), sort_by,
+            'desc' if sort_order == 'desc' else 'asc', bool(category_names))
+
+
+class SearchCache:
+    def __init__(self, max_entries=512, ttl=60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (seq, expires at, product ids, facets)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, seq):
+        """``(product ids, facets)`` cached for ``key`` at catalog ``seq``, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] == seq and entry[1] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    metrics.incr('search_cache.hit')
+                    return entry[2], entry[3]
+                del self._entries[key]
+        metrics.incr('search_cache.miss')
+        return None
+
+    def put(self, key, seq, products, facets):
+        entry = (seq, time.monotonic() + self.ttl, array('q', (product.id for product in products)), facets)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
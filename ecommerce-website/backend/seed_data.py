@@ -0,0 +1,347 @@
+"""Deterministic synthetic data generator for load and scale testing.
+
+Creates the normal schema (via ``init_database``) and then bulk-loads
+configurable volumes of categories, products, users, addresses, reviews,
+orders, order items, cart items and wishlists.  The same ``--seed``,
+``--start-date`` and volumes always produce the same rows (the few sample
+rows ``init_database`` adds keep their own creation times).
+
+Example (from the backend directory):
+
+    python seed_data.py --database loadtest.db --reset --orders 1000000
+
+Rows are written with ``executemany`` in large batches inside one
+transaction per table, with durability pragmas relaxed for the duration
+of the load.  Never point this at a production database.
+"""
+import argparse
+import hashlib
+import itertools
+import math
+import os
+import random
+import sqlite3
+import string
+import time
+from datetime import datetime, timedelta
+
+BRANDS = ['Apex', 'Nova', 'Zenith', 'Pulse', 'Vertex', 'Orbit', 'Lumen', 'Quantum',
+          'Echo', 'Titan', 'Aero', 'Flux', 'Helix', 'Nimbus', 'Vector', 'Sonic']
+PRODUCT_NOUNS = ['Headphones', 'Earbuds', 'Speaker', 'Smartphone', 'Tablet', 'Laptop',
+                 'Ultrabook', 'Smart Watch', 'Fitness Band', 'Charger', 'Power Bank',
+                 'Phone Case', 'Keyboard', 'Mouse', 'Monitor', 'Webcam', 'Microphone',
+                 'Router', 'Drone', 'Camera']
+PRODUCT_ADJECTIVES = ['Wireless', 'Pro', 'Ultra', 'Mini', 'Max', 'Lite', 'Gaming',
+                      'Noise Cancelling', 'Portable', 'Premium', 'Compact', 'Smart']
+CATEGORY_WORDS = ['Audio', 'Mobile', 'Computing', 'Wearables', 'Accessories', 'Gaming',
+                  'Networking', 'Cameras', 'Smart Home', 'Storage', 'Displays', 'Power']
+CITIES = [('Springfield', 'IL'), ('Portland', 'OR'), ('Austin', 'TX'), ('Denver', 'CO'),
+          ('Madison', 'WI'), ('Raleigh', 'NC'), ('Boise', 'ID'), ('Tucson', 'AZ')]
+STREETS = ['Main St', 'Oak Ave', 'Maple Dr', 'Cedar Ln', 'Pine Rd', 'Elm St', 'Lake Blvd']
+# Timestamps are laid out from a fixed day, not from today, so they are part of what --seed reproduces
+DEFAULT_START_DATE = '2024-01-01'
+ORDER_STATUSES = ['completed'] * 14 + ['shipped'] * 2 + ['pending'] * 3 + ['cancelled']
+PAYMENT_METHODS = ['credit_card', 'credit_card', 'credit_card', 'paypal', 'debit_card']
+REVIEW_TITLES = ['Great value', 'Works as expected', 'Not bad', 'Excellent!', 'Disappointed',
+                 'Would buy again', 'Solid build quality', 'Average at best']
+REVIEW_STATUSES = ['approved'] * 8 + ['pending', 'rejected']
+
+BULK_LOAD_PRAGMAS = [
+    'PRAGMA journal_mode = MEMORY',
+    'PRAGMA synchronous = OFF',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -262144',
+    'PRAGMA locking_mode = EXCLUSIVE',
+]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a large synthetic TechGadgets database.')
+    parser.add_argument('--database', default='loadtest.db', help='SQLite file to create or extend')
+    parser.add_argument('--reset', action='store_true', help='delete the database file first')
+    parser.add_argument('--seed', type=int, default=42, help='random seed (same seed -> same data)')
+    parser.add_argument('--categories', type=int, default=20)
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--addresses-per-user', type=int, default=1)
+    parser.add_argument('--reviews', type=int, default=100000)
+    parser.add_argument('--orders', type=int, default=200000)
+    parser.add_argument('--max-items-per-order', type=int, default=5)
+    parser.add_argument('--cart-items', type=int, default=20000)
+    parser.add_argument('--wishlists', type=int, default=10000)
+    parser.add_argument('--items-per-wishlist', type=int, default=6)
+    parser.add_argument('--start-date', default=DEFAULT_START_DATE,
+                        help='first day of the timestamps (YYYY-MM-DD; fixed so runs on different days match)')
+    parser.add_argument('--days', type=int, default=365, help='spread timestamps over this many days')
+    parser.add_argument('--batch-size', type=int, default=50000)
+    return parser.parse_args(argv)
+
+
+def bulk_insert(conn, label, sql, rows, batch_size):
+    """Insert an iterable of tuples in ``executemany`` batches inside one transaction."""
+    started = time.perf_counter()
+    total = 0
+    conn.execute('BEGIN')
+    try:
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                break
+            conn.executemany(sql, batch)
+            total += len(batch)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    elapsed = time.perf_counter() - started
+    rate = total / elapsed if elapsed else float('inf')
+    print(f"✅ {label}: {total:,} rows in {elapsed:.2f}s ({rate:,.0f} rows/s)")
+    return total
+
+
+def next_id(conn, table):
+    return conn.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table}').fetchone()[0] + 1
+
+
+def coprime_stride(rng, modulus):
+    """Pick a stride coprime with ``modulus`` so ``(k * stride) % modulus`` never repeats for k < modulus."""
+    stride = rng.randrange(1, max(modulus, 2))
+    while math.gcd(stride, modulus) != 1:
+        stride += 1
+    return stride
+
+
+def password_hash(password, seed, iterations=600000):
+    """What werkzeug's ``generate_password_hash`` stores, with a salt taken from ``seed`` instead of the OS."""
+    salt = ''.join(random.Random(seed).choices(string.ascii_letters + string.digits, k=16))
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), iterations).hex()
+    return f'pbkdf2:sha256:{iterations}${salt}${digest}'
+
+
+class Clock:
+    """Turns random offsets into the TIMESTAMP text format SQLite's CURRENT_TIMESTAMP uses."""
+
+    def __init__(self, rng, days, start):
+        self.rng = rng
+        self.span = max(days, 1) * 86400
+        self.start = start
+
+    def random(self):
+        return self.at(self.rng.randrange(self.span))
+
+    def at(self, offset):
+        return (self.start + timedelta(seconds=offset)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def seed(args):
+    # Imported lazily so ``--help`` works without Flask installed
+    import minimal_app
+
+    if args.reset and os.path.exists(args.database):
+        os.remove(args.database)
+
+    minimal_app.app.config['DATABASE'] = args.database
+    minimal_app.init_database()
+
+    rng = random.Random(args.seed)
+    clock = Clock(rng, args.days, datetime.strptime(args.start_date, '%Y-%m-%d'))
+    batch = args.batch_size
+
+    conn = sqlite3.connect(args.database, isolation_level=None)
+    for pragma in BULK_LOAD_PRAGMAS:
+        conn.execute(pragma)
+
+    started = time.perf_counter()
+
+    # Categories
+    first_category = next_id(conn, 'categories')
+
+    def categories():
+        for n in range(args.categories):
+            word = CATEGORY_WORDS[n % len(CATEGORY_WORDS)]
+            name = f'{word} {n // len(CATEGORY_WORDS) + 1}'
+            yield (first_category + n, name, f'{name.lower().replace(" ", "-")}-{first_category + n}',
+                   f'Synthetic {word.lower()} category', clock.random())
+
+    bulk_insert(conn, 'categories',
+                'INSERT INTO categories (id, name, slug, description, created_at) VALUES (?, ?, ?, ?, ?)',
+                categories(), batch)
+    category_ids = [row[0] for row in conn.execute('SELECT id FROM categories')]
+
+    # Products - names and prices are kept in memory so order lines stay consistent
+    first_product = next_id(conn, 'products')
+    names = []
+    prices = []
+
+    def products():
+        for n in range(args.products):
+            name = (f'{rng.choice(BRANDS)} {rng.choice(PRODUCT_ADJECTIVES)} '
+                    f'{rng.choice(PRODUCT_NOUNS)} {n + 1}')
+            price = round(rng.uniform(5, 2500), 2)
+            names.append(name)
+            prices.append(price)
+            yield (first_product + n, name, price, f'{name} - synthetic load test product',
+                   f'https://via.placeholder.com/300x200?text=P{first_product + n}',
+                   rng.choice(category_ids), rng.randrange(0, 200), clock.random())
+
+    bulk_insert(conn, 'products',
+                'INSERT INTO products (id, name, price, description, image_url, category_id, stock, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                products(), batch)
+    n_products = len(prices)
+
+    def popular_product():
+        # Squaring a uniform draw skews traffic towards low offsets (a cheap long tail)
+        return int(n_products * rng.random() ** 2)
+
+    # Users - hashing is deliberately slow, so every synthetic user shares one hash
+    shared_hash = password_hash('password123', args.seed)
+    first_user = next_id(conn, 'users')
+
+    def users():
+        for n in range(args.users):
+            uid = first_user + n
+            yield uid, f'loaduser{uid}', f'loaduser{uid}@example.com', shared_hash, clock.random(), 0
+
+    bulk_insert(conn, 'users',
+                'INSERT INTO users (id, username, email, password_hash, created_at, is_admin) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                users(), batch)
+
+    def addresses():
+        for n in range(args.users):
+            uid = first_user + n
+            for a in range(args.addresses_per_user):
+                city, state = rng.choice(CITIES)
+                yield (uid, 'shipping' if a % 2 == 0 else 'billing', f'Load User {uid}',
+                       f'{rng.randrange(1, 9999)} {rng.choice(STREETS)}', city, state,
+                       f'{rng.randrange(10000, 99999)}', 'US', None, 1 if a < 2 else 0, clock.random())
+
+    bulk_insert(conn, 'addresses',
+                'INSERT INTO addresses (user_id, address_type, full_name, street_address, city, state, '
+                'postal_code, country, phone_number, is_default, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                addresses(), batch)
+
+    def unique_pairs(count, owners, first_owner):
+        """Yield ``count`` distinct (owner, product offset) pairs without tracking a seen-set."""
+        if not owners or not n_products:
+            return
+        count = min(count, owners * n_products)
+        stride = coprime_stride(rng, n_products)
+        for n in range(count):
+            owner, k = n % owners, n // owners
+            yield first_owner + owner, (k * stride + owner) % n_products
+
+    def reviews():
+        for user_id, offset in unique_pairs(args.reviews, args.users, first_user):
+            created = clock.random()
+            yield (first_product + offset, user_id, rng.choice((5, 5, 4, 4, 4, 3, 2, 1)),
+                   rng.choice(REVIEW_TITLES), 'Synthetic review text.', rng.choice(REVIEW_STATUSES),
+                   created, created)
+
+    bulk_insert(conn, 'reviews',
+                'INSERT INTO reviews (product_id, user_id, rating, title, comment, status, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                reviews(), batch)
+
+    # Orders and their items are generated together; items are buffered per batch of orders
+    first_order = next_id(conn, 'orders')
+    pending_items = []
+
+    def orders():
+        for n in range(args.orders):
+            order_id = first_order + n
+            user_id = first_user + rng.randrange(args.users) if args.users else 1
+            created = clock.random()
+            total = 0.0
+            seen = set()
+            for _ in range(rng.randint(1, args.max_items_per_order)):
+                offset = popular_product()
+                if offset in seen:
+                    continue
+                seen.add(offset)
+                quantity = rng.choice((1, 1, 1, 2, 3))
+                price = prices[offset]
+                line_total = round(price * quantity, 2)
+                total += line_total
+                pending_items.append((order_id, first_product + offset, names[offset], price, quantity,
+                                      line_total))
+            yield (order_id, user_id, f'ORD-{created[:10].replace("-", "")}-{user_id}-{order_id}',
+                   round(total, 2), rng.choice(ORDER_STATUSES), '123 Main St, City, State 12345',
+                   '123 Main St, City, State 12345', rng.choice(PAYMENT_METHODS), 'paid', created, created)
+
+    order_sql = ('INSERT INTO orders (id, user_id, order_number, total_amount, status, shipping_address, '
+                 'billing_address, payment_method, payment_status, created_at, updated_at) '
+                 'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)')
+    item_sql = ('INSERT INTO order_items (order_id, product_id, product_name, product_price, quantity, total_price) '
+                'VALUES (?, ?, ?, ?, ?, ?)')
+
+    if n_products:
+        order_started = time.perf_counter()
+        order_rows = orders()
+        total_orders = total_items = 0
+        conn.execute('BEGIN')
+        try:
+            while True:
+                chunk = list(itertools.islice(order_rows, batch))
+                if not chunk:
+                    break
+                conn.executemany(order_sql, chunk)
+                conn.executemany(item_sql, pending_items)
+                total_orders += len(chunk)
+                total_items += len(pending_items)
+                pending_items.clear()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        elapsed = time.perf_counter() - order_started
+        print(f"✅ orders: {total_orders:,} orders / {total_items:,} items in {elapsed:.2f}s "
+              f"({(total_orders + total_items) / elapsed:,.0f} rows/s)")
+
+    def cart_items():
+        for user_id, offset in unique_pairs(args.cart_items, args.users, first_user):
+            yield user_id, first_product + offset, rng.randint(1, 3), clock.random()
+
+    bulk_insert(conn, 'cart_items',
+                'INSERT OR IGNORE INTO cart_items (user_id, product_id, quantity, created_at) VALUES (?, ?, ?, ?)',
+                cart_items(), batch)
+
+    # Wishlists belong to the first N synthetic users; ids are assigned explicitly so items can reference them
+    n_wishlists = min(args.wishlists, args.users)
+    first_wishlist = next_id(conn, 'wishlists')
+
+    def wishlists():
+        for n in range(n_wishlists):
+            yield first_wishlist + n, first_user + n, 'My Wishlist', 1 if rng.random() < 0.2 else 0, clock.random()
+
+    bulk_insert(conn, 'wishlists',
+                'INSERT INTO wishlists (id, user_id, name, is_public, created_at) VALUES (?, ?, ?, ?, ?)',
+                wishlists(), batch)
+
+    def wishlist_items():
+        for wishlist_id, offset in unique_pairs(n_wishlists * args.items_per_wishlist, n_wishlists, first_wishlist):
+            yield wishlist_id, first_product + offset, clock.random()
+
+    bulk_insert(conn, 'wishlist_items',
+                'INSERT OR IGNORE INTO wishlist_items (wishlist_id, product_id, created_at) VALUES (?, ?, ?)',
+                wishlist_items(), batch)
+
+    # Orders went in already completed, so the order triggers never saw them
+    print('🔄 Rebuilding bestseller leaderboards...')
+    from leaderboards import rebuild as rebuild_leaderboards
+    rebuild_leaderboards(conn)
+    conn.commit()
+
+    print('🔄 Running ANALYZE...')
+    conn.execute('ANALYZE')
+    conn.execute('PRAGMA locking_mode = NORMAL')
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.close()
+
+    print(f"✅ Seeding completed in {time.perf_counter() - started:.2f}s -> {args.database}")
+
+
+if __name__ == '__main__':
+    seed(parse_args())
@@ -0,0 +1,146 @@
+"""Typo-tolerant product search with an in-memory trigram index.
+
+Product and category names are split into words; every distinct word is
+indexed by its trigrams (the word padded as ``"  word "``, as PostgreSQL's
+pg_trgm does).  A query word is compared with the indexed words that share
+at least one trigram, scored by trigram similarity
+``shared / (query trigrams + word trigrams - shared)``, so "hedphones"
+finds "headphones" (0.62) and "labtop" finds "laptop" (0.40).  A product
+scores the mean, over the query words, of its best matching word.
+
+Lookups have a latency budget: once it is spent the words scored so far are
+returned and ``search.fuzzy.truncated`` is counted in ``metrics``.
+
+``TrigramIndex`` subscribes to the worker's ``CatalogStore`` like the facet
+index (see ``facets.py``) and is meant as the fallback for searches whose
+exact substring match finds few products.
+"""
+import re
+import threading
+import time
+from collections import Counter
+
+from metrics import metrics
+
+# pg_trgm's default similarity threshold
+SIMILARITY_THRESHOLD = 0.3
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+
+
+def words(text):
+    return _WORD_RE.findall((text or '').lower())
+
+
+def trigrams(word):
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    def __init__(self, budget_ms=25, threshold=SIMILARITY_THRESHOLD):
+        self.budget = budget_ms / 1000
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self._name_postings = {}        # word -> product ids with it in their name
+        self._category_postings = {}    # word -> product ids with it in their category's name
+        self._product_words = {}        # product id -> (name words, category words)
+        self._grams = {}                # trigram -> indexed words
+        self._gram_count = {}           # word -> number of trigrams
+
+    def __len__(self):
+        return len(self._product_words)
+
+    # -- maintenance -------------------------------------------------------
+
+    def load(self, products):
+        with self._lock:
+            self._clear()
+            for product in products:
+                self._add(product)
+
+    def apply(self, snapshot, changed):
+        """``CatalogStore`` listener: re-index the changed products, or everything when ``changed`` is None."""
+        if changed is None:
+            self.load(snapshot.products.values())
+            return
+        with self._lock:
+            for product_id in changed:
+                self._remove(product_id)
+                product = snapshot.product(product_id)
+                if product is not None:
+                    self._add(product)
+
+    def _add(self, product):
+        entry = (frozenset(words(product.name)), frozenset(words(product.category_name)))
+        self._product_words[product.id] = entry
+        for postings, product_words in zip((self._name_postings, self._category_postings), entry):
+            for word in product_words:
+                if word not in self._gram_count:
+                    grams = trigrams(word)
+                    self._gram_count[word] = len(grams)
+                    for gram in grams:
+                        self._grams.setdefault(gram, set()).add(word)
+                postings.setdefault(word, set()).add(product.id)
+
+    def _remove(self, product_id):
+        entry = self._product_words.pop(product_id, None)
+        if entry is None:
+            return
+        for postings, product_words in zip((self._name_postings, self._category_postings), entry):
+            for word in product_words:
+                ids = postings[word]
+                ids.discard(product_id)
+                if not ids:
+                    del postings[word]
+                    self._forget(word)
+
+    def _forget(self, word):
+        # Drop a word from the trigram index once no name uses it any more
+        if word in self._name_postings or word in self._category_postings:
+            return
+        for gram in trigrams(word):
+            indexed = self._grams[gram]
+            indexed.discard(word)
+            if not indexed:
+                del self._grams[gram]
+        del self._gram_count[word]
+
+    # -- queries -----------------------------------------------------------
+
+    def search(self, query, limit=50, category_names=True):
+        """``[(product_id, similarity)]`` for the products most similar to ``query``, best first."""
+        query_words = words(query)
+        if not query_words:
+            return []
+        deadline = time.perf_counter() + self.budget
+        scores = Counter()
+        with self._lock:
+            for query_word in query_words:
+                query_grams = trigrams(query_word)
+                shared = Counter()
+                for gram in query_grams:
+                    shared.update(self._grams.get(gram, ()))
+                best = {}
+                for word, count in shared.most_common():
+                    similarity = count / (len(query_grams) + self._gram_count[word] - count)
+                    if similarity < self.threshold:
+                        continue
+                    for postings in ((self._name_postings, self._category_postings) if category_names
+                                     else (self._name_postings,)):
+                        for product_id in postings.get(word, ()):
+                            if similarity > best.get(product_id, 0):
+                                best[product_id] = similarity
+                    if time.perf_counter() > deadline:
+                        break
+                scores.update(best)
+                if time.perf_counter() > deadline:
+                    metrics.incr('search.fuzzy.truncated')
+                    break
+
+        ranked = sorted(((product_id, score / len(query_words)) for product_id, score in scores.items()),
+                        key=lambda item: (-item[1], item[0]))
+        return [item for item in ranked if item[1] >= self.threshold][:limit]
@@ -0,0 +1,122 @@
+"""Batched product view counters.
+
+Writing a row on every product page view would queue every page view
+behind SQLite's single writer.  ``ViewCounter`` counts views in memory
+instead, per (day, product), and a background thread adds the accumulated
+deltas to ``product_daily_views`` in one transaction every
+``flush_interval`` seconds.  The counter is flushed once more when the
+process exits, so a graceful restart or worker recycle loses nothing; a
+crash loses at most one interval of views.
+
+``popularity()`` reads the views of the last ``popular_days`` days, summed
+over every worker's flushes, and keeps the result for ``popularity_ttl``
+seconds; it backs the "popular" sort of the product listing.
+"""
+import atexit
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from app_logging import logger
+from metrics import metrics
+
+VIEW_COUNT_SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS product_daily_views
+    (
+        day TEXT NOT NULL,
+        product_id INTEGER NOT NULL,
+        views INTEGER NOT NULL,
+        PRIMARY KEY (day, product_id)
+    ) WITHOUT ROWID
+    ''',
+)
+
+
+def install_view_counts(conn):
+    for statement in VIEW_COUNT_SCHEMA:
+        conn.execute(statement)
+
+
+class ViewCounter:
+    def __init__(self, connect, flush_interval=5.0, popular_days=30, popularity_ttl=60.0):
+        self._connect = connect
+        self.flush_interval = flush_interval
+        self.popular_days = popular_days
+        self.popularity_ttl = popularity_ttl
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+        atexit.register(self._final_flush)
+
+    def _reset(self):
+        # Also run in forked children: views counted by the parent are the parent's to flush
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._flusher = None
+        self._popularity = ({}, None)
+
+    def record(self, product_id):
+        # Days are UTC, like SQLite's date('now')
+        day = datetime.now(timezone.utc).date().isoformat()
+        with self._lock:
+            self._pending[day, product_id] += 1
+            if self._flusher is None and self.flush_interval > 0:
+                self._flusher = threading.Thread(target=self._run, name='view-flush', daemon=True)
+                self._flusher.start()
+
+    def flush(self):
+        """Write the views counted so far; returns the number of rows touched."""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+        if not pending:
+            return 0
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany('''
+                                 INSERT INTO product_daily_views (day, product_id, views)
+                                 VALUES (?, ?, ?)
+                                 ON CONFLICT (day, product_id) DO UPDATE SET views = views + excluded.views
+                                 ''', [(day, product_id, views) for (day, product_id), views in pending.items()])
+        except Exception:
+            # Keep the views for the next attempt
+            with self._lock:
+                self._pending.update(pending)
+            raise
+        finally:
+            conn.close()
+        metrics.incr('views.flushed', sum(pending.values()))
+        return len(pending)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('View count flush failed')
+
+    def _final_flush(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('View count flush at exit failed')
+
+    def popularity(self):
+        """Product id -> views over the last ``popular_days`` days, as of at most ``popularity_ttl`` seconds ago."""
+        views, loaded_at = self._popularity
+        if loaded_at is None or time.monotonic() - loaded_at > self.popularity_ttl:
+            conn = self._connect()
+            try:
+                views = dict(conn.execute('''
+                                          SELECT product_id, SUM(views)
+                                          FROM product_daily_views
+                                          WHERE day > date('now', ?)
+                                          GROUP BY product_id
+                                          ''', (f'-{self.popular_days} days',)).fetchall())
+            finally:
+                conn.close()
+            self._popularity = (views, time.monotonic())
+        return views
@@ -0,0 +1,16 @@
+"""Production WSGI entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The module only builds the app.  Per-process resources - the log writer
+thread, metrics and profiling locks - are (re)created in each worker after
+``fork()`` by ``os.register_at_fork`` hooks in the modules that own them,
+and database connections are opened per request, so nothing a worker
+uses is inherited from the master.  One-time database setup runs in the
+master before any worker starts (see ``on_starting`` in
+``gunicorn.conf.py``), or with ``flask --app "minimal_app:create_app()"
+init-db``.
+"""
+from minimal_app import create_app
+
+app = create_app()